@@ -0,0 +1,200 @@
+"""Prueba de carga del API local: cientos de suscriptores SSE/WebSocket contra WeightApiServer.
+
+Los suscriptores lentos leen una lectura cada --slow-ms con buffers de recepción chicos (un
+cliente que de verdad no lee, no uno que acumula en su propia memoria). Su atraso (publicación ->
+recepción) debe quedar acotado por la cola del servidor y unos pocos KB de buffers: tras llenarse
+se estabiliza en vez de crecer con la duración de la prueba. Falla (código 1) si en la segunda
+mitad de la publicación el atraso sigue creciendo más de --max-stale-growth segundos por segundo
+(sin cota crece casi 1 s por s), o si su p99 supera --max-stale lecturas del cliente lento
+(API_CLIENT_QUEUE más lo que entra en los buffers de los sockets).
+
+Uso:
+    python benchmarks/bench_api.py --clients 300 --readings 10000 --rate 500 --slow 20
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from weight_api import WeightApiServer  # noqa: E402
+
+
+async def _open(port, path, websocket, limit=1 << 20):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if limit < 1 << 20:
+        # Antes de conectar, para que la ventana anunciada ya sea chica
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, limit)
+    sock.setblocking(False)
+    await asyncio.get_running_loop().sock_connect(sock, ("127.0.0.1", port))
+    reader, writer = await asyncio.open_connection(sock=sock, limit=limit)
+    headers = f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+    if websocket:
+        key = base64.b64encode(os.urandom(16)).decode("ascii")
+        headers += f"Upgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n"
+    writer.write((headers + "\r\n").encode("ascii"))
+    await writer.drain()
+    # Saltar cabeceras de la respuesta
+    while (await reader.readline()) not in (b"\r\n", b""):
+        pass
+    return reader, writer
+
+
+async def _ws_messages(reader):
+    while True:
+        b1, b2 = await reader.readexactly(2)
+        length = b2 & 0x7F
+        if length == 126:
+            length = int.from_bytes(await reader.readexactly(2), "big")
+        elif length == 127:
+            length = int.from_bytes(await reader.readexactly(8), "big")
+        yield await reader.readexactly(length)
+
+
+async def _sse_messages(reader):
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        if line.startswith(b"data: "):
+            yield line[6:]
+
+
+async def subscriber(port, websocket, stats, stop, slow=None):
+    reader, writer = await _open(port, "/weight/ws" if websocket else "/weight/stream", websocket,
+                                 limit=256 if slow else 1 << 20)
+    stats["connected"] += 1
+    messages = _ws_messages(reader) if websocket else _sse_messages(reader)
+    try:
+        async for payload in messages:
+            reading = json.loads(payload)
+            if reading.get("seq") is None:
+                continue
+            stats["received"] += 1
+            latency = time.perf_counter() - reading["perf"]
+            if slow:
+                stats["slow_latencies"].append((time.perf_counter(), latency))
+                # Consumidor lento: no debe frenar al publicador ni a los demás
+                await asyncio.sleep(slow)
+            else:
+                stats["latencies"].append(latency)
+            if stop.is_set():
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def _growth(points):
+    """Pendiente por mínimos cuadrados de (tiempo, atraso): segundos de atraso por segundo"""
+    n = len(points)
+    if n < 2:
+        return 0.0
+    mx = sum(t for t, _ in points) / n
+    my = sum(v for _, v in points) / n
+    den = sum((t - mx) ** 2 for t, _ in points)
+    return sum((t - mx) * (v - my) for t, v in points) / den if den else 0.0
+
+
+def run_clients(port, args, stats, stop, ready):
+    async def main():
+        tasks = []
+        for i in range(args.clients):
+            tasks.append(asyncio.ensure_future(subscriber(port, i % 2 == 0, stats, stop,
+                                                   slow=args.slow_ms / 1000.0 if i < args.slow else None)))
+        while stats["connected"] < args.clients:
+            await asyncio.sleep(0.01)
+        ready.set()
+        while not stop.is_set():
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.5)
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=300)
+    parser.add_argument("--readings", type=int, default=10000)
+    parser.add_argument("--rate", type=float, default=500.0, help="lecturas por segundo")
+    parser.add_argument("--slow", type=int, default=20, help="suscriptores que consumen lento")
+    parser.add_argument("--slow-ms", type=float, default=50.0, help="ms por lectura de un suscriptor lento")
+    parser.add_argument("--max-stale", type=float, default=200.0,
+                        help="p99 máximo de atraso de los lentos, en lecturas a su ritmo de consumo")
+    parser.add_argument("--max-stale-growth", type=float, default=0.1,
+                        help="crecimiento máximo del atraso de los lentos (s por s)")
+    args = parser.parse_args()
+
+    server = WeightApiServer(port=0)
+    server.start()
+
+    stats = {"connected": 0, "received": 0, "latencies": [], "slow_latencies": []}
+    stop = threading.Event()
+    ready = threading.Event()
+    clients = threading.Thread(target=run_clients, args=(server.port, args, stats, stop, ready), daemon=True)
+    clients.start()
+    ready.wait(timeout=30)
+    print(f"Suscriptores conectados: {stats['connected']} (en servidor: {server.client_count})")
+
+    # Publicar desde un hilo, igual que el lector serial
+    publish_times = []
+    interval = 1.0 / args.rate
+    start = time.perf_counter()
+    for seq in range(args.readings):
+        t0 = time.perf_counter()
+        server.publish({"seq": seq, "weight": 1234.5, "status": "ST", "type": "GS", "perf": t0})
+        publish_times.append(time.perf_counter() - t0)
+        next_at = start + (seq + 1) * interval
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    elapsed = time.perf_counter() - start
+    time.sleep(1.0)
+    dropped = server.dropped_total
+    stop.set()
+    clients.join(timeout=10)
+    server.stop()
+
+    expected = args.readings * args.clients
+    lat = sorted(stats["latencies"]) or [0.0]
+    print(f"Publicadas: {args.readings} en {elapsed:.2f}s ({args.readings / elapsed:.0f}/s)")
+    print(f"publish(): media {statistics.mean(publish_times) * 1e6:.1f} µs, "
+          f"máx {max(publish_times) * 1e6:.1f} µs")
+    print(f"Entregadas: {stats['received']}/{expected} ({100.0 * stats['received'] / expected:.1f}%), "
+          f"descartadas por cola llena: {dropped}")
+    print(f"Latencia entrega: p50 {lat[len(lat) // 2] * 1e3:.2f} ms, "
+          f"p99 {lat[int(len(lat) * 0.99)] * 1e3:.2f} ms, máx {lat[-1] * 1e3:.2f} ms")
+    if args.slow:
+        stale = sorted(latency for _, latency in stats["slow_latencies"]) or [0.0]
+        p99 = stale[int(len(stale) * 0.99)]
+        # En lecturas al ritmo real de los lentos (bajo carga consumen menos de una cada --slow-ms)
+        times = [t for t, _ in stats["slow_latencies"]]
+        rate = len(times) / args.slow / (max(times) - min(times)) if len(times) > 1 else 0.0
+        p99_readings = p99 * rate
+        growth = _growth([(t, latency) for t, latency in stats["slow_latencies"] if start + elapsed / 2 <= t <= start + elapsed])
+        print(f"Atraso de los lentos: p50 {stale[len(stale) // 2]:.2f} s, p99 {p99:.2f} s, máx {stale[-1]:.2f} s, "
+              f"(~{p99_readings:.0f} lecturas en tránsito), crecimiento en la segunda mitad {growth:+.3f} s/s")
+        failures = []
+        if growth > args.max_stale_growth:
+            failures.append(f"el atraso de los lentos sigue creciendo ({growth:.2f} s/s)")
+        if p99_readings > args.max_stale:
+            failures.append(f"los suscriptores lentos se atrasan {p99_readings:.0f} lecturas (máximo {args.max_stale:g})")
+        if failures:
+            print("FALLA: " + "; ".join(failures))
+            sys.exit(1)
+        print("OK: atraso de los lentos acotado")
+
+
+if __name__ == "__main__":
+    main()
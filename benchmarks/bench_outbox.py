@@ -0,0 +1,168 @@
+"""Prueba de la bandeja de salida contra un receptor local que se mata y se reinicia.
+
+receiver: servidor HTTP stub del servidor central. Guarda cada evento una sola vez por id en
+SQLite (las entregas repetidas solo suman un contador) y responde 200 recién después del
+commit, como haría un receptor idempotente real.
+
+run: levanta el receptor en un subproceso, genera N eventos a una tasa fija a través de
+Outbox/OutboxSender y cada --kill-every segundos mata el receptor (SIGKILL) y lo reinicia tras
+--down segundos. Al final verifica que llegaron todos los eventos una vez (los repetidos los
+descarta el receptor) e informa profundidad máxima de la bandeja, tasa de vaciado y fallos.
+
+Uso:
+    python benchmarks/bench_outbox.py run --events 5000 --rate 200 --kill-every 6 --down 3
+    python benchmarks/bench_outbox.py receiver --port 8770 --db recibidos.db
+"""
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import outbox  # noqa: E402
+from metrics import RateTracker  # noqa: E402
+from orchestrator import Orchestrator  # noqa: E402
+from outbox import Outbox, OutboxSender, M_OUTBOX_SENT, M_OUTBOX_FAILURES  # noqa: E402
+
+
+def serve_receiver(args):
+    conn = sqlite3.connect(args.db, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS received (id TEXT PRIMARY KEY, ts REAL, deliveries INTEGER)")
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            events = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["events"]
+            with lock, conn:
+                conn.executemany("INSERT INTO received (id, ts, deliveries) VALUES (?, ?, 1) "
+                                 "ON CONFLICT (id) DO UPDATE SET deliveries = deliveries + 1",
+                                 ((e["id"], e["ts"]) for e in events))
+            body = json.dumps({"received": len(events)}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    ThreadingHTTPServer(("127.0.0.1", args.port), Handler).serve_forever()
+
+
+def _start_receiver(port, db):
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "receiver", "--port", str(port), "--db", db])
+    time.sleep(0.3)
+    return proc
+
+
+def bench_run(args):
+    workdir = tempfile.mkdtemp()
+    received_db = os.path.join(workdir, "recibidos.db")
+    outbox.OUTBOX_BACKOFF_MAX_S = args.backoff_max
+    box = Outbox(os.path.join(workdir, "outbox.db"))
+    orchestrator = Orchestrator()
+    orchestrator.start()
+    log = (lambda message: print(f"  {time.strftime('%H:%M:%S')} {message}"))
+    sender = OutboxSender(box, f"http://127.0.0.1:{args.port}/readings", orchestrator, log=log)
+    receiver = [_start_receiver(args.port, received_db)]
+    sender.start()
+
+    stop = threading.Event()
+    kills = [0]
+
+    def chaos():
+        while not stop.wait(args.kill_every):
+            receiver[0].kill()
+            receiver[0].wait()
+            kills[0] += 1
+            if stop.wait(args.down):
+                return
+            receiver[0] = _start_receiver(args.port, received_db)
+
+    stats = {"max_depth": 0, "rates": []}
+    rate = RateTracker(M_OUTBOX_SENT)
+
+    def sample():
+        while not stop.wait(1.0):
+            stats["max_depth"] = max(stats["max_depth"], box.depth)
+            stats["rates"].append(rate.update()[0])
+
+    threads = [threading.Thread(target=chaos, daemon=True), threading.Thread(target=sample, daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    print(f"== {args.events} eventos a {args.rate}/s, receptor caído {args.down}s cada {args.kill_every}s ==")
+    t0 = time.perf_counter()
+    for n in range(args.events):
+        # Igual que la app: guardado en el hilo de disco de la bandeja y aviso al enviador
+        sender.enqueue({"ts": time.time(), "weight": float(n), "unit": "kg", "status": "ST", "event": "settled"})
+        # Espera hasta el instante planificado del próximo evento (tasa fija, sin deriva)
+        delay = t0 + (n + 1) / args.rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    produced = time.perf_counter() - t0
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+    if receiver[0].poll() is not None:
+        receiver[0] = _start_receiver(args.port, received_db)
+    t1 = time.perf_counter()
+    while box.depth and time.perf_counter() - t1 < args.timeout:
+        time.sleep(0.05)
+    drained = time.perf_counter() - t1
+
+    orchestrator.stop()
+    sender.close()
+    receiver[0].kill()
+    receiver[0].wait()
+    conn = sqlite3.connect(received_db)
+    unique, deliveries = conn.execute("SELECT count(*), sum(deliveries) FROM received").fetchone()
+    conn.close()
+
+    rates = [r for r in stats["rates"] if r > 0]
+    print(f"producción: {produced:.1f}s; vaciado final tras el último evento: {drained:.2f}s")
+    print(f"receptor matado {kills[0]} veces; lotes fallidos: {M_OUTBOX_FAILURES.value}")
+    print(f"profundidad máxima de la bandeja: {stats['max_depth']}; pendientes al final: {box.depth}")
+    if rates:
+        print(f"tasa de vaciado: media {sum(rates) / len(rates):.0f} eventos/s, pico {max(rates):.0f} eventos/s")
+    print(f"recibidos únicos: {unique}/{args.events}; entregas repetidas descartadas: {(deliveries or 0) - unique}")
+    box.close()
+    if unique != args.events:
+        sys.exit("FALTAN EVENTOS")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="bench", required=True)
+    p = sub.add_parser("receiver")
+    p.add_argument("--port", type=int, default=8770)
+    p.add_argument("--db", default="recibidos.db")
+    p = sub.add_parser("run")
+    p.add_argument("--port", type=int, default=8770)
+    p.add_argument("--events", type=int, default=5000)
+    p.add_argument("--rate", type=float, default=200)
+    p.add_argument("--kill-every", type=float, default=6.0)
+    p.add_argument("--down", type=float, default=3.0)
+    p.add_argument("--backoff-max", type=float, default=2.0, help="tope del backoff (la app usa 60 s)")
+    p.add_argument("--timeout", type=float, default=60.0, help="espera máxima para vaciar la bandeja")
+    args = parser.parse_args()
+    if args.bench == "receiver":
+        serve_receiver(args)
+    else:
+        bench_run(args)
+
+
+if __name__ == "__main__":
+    main()
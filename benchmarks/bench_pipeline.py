@@ -0,0 +1,651 @@
+"""Benchmark extremo a extremo del pipeline sin hardware.
+
+Serial: el simulador escribe tramas en loop:// o un pty, SerialLineReader las lee y un hilo
+"UI" las parsea (igual que root.after -> process_data). Mide throughput, pérdidas, CPU y latencia.
+
+Screenshot: FakeWebDriver devuelve PNGs enlatados y capture_frame los decodifica y redimensiona.
+
+UI jitter: un bucle "UI" en el hilo principal pinta cada --tick-ms mientras la captura corre en
+un hilo (mismo proceso, compite por el GIL) o en un proceso aparte con anillo en memoria
+compartida. Mide el retraso de cada tick respecto a su hora prevista.
+
+Grid: reparto del presupuesto de capturas entre canales (en reposo y con el peso inestable, que
+prioriza la cámara del carril) y costo de pintar la grilla repintando todo contra solo los
+mosaicos cuyo frame cambió (dos de las tres cámaras miran una escena quieta).
+
+Idle: captura + repintado gobernados por IdleGovernor con un flujo de pesos sintético (camión,
+balanza en cero, camión). Compara CPU y capturas por segundo con la balanza en
+cero antes y después de entrar en reposo (energía RAPL si el sistema la expone) y mide cuánto
+tarda la captura en volver al ritmo normal cuando llega el siguiente camión.
+
+Anomaly: AnomalyDetector sobre flujos sintéticos de varias balanzas (camiones que suben, pesan
+y bajan, con ruido) con anomalías inyectadas: picos de una lectura, cambios de tara, deriva y
+oscilación. Mide µs por lectura y lecturas/s en un núcleo, y compara lo detectado con lo
+inyectado (aciertos y falsos positivos por tipo).
+
+Replay: reproduce una captura .pscap (o una sintética) a velocidad máxima a través del lector y el
+parser; sirve como prueba de regresión (resumen + huella de las lecturas) y de throughput.
+
+Uso:
+    python benchmarks/bench_pipeline.py serial --rate 2000 --frames 20000 --transport loop
+    python benchmarks/bench_pipeline.py serial --transport pty --read-mode line   (comparar con bulk)
+    python benchmarks/bench_pipeline.py screenshot --frames 200
+    python benchmarks/bench_pipeline.py ui-jitter --capture both --seconds 10
+    python benchmarks/bench_pipeline.py grid --seconds 120
+    python benchmarks/bench_pipeline.py idle --zero 40 --idle-after 10
+    python benchmarks/bench_pipeline.py anomaly --scales 4 --trucks 500
+    python benchmarks/bench_pipeline.py replay --file serial_capture_20250101_080000.pscap
+    python benchmarks/bench_pipeline.py all
+"""
+import argparse
+import hashlib
+import io
+import os
+import random
+import tempfile
+import queue
+import sys
+import threading
+import time
+
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+from camera_grid import CameraChannel, CaptureScheduler, frame_digest, grid_layout, tile_origin  # noqa: E402
+from frame_pipeline import capture_frame, FrameBuffers, M_CAPTURE, M_DECODE, M_RESIZE  # noqa: E402
+from frame_process import FrameCaptureProcess  # noqa: E402
+from idle_governor import IdleGovernor, IDLE_FRAME_INTERVAL_S  # noqa: E402
+from scale_protocols import ProtocolParser, M_PARSE_FAILURES  # noqa: E402
+from scale_reader import SerialLineReader, M_SERIAL_READS  # noqa: E402
+from serial_capture import ReplaySource, SerialRecorder  # noqa: E402
+from scale_simulator import FakeWebDriver, FrameGenerator, ScaleSimulator, make_canned_pngs, open_transport  # noqa: E402
+from tracing import _percentile  # noqa: E402
+from weight_anomaly import AnomalyDetector, ANOMALY_KINDS  # noqa: E402
+
+
+class CpuMeter:
+    """CPU del proceso (usuario + sistema) como % de un núcleo durante el intervalo medido"""
+
+    def __init__(self):
+        self.process = psutil.Process()
+
+    def __enter__(self):
+        self._cpu = self.process.cpu_times()
+        self._ctx = self.process.num_ctx_switches()
+        self._wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        cpu = self.process.cpu_times()
+        self.wall = time.perf_counter() - self._wall
+        self.cpu = (cpu.user - self._cpu.user) + (cpu.system - self._cpu.system)
+        self.percent = 100.0 * self.cpu / self.wall if self.wall else 0.0
+        ctx = self.process.num_ctx_switches()
+        self.ctx_switches = (ctx.voluntary - self._ctx.voluntary) + (ctx.involuntary - self._ctx.involuntary)
+
+
+def _latency_report(latencies):
+    values = sorted(latencies)
+    return (f"p50 {_percentile(values, 0.5) * 1e3:.2f} ms, p95 {_percentile(values, 0.95) * 1e3:.2f} ms, "
+            f"p99 {_percentile(values, 0.99) * 1e3:.2f} ms, máx {(values[-1] if values else 0) * 1e3:.2f} ms")
+
+
+def count_reads(port):
+    """Cuenta las llamadas a port.read() (readline() de pyserial llama read(1) por byte)"""
+    counter = [0]
+    original = port.read
+
+    def read(size=1):
+        counter[0] += 1
+        return original(size)
+    port.read = read
+    return counter
+
+
+def run_serial_pipeline(writer, reader_port, simulator, drain_timeout=5.0, read_mode="bulk"):
+    """Lector + hilo UI sobre un puerto simulado. Devuelve (recibidas, parseadas, tiempos de llegada al UI)"""
+    ui_queue = queue.SimpleQueue()
+    running = threading.Event()
+    running.set()
+    received_times = []
+    parsed = [0]
+    parser = ProtocolParser()
+
+    def ui_loop():
+        while True:
+            item = ui_queue.get()
+            if item is None:
+                return
+            line, _ = item
+            if parser.parse(line):
+                parsed[0] += 1
+            received_times.append(time.perf_counter())
+
+    reader = SerialLineReader(reader_port, on_line=lambda line, trace: ui_queue.put((line, trace)), mode=read_mode)
+    read_thread = threading.Thread(target=reader.run, args=(running.is_set,), daemon=True)
+    ui_thread = threading.Thread(target=ui_loop, daemon=True)
+    ui_thread.start()
+    read_thread.start()
+
+    simulator.start()
+    simulator.wait()
+    deadline = time.perf_counter() + drain_timeout
+    while len(received_times) < simulator.sent and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    running.clear()
+    read_thread.join(timeout=2)
+    ui_queue.put(None)
+    ui_thread.join(timeout=2)
+    return received_times, parsed[0]
+
+
+def bench_serial(args):
+    writer, reader_port = open_transport(args.transport)
+    generator = FrameGenerator(malformed_ratio=args.malformed, seed=1)
+    simulator = ScaleSimulator(writer, rate=args.rate, generator=generator, total=args.frames)
+    failures_before = M_PARSE_FAILURES.value
+    wakeups_before = M_SERIAL_READS.value
+    reads = count_reads(reader_port)
+
+    with CpuMeter() as cpu:
+        received_times, parsed = run_serial_pipeline(writer, reader_port, simulator, read_mode=args.read_mode)
+
+    sent = simulator.sent
+    received = len(received_times)
+    # Las tramas viajan en orden (FIFO): la i-ésima recibida corresponde a la i-ésima enviada
+    latencies = [r - s for r, s in zip(received_times, simulator.send_times)]
+    print(f"== Serial ({args.transport}, modo {args.read_mode}, {args.rate:.0f} tramas/s objetivo) ==")
+    print(f"Enviadas: {sent} ({simulator.sent_bytes} bytes) en {cpu.wall:.2f}s")
+    span = (received_times[-1] - simulator.send_times[0]) if received else 0.0
+    print(f"Recibidas: {received} ({received / max(span, 1e-9):.0f}/s), parseadas: {parsed}, "
+          f"fallos de parseo: {M_PARSE_FAILURES.value - failures_before}")
+    print(f"Pérdidas: {sent - received} ({100.0 * (sent - received) / max(sent, 1):.2f}%)")
+    print(f"CPU: {cpu.cpu:.2f}s ({cpu.percent:.1f}% de un núcleo), cambios de contexto: {cpu.ctx_switches}")
+    print(f"Llamadas read(): {reads[0]} ({reads[0] / max(received, 1):.1f} por trama), "
+          f"despertares del lector: {M_SERIAL_READS.value - wakeups_before}")
+    print(f"Latencia envío -> UI: {_latency_report(latencies)}")
+    reader_port.close()
+    if writer is not reader_port:
+        writer.close()
+
+
+def bench_screenshot(args):
+    driver = FakeWebDriver(latency=args.driver_latency)
+    size = (args.width, args.height)
+    latencies = []
+    with CpuMeter() as cpu:
+        for _ in range(args.frames):
+            t0 = time.perf_counter()
+            capture_frame(driver, size)
+            latencies.append(time.perf_counter() - t0)
+    print(f"== Screenshot ({args.frames} frames, destino {size[0]}x{size[1]}) ==")
+    print(f"Frames/s: {args.frames / cpu.wall:.1f}, CPU: {cpu.percent:.1f}% de un núcleo")
+    print(f"Por frame: {_latency_report(latencies)}")
+    print(f"Media por etapa: captura {M_CAPTURE.mean() * 1e3:.2f} ms, decode {M_DECODE.mean() * 1e3:.2f} ms, "
+          f"resize {M_RESIZE.mean() * 1e3:.2f} ms")
+
+
+class _ThreadCapture:
+    """Captura en un hilo del mismo proceso (modo clásico) con la interfaz de FrameCaptureProcess"""
+
+    def __init__(self, driver_latency, interval, size):
+        self.driver = FakeWebDriver(latency=driver_latency)
+        self.interval = interval
+        self.size = size
+        self.latest = None
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while self.running:
+            start = time.perf_counter()
+            image = capture_frame(self.driver, self.size)
+            self.latest = image
+            remaining = self.interval - (time.perf_counter() - start)
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def start(self):
+        self.thread.start()
+
+    def poll(self):
+        image, self.latest = self.latest, None
+        return image
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+
+def run_ui_jitter(mode, args):
+    """Bucle UI a ritmo fijo; devuelve (retrasos de tick, trabajo por tick, frames pintados, CPU)"""
+    size = (args.width, args.height)
+    interval = args.interval_ms / 1000.0
+    if mode == "process":
+        capture = FrameCaptureProcess(FakeWebDriver, (None, args.driver_latency), interval=interval,
+                                      max_size=size)
+        capture.request_size(*size)
+    else:
+        capture = _ThreadCapture(args.driver_latency, interval, size)
+    capture.start()
+    # Dejar arrancar el proceso hijo (import de Pillow) antes de medir
+    time.sleep(1.0 if mode == "process" else 0.1)
+
+    tick = args.tick_ms / 1000.0
+    canvas = None
+    lateness = []
+    work = []
+    painted = 0
+    with CpuMeter() as cpu:
+        target = time.perf_counter() + tick
+        end = target + args.seconds
+        while target < end:
+            delay = target - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            t0 = time.perf_counter()
+            lateness.append(max(0.0, t0 - target))
+            frame = capture.poll_image() if mode == "process" else capture.poll()
+            if frame is not None:
+                if mode == "process":
+                    frame = frame[0]
+                # Equivalente a PhotoImage.paste(): copia de bloque sobre una imagen ya creada
+                if canvas is None or canvas.mode != frame.mode or canvas.size != frame.size:
+                    canvas = Image.new(frame.mode, frame.size)
+                canvas.paste(frame)
+                painted += 1
+            work.append(time.perf_counter() - t0)
+            target += tick
+    capture.stop()
+    return lateness, work, painted, cpu
+
+
+def bench_ui_jitter(args):
+    modes = ("thread", "process") if args.capture == "both" else (args.capture,)
+    print(f"== UI jitter (tick {args.tick_ms:g} ms, captura cada {args.interval_ms:g} ms, "
+          f"{args.width}x{args.height}, {args.seconds:g}s) ==")
+    for mode in modes:
+        lateness, work, painted, cpu = run_ui_jitter(mode, args)
+        print(f"[{mode}] frames pintados: {painted} ({painted / cpu.wall:.1f}/s), "
+              f"CPU de este proceso: {cpu.percent:.1f}%")
+        print(f"[{mode}] retraso de tick: {_latency_report(lateness)}")
+        print(f"[{mode}] trabajo por tick: {_latency_report(work)}")
+
+
+def bench_grid(args):
+    channels = [CameraChannel("Frente", "", priority=2, lane=True), CameraChannel("Trasera", ""),
+                CameraChannel("Superior", "", priority=1, lane=True)]
+    scheduler = CaptureScheduler(channels, args.budget)
+    print(f"== Grilla: {len(channels)} canales, presupuesto {args.budget:g} capturas/s ==")
+    for boost in (False, True):
+        scheduler.set_boost(boost)
+        ticks = int(args.seconds * args.budget)
+        counts = {c.name: 0 for c in channels}
+        last = {c.name: 0 for c in channels}
+        gaps = {c.name: 0 for c in channels}
+        for tick in range(ticks):
+            name = scheduler.next().name
+            counts[name] += 1
+            gaps[name] = max(gaps[name], tick - last[name])
+            last[name] = tick
+        shares = scheduler.shares()
+        print(f"[{'peso inestable' if boost else 'en reposo'}] " + "  ".join(
+            f"{n}: {counts[n] / args.seconds:.2f} fps (esperado {shares[n]:.2f}, hueco máx "
+            f"{gaps[n] / args.budget:.1f}s)" for n in counts))
+
+    # Pintado: el frente cambia en cada frame, trasera y superior muestran una escena quieta
+    cols, rows, tile_w, tile_h = grid_layout(len(channels), args.width, args.height)
+    pngs = make_canned_pngs()
+    tiles = [Image.open(io.BytesIO(png)).convert("RGB").resize((tile_w, tile_h)) for png in pngs]
+    static = {c.name: tiles[i % len(tiles)] for i, c in enumerate(channels)}
+    moving = tiles
+    scheduler.set_boost(False)
+    ticks = int(args.seconds * args.budget)
+    frames = []
+    for tick in range(ticks):
+        channel = scheduler.next()
+        image = moving[tick % len(moving)] if channel.name == "Frente" else static[channel.name].copy()
+        frames.append((channels.index(channel), image))
+
+    # El resumen se calcula en el ejecutor de captura, fuera del hilo de Tk
+    t0 = time.perf_counter()
+    frames = [(index, image, frame_digest(image)) for index, image in frames]
+    digest_ms = (time.perf_counter() - t0) / len(frames) * 1e3
+
+    for mode in ("todo", "cambiados"):
+        canvas = Image.new("RGB", (args.width, args.height))
+        digests = [None] * len(channels)
+        painted = 0
+        t0 = time.perf_counter()
+        for index, image, digest in frames:
+            if mode == "todo":
+                # Sin estado por mosaico: se redibujan todos los mosaicos en cada frame
+                for other in range(len(channels)):
+                    canvas.paste(image if other == index else static[channels[other].name],
+                                 tile_origin(other, cols, tile_w, tile_h))
+                    painted += 1
+            elif digest != digests[index]:
+                canvas.paste(image, tile_origin(index, cols, tile_w, tile_h))
+                digests[index] = digest
+                painted += 1
+        elapsed = time.perf_counter() - t0
+        print(f"[pintar {mode}] {painted} mosaicos en {len(frames)} frames "
+              f"({painted / len(frames):.2f} por frame), hilo UI {elapsed / len(frames) * 1e3:.3f} ms por frame")
+    print(f"resumen del frame (ejecutor de captura): {digest_ms:.3f} ms por frame")
+
+
+# Contador de energía del paquete de CPU (Linux, Intel/AMD); no existe en VMs ni contenedores
+_RAPL_ENERGY = "/sys/class/powercap/intel-rapl:0/energy_uj"
+
+
+def _energy_uj():
+    try:
+        with open(_RAPL_ENERGY) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def bench_idle(args):
+    governor = IdleGovernor(args.zero_band, idle_after=args.idle_after)
+    capture_wake = threading.Event()
+    ui_wake = threading.Event()
+
+    def on_change(idle):
+        # Igual que _on_idle_change: despertar a la captura y al repintado que duermen
+        capture_wake.set()
+        ui_wake.set()
+
+    governor.on_change = on_change
+    driver = FakeWebDriver(latency=args.driver_latency)
+    buffers = FrameBuffers()
+    size = (args.width, args.height)
+    interval = args.interval_ms / 1000.0
+    latest = [None]
+    captures = []
+    running = [True]
+
+    def capture_loop():
+        while running[0]:
+            start = time.perf_counter()
+            captures.append(start)
+            latest[0] = capture_frame(driver, size, None, buffers)
+            capture_wake.clear()
+            remaining = governor.frame_interval(interval) - (time.perf_counter() - start)
+            if remaining > 0:
+                capture_wake.wait(remaining)
+
+    def ui_loop():
+        canvas = None
+        while running[0]:
+            image, latest[0] = latest[0], None
+            if image is not None:
+                if canvas is None or canvas.size != image.size:
+                    canvas = Image.new(image.mode, image.size)
+                canvas.paste(image)
+            ui_wake.clear()
+            ui_wake.wait(IDLE_FRAME_INTERVAL_S if governor.idle else args.tick_ms / 1000.0)
+
+    threads = [threading.Thread(target=capture_loop, daemon=True), threading.Thread(target=ui_loop, daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    process = psutil.Process()
+
+    def snapshot():
+        cpu = process.cpu_times()
+        return time.perf_counter(), cpu.user + cpu.system, len(captures), _energy_uj()
+
+    period = 1.0 / args.serial_rate
+    print(f"== Reposo: lecturas a {args.serial_rate:g} Hz, captura cada {args.interval_ms:g} ms, "
+          f"repintado cada {args.tick_ms:g} ms; reposo tras {args.idle_after:g}s en cero ==")
+    # Camión (subiendo, inestable; luego estable), balanza en cero, y el siguiente camión
+    t0 = time.perf_counter()
+    zero_start = t0 + args.truck
+    zero_end = zero_start + args.zero
+    end = zero_end + 2.0
+    marks = {"cero": zero_start + 1.0, "cero_fin": zero_start + args.idle_after - 0.1,
+             "reposo": zero_start + args.idle_after + 1.0, "reposo_fin": zero_end}
+    snaps = {}
+    arrival = None
+    n = 0
+    while True:
+        now = t0 + n * period
+        if now >= end:
+            break
+        delay = now - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        if now < zero_start:
+            weight, status = (20000.0, "ST") if now - t0 > args.truck / 2 else (15000.0, "US")
+        elif now < zero_end:
+            weight, status = 0.0, "ST"
+        else:
+            weight, status = 18000.0, "US"
+            if arrival is None:
+                arrival = time.perf_counter()
+        governor.feed(weight, status, now)
+        for name, at in marks.items():
+            if name not in snaps and time.perf_counter() >= at:
+                snaps[name] = snapshot()
+        n += 1
+    running[0] = False
+    capture_wake.set()
+    ui_wake.set()
+    for thread in threads:
+        thread.join()
+
+    windows = {}
+    for label, a, b in (("en cero, sin reposo", "cero", "cero_fin"), ("en cero, en reposo", "reposo", "reposo_fin")):
+        (wa, ca, fa, ea), (wb, cb, fb, eb) = snaps[a], snaps[b]
+        wall = wb - wa
+        windows[label] = (cb - ca) / wall
+        energy = f", {(eb - ea) / 1e6 / wall:.2f} W de paquete" if ea is not None and eb is not None else ""
+        print(f"[{label}] CPU {100 * (cb - ca) / wall:.1f}% de un núcleo, {(fb - fa) / wall:.2f} capturas/s "
+              f"({wall:.0f}s){energy}")
+    active, idle = windows.values()
+    if active:
+        print(f"ahorro de CPU en reposo: {100 * (1 - idle / active):.0f}% "
+              f"({(active - idle) * 3600:.0f} s de CPU por hora de balanza vacía)")
+    wake = next((c for c in captures if c >= arrival), None) if arrival else None
+    if wake is None:
+        print("sin captura después de la llegada del camión")
+        return
+    print(f"vuelta al ritmo normal: primera captura {1e3 * (wake - arrival):.1f} ms después de la primera "
+          f"lectura no nula (una lectura = {1e3 * period:.0f} ms) "
+          f"{'OK' if wake - arrival <= period else 'LENTO'}")
+
+
+def synthetic_scale_stream(rng, trucks, rate):
+    """Lecturas (peso, estado, tipo, ts) de una balanza y las anomalías inyectadas: [(tipo, ts0, ts1)]"""
+    readings, injected = [], []
+    ts = [0.0]
+
+    def emit(weight, status, weight_type="GS"):
+        ts[0] += 1.0 / rate
+        readings.append((round(weight + rng.gauss(0, 2.0)), status, weight_type, ts[0]))
+
+    for _ in range(trucks):
+        for _ in range(rng.randint(20, 60)):
+            emit(0, "ST")
+        load = rng.uniform(8000, 40000)
+        steps = int(rate * rng.uniform(2, 5))
+        for i in range(1, steps + 1):
+            emit(load * i / steps, "US")
+        for _ in range(int(rate * rng.uniform(2, 4))):
+            emit(load, "ST")
+        kind = rng.choice(ANOMALY_KINDS + (None,))
+        if kind == "spike":
+            emit(load + rng.choice((-1, 1)) * rng.uniform(500, 5000), "ST")
+            injected.append((kind, ts[0], ts[0]))
+        elif kind == "tare":
+            step = rng.choice((-1, 1)) * rng.uniform(40, 500)
+            emit(load + step, "ST")
+            injected.append((kind, ts[0], ts[0]))
+            load += step
+        elif kind == "drift":
+            start = ts[0]
+            for i in range(int(rate * 8)):
+                emit(load + 3.0 * i, "ST")
+            injected.append((kind, start, ts[0]))
+            load += 3.0 * i
+        elif kind == "oscillation":
+            start = ts[0]
+            for i in range(int(rate * 4)):
+                emit(load + (80 if i % 2 else -80), "US")
+            injected.append((kind, start, ts[0]))
+        for _ in range(int(rate * rng.uniform(1, 3))):
+            emit(load, "ST")
+        for i in range(steps - 1, -1, -1):
+            emit(load * i / steps, "US")
+    return readings, injected
+
+
+def bench_anomaly(args):
+    rng = random.Random(1)
+    streams = [synthetic_scale_stream(rng, args.trucks, args.serial_rate) for _ in range(args.scales)]
+    # Intercaladas como llegan a process_data: una lectura de cada balanza por turno
+    order = [(scale, r[i]) for i in range(max(len(r) for r, _ in streams))
+             for scale, (r, _) in enumerate(streams) if i < len(r)]
+    detectors = [AnomalyDetector() for _ in streams]
+    found = [[] for _ in streams]
+    with CpuMeter() as cpu:
+        for scale, (weight, status, weight_type, ts) in order:
+            for anomaly in detectors[scale].feed(weight, status, ts, weight_type):
+                if anomaly.new:
+                    found[scale].append(anomaly)
+
+    print(f"== Anomalías: {args.scales} balanzas, {len(order)} lecturas ({args.trucks} camiones por balanza) ==")
+    print(f"{cpu.cpu / len(order) * 1e6:.2f} µs por lectura, {len(order) / cpu.cpu:.0f} lecturas/s en un núcleo "
+          f"({len(order) / cpu.cpu / args.serial_rate:.0f} balanzas a {args.serial_rate:g} lecturas/s)")
+    for kind in ANOMALY_KINDS:
+        hits = misses = false = 0
+        for (_, injected), anomalies in zip(streams, found):
+            spans = [(t0, t1) for k, t0, t1 in injected if k == kind]
+            # Un episodio acierta si empieza dentro de lo inyectado (con margen de un par de lecturas)
+            margin = 2.0 / args.serial_rate
+            matched = set()
+            for anomaly in (a for a in anomalies if a.kind == kind):
+                span = next((s for s in spans if s[0] - margin <= anomaly.ts <= s[1] + margin), None)
+                if span is None:
+                    false += 1
+                else:
+                    matched.add(span)
+            hits += len(matched)
+            misses += len(spans) - len(matched)
+        print(f"  {kind:<12} inyectadas {hits + misses:>5}  detectadas {hits:>5}  "
+              f"no detectadas {misses:>4}  falsos positivos {false:>4}")
+
+
+def make_synthetic_capture(path, frames, rate, malformed):
+    """Graba tramas del simulador con marcas de tiempo sintéticas (sin esperar en tiempo real)"""
+    recorder = SerialRecorder(path)
+    t_ns = time.monotonic_ns()
+    step_ns = int(1e9 / rate)
+    for i, frame in zip(range(frames), FrameGenerator(malformed_ratio=malformed, seed=1)):
+        recorder.record(frame, t_ns=t_ns + i * step_ns)
+    recorder.close()
+
+
+def bench_replay(args):
+    path = args.file
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "synthetic.pscap")
+        make_synthetic_capture(path, args.frames, args.rate, args.malformed)
+    source = ReplaySource(path, speed=args.speed)
+    digest = hashlib.sha1()
+    parser = ProtocolParser(args.protocol)
+    counts = {"lines": 0, "parsed": 0, "stable": 0}
+
+    def on_line(line, trace):
+        counts["lines"] += 1
+        parsed = parser.parse(line)
+        if parsed:
+            counts["parsed"] += 1
+            counts["stable"] += parsed.status == "ST"
+            digest.update(repr(tuple(parsed)).encode("ascii"))
+
+    with CpuMeter() as cpu:
+        SerialLineReader(source, on_line=on_line, mode=args.read_mode).run(lambda: True)
+
+    size = os.path.getsize(path)
+    print(f"== Replay ({os.path.basename(path)}, velocidad {'máx' if not args.speed else f'{args.speed:g}x'}) ==")
+    print(f"Líneas: {counts['lines']} en {cpu.wall:.3f}s ({counts['lines'] / cpu.wall:.0f} líneas/s, "
+          f"{size / cpu.wall / 1e6:.1f} MB/s de captura)")
+    print(f"Parseadas: {counts['parsed']} (estables {counts['stable']}, protocolo {parser.name}), "
+          f"desconocidas: {parser.unknown}, inválidas: {parser.misparsed}")
+    print(f"Huella de regresión: {digest.hexdigest()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    serial_args = argparse.ArgumentParser(add_help=False)
+    serial_args.add_argument("--transport", choices=("loop", "pty"), default="loop")
+    serial_args.add_argument("--rate", type=float, default=1000.0, help="tramas por segundo")
+    serial_args.add_argument("--malformed", type=float, default=0.01, help="fracción de líneas corruptas")
+    serial_args.add_argument("--read-mode", choices=("bulk", "line"), default="bulk")
+
+    shot_args = argparse.ArgumentParser(add_help=False)
+    shot_args.add_argument("--width", type=int, default=1150)
+    shot_args.add_argument("--height", type=int, default=760)
+    shot_args.add_argument("--driver-latency", type=float, default=0.0, help="segundos por captura")
+
+    p = sub.add_parser("serial", parents=[serial_args])
+    p.add_argument("--frames", type=int, default=10000)
+    p = sub.add_parser("screenshot", parents=[shot_args])
+    p.add_argument("--frames", type=int, default=100)
+    p = sub.add_parser("ui-jitter", parents=[shot_args])
+    p.add_argument("--capture", choices=("thread", "process", "both"), default="both")
+    p.add_argument("--seconds", type=float, default=10.0)
+    p.add_argument("--tick-ms", type=float, default=16.0, help="periodo del bucle UI")
+    p.add_argument("--interval-ms", type=float, default=50.0, help="periodo de captura")
+    p = sub.add_parser("grid", parents=[shot_args])
+    p.add_argument("--seconds", type=float, default=120.0)
+    p.add_argument("--budget", type=float, default=5.0, help="capturas por segundo entre todos los canales")
+    p = sub.add_parser("idle", parents=[shot_args])
+    p.add_argument("--serial-rate", type=float, default=10.0, help="lecturas por segundo del indicador")
+    p.add_argument("--interval-ms", type=float, default=200.0, help="periodo de captura activo")
+    p.add_argument("--tick-ms", type=float, default=50.0, help="periodo de repintado activo")
+    p.add_argument("--truck", type=float, default=4.0, help="segundos con un camión antes de vaciar")
+    p.add_argument("--zero", type=float, default=40.0, help="segundos con la balanza en cero")
+    p.add_argument("--idle-after", type=float, default=10.0, help="reposo tras tantos segundos en cero "
+                                                                    "(la app usa 180)")
+    p.add_argument("--zero-band", type=float, default=50.0)
+    p = sub.add_parser("anomaly")
+    p.add_argument("--scales", type=int, default=4)
+    p.add_argument("--trucks", type=int, default=500, help="camiones por balanza")
+    p.add_argument("--serial-rate", type=float, default=10.0, help="lecturas por segundo del indicador")
+    p = sub.add_parser("replay", parents=[serial_args])
+    p.add_argument("--file", help="captura .pscap; si se omite se genera una sintética")
+    p.add_argument("--frames", type=int, default=200000, help="tramas de la captura sintética")
+    p.add_argument("--speed", type=float, default=0, help="0 = velocidad máxima")
+    p.add_argument("--protocol", default="auto", help="protocolo fijo o auto")
+    p = sub.add_parser("all", parents=[serial_args, shot_args])
+    p.add_argument("--frames", type=int, default=5000)
+
+    args = parser.parse_args()
+    if args.bench in ("serial", "all"):
+        bench_serial(args)
+    if args.bench == "replay":
+        bench_replay(args)
+    if args.bench == "ui-jitter":
+        bench_ui_jitter(args)
+    if args.bench == "grid":
+        bench_grid(args)
+    if args.bench == "idle":
+        bench_idle(args)
+    if args.bench == "anomaly":
+        bench_anomaly(args)
+    if args.bench in ("screenshot", "all"):
+        if args.bench == "all":
+            args.frames = min(args.frames, 100)
+        bench_screenshot(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""Benchmarks del registro de pesajes.
+
+report: genera pesajes cerrados (entrada + salida) repartidos en varios días y, en cada punto de
+control, mide el reporte desde los totales precalculados contra una consulta que recorre la historia.
+
+export: carga N pesajes sintéticos de una sola vez y mide la exportación por bloques (CSV y, si
+pyarrow está instalado, Parquet): filas/s, tamaño del archivo y memoria máxima del proceso.
+
+history: llena el historial con meses de lecturas y mensajes del log y mide la lectura vigente a
+una hora, páginas por rango horario (primera y profunda) y búsquedas de texto en el log.
+
+Uso:
+    python benchmarks/bench_store.py report --weighings 50000 --days 30
+    python benchmarks/bench_store.py export --weighings 1000000
+    python benchmarks/bench_store.py history --days 90
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history_store import HistoryStore  # noqa: E402
+from weighing import WeighingStore, shift_of  # noqa: E402
+from weighing_export import EXPORT_CHUNK_ROWS, export_weighings, parquet_available  # noqa: E402
+
+_RESCAN = ("SELECT shift, scale, count(*), sum(net), min(net), max(net) FROM weighings "
+           "WHERE status = 'closed' AND day = ? GROUP BY shift, scale")
+
+
+def _best_of(func, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def fill(store, count, days, scales, rng, start_ts):
+    """Crea count pesajes cerrados repartidos en days días; devuelve el día más reciente"""
+    span = days * 86400.0
+    for n in range(count):
+        ts = start_ts + span * n / count
+        tare = rng.uniform(8000, 15000)
+        load = rng.uniform(5000, 30000)
+        scale = scales[n % len(scales)]
+        plate = f"BNC{n:06d}"
+        store.record_capture(tare + load, ts, scale, plate)
+        store.record_capture(tare, ts + 600, scale, plate)
+    return shift_of(start_ts + span)[0]
+
+
+def bench_report(args):
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench_pesajes.db")
+    store = WeighingStore(path)
+    rng = random.Random(1)
+    scales = ("COM3", "COM4")
+    start_ts = time.time() - args.days * 86400.0
+    step = max(1, args.weighings // args.checkpoints)
+
+    print(f"== Reporte diario vs historia ({args.weighings} pesajes en {args.days} días) ==")
+    print(f"{'pesajes':>9} {'inserción/s':>12} {'reporte (totales)':>18} {'reporte (recorrido)':>20}")
+    done = 0
+    while done < args.weighings:
+        batch = min(step, args.weighings - done)
+        t0 = time.perf_counter()
+        # Cada lote cubre su propio tramo de días, así la historia crece hacia el presente
+        first = start_ts + args.days * 86400.0 * done / args.weighings
+        day = fill(store, batch, args.days * batch / args.weighings, scales, rng, first)
+        rate = batch / (time.perf_counter() - t0)
+        done += batch
+        from_totals = _best_of(lambda: store.report(day))
+        rescan = _best_of(lambda: store._conn.execute(_RESCAN, (day,)).fetchall())
+        print(f"{done:>9} {rate:>12.0f} {from_totals * 1e3:>15.3f} ms {rescan * 1e3:>17.3f} ms")
+
+    print()
+    print(store.report(day))
+    store.close()
+
+
+def bulk_fill(path, count, days, rng):
+    """Inserta count pesajes cerrados directamente (sin totales): solo para medir la exportación"""
+    store = WeighingStore(path)
+    start_ts = time.time() - days * 86400.0
+    step = days * 86400.0 / count
+
+    def rows():
+        for n in range(count):
+            ts = start_ts + n * step
+            tare = rng.uniform(8000, 15000)
+            gross = tare + rng.uniform(5000, 30000)
+            day, shift = shift_of(ts + 600)
+            yield (f"BNC{n % 5000:04d}", ("COM3", "COM4")[n % 2], ts, gross, ts + 600, tare, gross, tare,
+                   gross - tare, "kg", day, shift, "closed", f"snapshots/{n}_in.jpg", f"snapshots/{n}_out.jpg")
+
+    with store._conn:
+        store._conn.executemany(
+            "INSERT INTO weighings (plate, scale, entry_ts, entry_weight, exit_ts, exit_weight, gross, tare, net, "
+            "unit, day, shift, status, entry_snapshot, exit_snapshot) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows())
+    store.close()
+
+
+class _PeakRss:
+    """Muestrea la memoria residente del proceso en un hilo mientras dura el bloque"""
+
+    def __enter__(self):
+        self.process = psutil.Process()
+        self.base = self.process.memory_info().rss
+        self.peak = self.base
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while self._running:
+            self.peak = max(self.peak, self.process.memory_info().rss)
+            time.sleep(0.01)
+
+    def __exit__(self, *exc):
+        self._running = False
+        self._thread.join()
+
+
+def bench_export(args):
+    workdir = tempfile.mkdtemp()
+    path = args.db or os.path.join(workdir, "bench_export.db")
+    if not args.db:
+        t0 = time.perf_counter()
+        bulk_fill(path, args.weighings, args.days, random.Random(1))
+        print(f"Carga de {args.weighings} pesajes: {time.perf_counter() - t0:.1f}s")
+
+    formats = ["csv"] + (["parquet"] if parquet_available() else [])
+    if not parquet_available():
+        print("(pyarrow no está instalado: se omite Parquet)")
+    print(f"== Exportación por bloques de {args.chunk} filas ==")
+    for fmt in formats:
+        out = os.path.join(workdir, f"export.{fmt}")
+        updates = [0]
+
+        def progress(done, total):
+            updates[0] += 1
+
+        with _PeakRss() as rss:
+            t0 = time.perf_counter()
+            rows = export_weighings(path, out, fmt, chunk_size=args.chunk, progress=progress)
+            elapsed = time.perf_counter() - t0
+        print(f"[{fmt}] {rows} filas en {elapsed:.2f}s ({rows / elapsed:.0f} filas/s), "
+              f"{os.path.getsize(out) / 1e6:.1f} MB, memoria máx +{(rss.peak - rss.base) / 1e6:.1f} MB, "
+              f"{updates[0]} avisos de progreso")
+
+
+_LOG_SAMPLES = ("⚖ Pesaje #{n} BNC{p:04d}: entrada {w:.0f} kg", "✅ Pesaje cerrado #{n} BNC{p:04d}: neto {w:.0f} kg",
+                "⚠ Keep-alive error: timeout", "🔌 Conectado a COM3 a 9600 baudios", "📤 {n} pesajes exportados",
+                "⏱ Lecturas: p50 {w:.0f} ms")
+
+
+def bulk_history(path, days, reading_every, log_every, rng):
+    """Inserta lecturas (una cada reading_every s) y mensajes del log (uno cada log_every s)"""
+    store = HistoryStore(path)
+    start_ts = time.time() - days * 86400.0
+    readings = int(days * 86400 / reading_every)
+    logs = int(days * 86400 / log_every)
+
+    def reading_rows():
+        for n in range(readings):
+            ts = start_ts + n * reading_every
+            weight = round(rng.uniform(0, 45000), -1)
+            yield ts, weight, "ST" if n % 3 else "US", "kg", ("COM3", "COM4")[n % 2], f"ST,GS,{weight:+09.0f}kg"
+
+    def log_rows():
+        for n in range(logs):
+            text = _LOG_SAMPLES[n % len(_LOG_SAMPLES)].format(n=n, p=n % 5000, w=rng.uniform(0, 45000))
+            yield start_ts + n * log_every, text
+
+    with store._conn:
+        store._conn.executemany(
+            "INSERT INTO readings (ts, weight, status, unit, scale, raw) VALUES (?, ?, ?, ?, ?, ?)", reading_rows())
+        store._conn.executemany("INSERT INTO log_messages (ts, message) VALUES (?, ?)", log_rows())
+    store.close()
+    return readings, logs, start_ts
+
+
+def bench_history(args):
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench_historial.db")
+    rng = random.Random(1)
+    t0 = time.perf_counter()
+    readings, logs, start_ts = bulk_history(path, args.days, args.reading_every, args.log_every, rng)
+    print(f"Carga de {readings} lecturas y {logs} mensajes ({args.days} días): {time.perf_counter() - t0:.1f}s, "
+          f"{os.path.getsize(path) / 1e6:.0f} MB")
+
+    store = HistoryStore(path)
+    span = args.days * 86400.0
+    probes = [start_ts + span * rng.random() for _ in range(20)]
+
+    def worst(func):
+        return max(_best_of(lambda: func(t), repeat=3) for t in probes) * 1e3
+
+    # Cursor de la página 50 de cada hora: la página profunda no debe costar más que la primera
+    deep = {}
+    for t in probes:
+        after = None
+        for _ in range(49):
+            after = store.readings(t, t + 86400, after=after)[1]
+        deep[t] = after
+
+    def deep_page(t):
+        return store.readings(t, t + 86400, after=deep[t])
+
+    print(f"== Historial: peor caso sobre {len(probes)} horas al azar ==")
+    results = (
+        ("lectura vigente a una hora", lambda t: store.reading_at(t)),
+        ("lectura vigente (balanza COM4)", lambda t: store.reading_at(t, "COM4")),
+        ("página de lecturas (1 día)", lambda t: store.readings(t, t + 86400)),
+        ("página 50 de lecturas", deep_page),
+        ("log sin texto (1 día)", lambda t: store.search_log(t, t + 86400)),
+        ("log 'cerrado' (1 día)", lambda t: store.search_log(t, t + 86400, "cerrado")),
+        ("log 'BNC0042' (todo)", lambda t: store.search_log(start_ts, start_ts + span, "BNC0042")),
+        ("log 'keep tim*' (7 días)", lambda t: store.search_log(t, t + 7 * 86400, "keep tim*")),
+    )
+    for name, func in results:
+        print(f"{name:<32} {worst(func):>9.2f} ms")
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="bench", required=True)
+    p = sub.add_parser("report")
+    p.add_argument("--weighings", type=int, default=50000)
+    p.add_argument("--days", type=int, default=30)
+    p.add_argument("--checkpoints", type=int, default=5)
+    p.add_argument("--db", help="archivo SQLite; por defecto uno temporal")
+    p = sub.add_parser("export")
+    p.add_argument("--weighings", type=int, default=1000000)
+    p.add_argument("--days", type=int, default=365)
+    p.add_argument("--chunk", type=int, default=EXPORT_CHUNK_ROWS)
+    p.add_argument("--db", help="base existente a exportar; por defecto se genera una sintética")
+    p = sub.add_parser("history")
+    p.add_argument("--days", type=int, default=90)
+    p.add_argument("--reading-every", type=float, default=2.0, help="segundos entre lecturas guardadas")
+    p.add_argument("--log-every", type=float, default=10.0, help="segundos entre mensajes del log")
+    p.add_argument("--db", help="archivo SQLite; por defecto uno temporal")
+    args = parser.parse_args()
+    if args.bench == "report":
+        bench_report(args)
+    elif args.bench == "export":
+        bench_export(args)
+    else:
+        bench_history(args)
+
+
+if __name__ == "__main__":
+    main()
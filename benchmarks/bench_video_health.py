@@ -0,0 +1,185 @@
+"""Salud del video por eventos contra un Chrome simulado (endpoint de depuración falso).
+
+El servidor falso atiende /json/list y el WebSocket CDP de N ventanas. Cada "página" informa por
+el binding cortes del video a intervalos aleatorios; al recibir __pesajeRecover vuelve a dar
+frames tras --decode-ms e informa "recovered" con la duración del corte, igual que el monitor
+inyectado. Mide, con VideoHealthMonitor real:
+
+- reacción: corte informado -> comando de recuperación recibido por la página;
+- corte total: corte informado -> primer frame nuevo;
+- tráfico en estado sano: comandos CDP por minuto sin cortes (el keep-alive por sondeo hacía
+  execute_script + setWebLifecycleState cada 5 s por ventana, 24 comandos por minuto).
+
+Para comparar, la reacción del keep-alive por sondeo es el tiempo hasta su próximo tick de 5 s.
+
+Uso:
+    python benchmarks/bench_video_health.py --windows 3 --stalls 40 --quiet 30
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import video_health  # noqa: E402
+from tracing import _percentile  # noqa: E402
+from video_health import VideoHealthMonitor, HEALTH_BINDING, M_CDP_COMMANDS, M_VIDEO_RECOVERY  # noqa: E402
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# Periodo del keep-alive por sondeo que reemplaza el monitor por eventos
+POLL_KEEPALIVE_S = 5.0
+
+
+def _frame(payload):
+    length = len(payload)
+    if length < 126:
+        return struct.pack("!BB", 0x81, length) + payload
+    if length < 65536:
+        return struct.pack("!BBH", 0x81, 126, length) + payload
+    return struct.pack("!BBQ", 0x81, 127, length) + payload
+
+
+async def _read_frame(reader):
+    b1, b2 = await reader.readexactly(2)
+    length = b2 & 0x7F
+    if length == 126:
+        (length,) = struct.unpack("!H", await reader.readexactly(2))
+    elif length == 127:
+        (length,) = struct.unpack("!Q", await reader.readexactly(8))
+    mask = await reader.readexactly(4) if b2 & 0x80 else b"\0\0\0\0"
+    data = await reader.readexactly(length)
+    return b1 & 0x0F, bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+
+
+class FakePage:
+    """Una ventana: responde comandos CDP y emite eventos del binding"""
+
+    def __init__(self, target_id, decode_s):
+        self.target_id = target_id
+        self.decode_s = decode_s
+        self.writer = None
+        self.stalled_at = None
+        self.reactions = []
+
+    def emit(self, info):
+        params = {"name": HEALTH_BINDING, "payload": json.dumps(info), "executionContextId": 1}
+        self.writer.write(_frame(json.dumps({"method": "Runtime.bindingCalled", "params": params}).encode()))
+
+    def stall(self):
+        self.stalled_at = time.perf_counter()
+        self.emit({"kind": "stalled", "index": 0, "reason": "sin frames"})
+
+    async def _recover(self):
+        await asyncio.sleep(self.decode_s)
+        stalled_ms = round((time.perf_counter() - self.stalled_at) * 1000)
+        self.stalled_at = None
+        self.emit({"kind": "recovered", "index": 0, "stalled_ms": stalled_ms})
+
+    async def serve(self, reader, writer):
+        self.writer = writer
+        while True:
+            opcode, payload = await _read_frame(reader)
+            if opcode == 0x8:
+                return
+            message = json.loads(payload)
+            expression = message.get("params", {}).get("expression", "")
+            if "__pesajeRecover()" in expression and self.stalled_at is not None:
+                self.reactions.append(time.perf_counter() - self.stalled_at)
+                asyncio.ensure_future(self._recover())
+            writer.write(_frame(json.dumps({"id": message["id"], "result": {}}).encode()))
+
+
+class FakeDevTools:
+    def __init__(self, pages):
+        self.pages = {page.target_id: page for page in pages}
+        self.port = None
+
+    async def start(self):
+        server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = server.sockets[0].getsockname()[1]
+        return server
+
+    async def _handle(self, reader, writer):
+        head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        path = head[0].split()[1]
+        headers = {k.strip().lower(): v.strip() for k, _, v in (line.partition(":") for line in head[1:] if line)}
+        if path == "/json/list":
+            body = json.dumps([{"id": t, "type": "page",
+                                "webSocketDebuggerUrl": f"ws://127.0.0.1:{self.port}/devtools/page/{t}"}
+                               for t in self.pages]).encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: "
+                         + str(len(body)).encode() + b"\r\n\r\n" + body)
+            await writer.drain()
+            writer.close()
+            return
+        accept = base64.b64encode(hashlib.sha1((headers["sec-websocket-key"] + _WS_GUID).encode()).digest())
+        writer.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+        try:
+            await self.pages[path.rsplit("/", 1)[1]].serve(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+
+async def run(args):
+    pages = [FakePage(f"target{i}", args.decode_ms / 1000.0) for i in range(args.windows)]
+    devtools = FakeDevTools(pages)
+    server = await devtools.start()
+    address = f"127.0.0.1:{devtools.port}"
+    monitors = [VideoHealthMonitor(address, page.target_id, f"cam{i}") for i, page in enumerate(pages)]
+    tasks = [asyncio.ensure_future(monitor.run()) for monitor in monitors]
+    while not all(monitor.connected for monitor in monitors):
+        await asyncio.sleep(0.01)
+
+    print(f"== Salud del video: {args.windows} ventanas, {args.stalls} cortes, decodificación {args.decode_ms:g} ms ==")
+    # Estado sano: nada que informar, nada que enviar
+    before = M_CDP_COMMANDS.value
+    await asyncio.sleep(args.quiet)
+    quiet_rate = (M_CDP_COMMANDS.value - before) / args.quiet * 60
+    print(f"tráfico en estado sano: {quiet_rate:.1f} comandos/min en total "
+          f"(sondeo: {60 / POLL_KEEPALIVE_S * 2 * args.windows:.0f} comandos/min)")
+
+    rng = random.Random(1)
+    for _ in range(args.stalls):
+        page = rng.choice(pages)
+        page.stall()
+        while page.stalled_at is not None:
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(rng.uniform(0.01, 0.05))
+
+    reactions = sorted(r for page in pages for r in page.reactions)
+    # El sondeo ve el corte en su próximo tick: uniforme entre 0 y 5 s
+    polled = sorted(rng.uniform(0, POLL_KEEPALIVE_S) for _ in reactions)
+    print(f"reacción por eventos: p50 {_percentile(reactions, 0.5) * 1e3:.2f} ms, "
+          f"p99 {_percentile(reactions, 0.99) * 1e3:.2f} ms")
+    print(f"corte total (corte -> frame nuevo): media {M_VIDEO_RECOVERY.mean() * 1e3:.1f} ms")
+    print(f"reacción del sondeo cada {POLL_KEEPALIVE_S:g}s: p50 {_percentile(polled, 0.5) * 1e3:.0f} ms, "
+          f"p99 {_percentile(polled, 0.99) * 1e3:.0f} ms")
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--windows", type=int, default=3)
+    parser.add_argument("--stalls", type=int, default=40)
+    parser.add_argument("--quiet", type=float, default=30.0, help="segundos sin cortes para medir tráfico")
+    parser.add_argument("--decode-ms", type=float, default=40.0, help="del play() al primer frame")
+    args = parser.parse_args()
+    # Sin recargas durante la medición
+    video_health.VIDEO_RELOAD_AFTER_S = 3600.0
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
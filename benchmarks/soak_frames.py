@@ -0,0 +1,204 @@
+"""Prueba de resistencia del camino de frames: horas de video en minutos, falla si la memoria crece.
+
+Un hilo de captura toma PNGs de FakeWebDriver, los decodifica y redimensiona con capture_frame y
+los deja en un buzón; el hilo principal (la "UI") los pega sobre una imagen fija, igual que
+_paste_frame sobre el PhotoImage (con --tk, sobre un PhotoImage real). Cada --resize-every frames
+cambia el tamaño de destino, como al redimensionar la ventana.
+
+Tras un calentamiento, se muestrea periódicamente el RSS, la cantidad de objetos del recolector
+y los bloques asignados por Python. Falla (código 1) si alguno supera el máximo del
+calentamiento más su tolerancia, o si la pendiente del RSS en la segunda mitad supera
+--max-slope MB/h de tiempo simulado.
+
+--mode reuse es el camino actual (FrameBuffers, lienzos reservados y destino fijo); --mode alloc reproduce el
+anterior (imagen nueva por frame) para comparar fallos de página por frame, que miden cuánta
+memoria nueva se pide al sistema.
+
+Uso:
+    python benchmarks/soak_frames.py --frames 432000            (24 h a 5 FPS)
+    python benchmarks/soak_frames.py --frames 20000 --mode alloc
+"""
+import argparse
+import gc
+import os
+import resource
+import sys
+import threading
+import time
+
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+from frame_pipeline import capture_frame, FrameBuffers  # noqa: E402
+from scale_simulator import FakeWebDriver  # noqa: E402
+
+# Tamaños del canvas que se alternan (ventana maximizada / restaurada / panel lateral abierto /
+# igual a la captura de FakeWebDriver, el camino sin redimensionar que entrega lienzos reservados)
+_SIZES = ((1150, 760), (960, 640), (1150, 700), (960, 540))
+
+
+class _Sample:
+    __slots__ = ("frame", "rss", "objects", "blocks")
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.rss = psutil.Process().memory_info().rss
+        self.objects = len(gc.get_objects())
+        self.blocks = sys.getallocatedblocks()
+
+
+def _slope(samples, frames_per_hour):
+    """Pendiente del RSS (MB por hora simulada) por mínimos cuadrados"""
+    n = len(samples)
+    if n < 2:
+        return 0.0
+    xs = [s.frame / frames_per_hour for s in samples]
+    ys = [s.rss / 1e6 for s in samples]
+    mx, my = sum(xs) / n, sum(ys) / n
+    den = sum((x - mx) ** 2 for x in xs)
+    return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / den if den else 0.0
+
+
+class _Painter:
+    """Destino de los frames en el hilo principal: imagen PIL fija o PhotoImage de Tk"""
+
+    def __init__(self, use_tk, reuse):
+        self.reuse = reuse
+        self.target = None
+        self.root = None
+        if use_tk:
+            import tkinter as tk
+            from PIL import ImageTk
+            self._photo_cls = ImageTk.PhotoImage
+            self.root = tk.Tk()
+            self.root.withdraw()
+
+    def paint(self, image):
+        if self.root is not None:
+            if not self.reuse or self.target is None or (self.target.width(), self.target.height()) != image.size:
+                self.target = self._photo_cls(image)
+            else:
+                self.target.paste(image)
+            self.root.update_idletasks()
+            return
+        if not self.reuse or self.target is None or self.target.size != image.size or self.target.mode != image.mode:
+            self.target = Image.new(image.mode, image.size)
+        self.target.paste(image)
+
+
+def run(args):
+    reuse = args.mode == "reuse"
+    driver = FakeWebDriver()
+    buffers = FrameBuffers() if reuse else None
+    painter = _Painter(args.tk, reuse)
+
+    mailbox = [None]
+    lock = threading.Lock()
+    produced = [0]
+    size = [_SIZES[0]]
+    done = threading.Event()
+
+    def capture():
+        while not done.is_set():
+            image = capture_frame(driver, size[0], None, buffers)
+            with lock:
+                mailbox[0] = image
+            produced[0] += 1
+            if produced[0] >= args.frames:
+                done.set()
+
+    thread = threading.Thread(target=capture, name="driver-io_0", daemon=True)
+    frames_per_hour = args.fps * 3600
+    warmup = int(args.frames * args.warmup)
+    print(f"== Soak del camino de frames: {args.frames} frames (~{args.frames / frames_per_hour:.1f} h a "
+          f"{args.fps:g} FPS), modo {args.mode}{' + Tk' if args.tk else ''} ==")
+
+    samples = []
+    painted = 0
+    faults = None
+    t0 = time.perf_counter()
+    thread.start()
+    next_sample = 0
+    while not done.is_set() or mailbox[0] is not None:
+        with lock:
+            image, mailbox[0] = mailbox[0], None
+        if image is None:
+            time.sleep(0.0005)
+            continue
+        painter.paint(image)
+        del image
+        painted += 1
+        frame = produced[0]
+        if frame // args.resize_every != (frame - 1) // args.resize_every:
+            size[0] = _SIZES[(frame // args.resize_every) % len(_SIZES)]
+        if faults is None and frame >= warmup:
+            faults = (resource.getrusage(resource.RUSAGE_SELF).ru_minflt, frame)
+        if frame >= next_sample:
+            gc.collect()
+            samples.append(_Sample(frame))
+            next_sample = frame + args.sample_every
+            if args.verbose:
+                s = samples[-1]
+                print(f"  frame {s.frame:>8}: RSS {s.rss / 1e6:7.1f} MB, objetos {s.objects}, bloques {s.blocks}")
+    thread.join()
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    samples.append(_Sample(produced[0]))
+
+    base = [s for s in samples if s.frame <= warmup] or samples[:1]
+    steady = [s for s in samples if s.frame > warmup]
+    rss_base = max(s.rss for s in base)
+    obj_base = max(s.objects for s in base)
+    blocks_base = max(s.blocks for s in base)
+    rss_peak = max(s.rss for s in steady) if steady else rss_base
+    obj_peak = max(s.objects for s in steady) if steady else obj_base
+    blocks_peak = max(s.blocks for s in steady) if steady else blocks_base
+    slope = _slope(samples[len(samples) // 2:], frames_per_hour)
+    minflt, from_frame = faults or (resource.getrusage(resource.RUSAGE_SELF).ru_minflt, 0)
+    fault_rate = (resource.getrusage(resource.RUSAGE_SELF).ru_minflt - minflt) / max(produced[0] - from_frame, 1)
+
+    print(f"{produced[0]} frames capturados, {painted} pintados en {elapsed:.0f}s "
+          f"({produced[0] / elapsed:.0f} frames/s, x{produced[0] / elapsed / args.fps:.0f} tiempo real)")
+    print(f"RSS: calentamiento {rss_base / 1e6:.1f} MB, pico estable {rss_peak / 1e6:.1f} MB, "
+          f"pendiente {slope:+.2f} MB/h")
+    print(f"objetos gc: {obj_base} -> {obj_peak}; bloques Python: {blocks_base} -> {blocks_peak}")
+    print(f"fallos de página menores por frame (memoria nueva del sistema): {fault_rate:.0f}")
+
+    failures = []
+    if rss_peak - rss_base > args.rss_tolerance * 1e6:
+        failures.append(f"RSS creció {(rss_peak - rss_base) / 1e6:.1f} MB (tolerancia {args.rss_tolerance} MB)")
+    if slope > args.max_slope:
+        failures.append(f"pendiente del RSS {slope:.2f} MB/h > {args.max_slope} MB/h")
+    if obj_peak - obj_base > args.object_tolerance:
+        failures.append(f"objetos gc crecieron {obj_peak - obj_base} (tolerancia {args.object_tolerance})")
+    if blocks_peak - blocks_base > args.block_tolerance:
+        failures.append(f"bloques Python crecieron {blocks_peak - blocks_base} (tolerancia {args.block_tolerance})")
+    if failures:
+        print("FALLA: " + "; ".join(failures))
+        return 1
+    print("OK: memoria estable")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=432000, help="frames a procesar (432000 = 24 h a 5 FPS)")
+    parser.add_argument("--fps", type=float, default=5.0, help="FPS reales que se simulan (para las horas)")
+    parser.add_argument("--mode", choices=("reuse", "alloc"), default="reuse")
+    parser.add_argument("--tk", action="store_true", help="pegar en un PhotoImage real (requiere display)")
+    parser.add_argument("--resize-every", type=int, default=5000, help="frames entre cambios de tamaño")
+    parser.add_argument("--warmup", type=float, default=0.1, help="fracción inicial excluida de la comparación")
+    parser.add_argument("--sample-every", type=int, default=2000)
+    parser.add_argument("--rss-tolerance", type=float, default=16.0, help="MB sobre el máximo del calentamiento")
+    parser.add_argument("--max-slope", type=float, default=1.0, help="MB por hora simulada")
+    parser.add_argument("--object-tolerance", type=int, default=500)
+    parser.add_argument("--block-tolerance", type=int, default=2000)
+    parser.add_argument("--verbose", action="store_true")
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Varias cámaras a la vez: canales, reparto del presupuesto de capturas y disposición en grilla.
+
+Cada canal es una ventana del mismo Chrome con su propia URL de Hik-Connect (frente, trasera,
+superior...). WebDriver captura una ventana por vez, así que el total de capturas por segundo
+es un presupuesto que hay que repartir: CaptureScheduler usa stride scheduling (round-robin
+ponderado y determinista). Cada canal avanza su "pase" en 1/peso al ser capturado y siempre se
+elige el de pase menor; un canal de peso 3 recibe el triple de frames que uno de peso 1, sin
+ráfagas. Mientras el peso está inestable, los canales marcados "lane" multiplican su peso por
+LANE_BOOST.
+
+frame_digest resume un frame en un entero barato de comparar: la grilla solo repinta los
+mosaicos cuyo contenido cambió.
+"""
+import json
+import math
+import zlib
+
+from metrics import REGISTRY
+
+M_TILES_PAINTED = REGISTRY.counter("grid_tiles_painted_total", "Mosaicos de la grilla repintados")
+M_TILES_SKIPPED = REGISTRY.counter("grid_tiles_unchanged_total", "Frames descartados por ser iguales al mosaico")
+
+# Canales de cámara; sin archivo (o con un solo canal) se usa la vista única de siempre
+CAMERA_CHANNELS_FILE = "camera_channels.json"
+
+# Multiplicador de prioridad de las cámaras del carril mientras el peso no está estable
+LANE_BOOST = 4.0
+
+# Lado de la miniatura usada para el resumen del frame (1/8 en cada eje)
+_DIGEST_REDUCE = 8
+
+
+class CameraChannel:
+    """Una cámara: nombre visible, URL, prioridad base y si mira el carril de la balanza"""
+
+    __slots__ = ("name", "url", "priority", "lane", "handle", "frames")
+
+    def __init__(self, name, url, priority=1.0, lane=False):
+        self.name = name
+        self.url = url
+        self.priority = max(float(priority), 0.01)
+        self.lane = bool(lane)
+        # Ventana de Chrome del canal (la asigna quien abre el navegador)
+        self.handle = None
+        self.frames = REGISTRY.counter("channel_frames_total", "Frames capturados por canal",
+                                       labels={"channel": name})
+
+
+def load_channels(path=CAMERA_CHANNELS_FILE, default_url=None):
+    """Lee [{"name", "url", "priority", "lane"}, ...]; si no hay archivo, un canal con default_url"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        entries = []
+    channels = [CameraChannel(e["name"], e["url"], e.get("priority", 1.0), e.get("lane", False))
+                for e in entries if e.get("name") and e.get("url")]
+    if not channels and default_url:
+        channels = [CameraChannel("Cámara", default_url, lane=True)]
+    return channels
+
+
+class CaptureScheduler:
+    """Elige qué canal capturar a continuación dentro de un presupuesto total de frames/s"""
+
+    def __init__(self, channels, budget_fps):
+        self.channels = list(channels)
+        self.budget_fps = budget_fps
+        self.boost = False
+        self._passes = [0.0] * len(self.channels)
+
+    @property
+    def interval(self):
+        """Segundos entre capturas (el presupuesto es de todo el navegador, no por canal)"""
+        return 1.0 / self.budget_fps
+
+    def weight(self, channel):
+        if self.boost and channel.lane:
+            return channel.priority * LANE_BOOST
+        return channel.priority
+
+    def shares(self):
+        """Frames/s que recibe cada canal con los pesos actuales: {nombre: fps}"""
+        total = sum(self.weight(c) for c in self.channels)
+        return {c.name: self.budget_fps * self.weight(c) / total for c in self.channels}
+
+    def set_boost(self, boost):
+        if boost == self.boost:
+            return
+        self.boost = boost
+        # Al cambiar los pesos, ningún canal arrastra "deuda" del reparto anterior
+        self._passes = [min(self._passes)] * len(self.channels)
+
+    def next(self):
+        passes = self._passes
+        index = passes.index(min(passes))
+        channel = self.channels[index]
+        passes[index] += 1.0 / self.weight(channel)
+        return channel
+
+
+def grid_layout(count, width, height):
+    """(columnas, filas, ancho, alto del mosaico) para count canales en un canvas de width x height"""
+    cols = math.ceil(math.sqrt(count))
+    rows = math.ceil(count / cols)
+    return cols, rows, width // cols, height // rows
+
+
+def frame_digest(image):
+    """Resumen del contenido de un frame (CRC de una miniatura 1/8): iguales => mismo resumen"""
+    return zlib.crc32(image.reduce(_DIGEST_REDUCE).tobytes()) if min(image.size) >= _DIGEST_REDUCE else 0
+
+
+def tile_origin(index, cols, tile_w, tile_h):
+    return (index % cols) * tile_w, (index // cols) * tile_h
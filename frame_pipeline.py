@@ -0,0 +1,131 @@
+import io
+import struct
+import sys
+import time
+
+from PIL import Image
+
+from metrics import REGISTRY
+from tracing import StageTracer
+
+M_FRAMES = REGISTRY.counter("frames_total", "Capturas del navegador procesadas")
+M_CAPTURE = REGISTRY.histogram("frame_capture_seconds", "Latencia de get_screenshot_as_png")
+M_DECODE = REGISTRY.histogram("frame_decode_seconds", "Latencia de decodificación PNG")
+M_RESIZE = REGISTRY.histogram("frame_resize_seconds", "Latencia de redimensionado")
+M_DECODE_REUSED = REGISTRY.counter("frame_decode_reused_total", "Frames decodificados sobre la memoria del anterior")
+M_CANVAS_REUSED = REGISTRY.counter("frame_canvas_reused_total", "Frames entregados en un lienzo ya reservado")
+
+# Lienzos de salida por FrameBuffers: el que se está pintando, el último entregado y uno libre
+FRAME_CANVAS_POOL = 3
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_PNG_CHUNK = struct.Struct(">I4s")
+
+
+def _png_idat(png):
+    """Datos comprimidos del PNG (los IDAT concatenados), lo que espera el decodificador zip de Pillow"""
+    data = memoryview(png)
+    parts = []
+    pos = len(_PNG_SIGNATURE)
+    while pos + _PNG_CHUNK.size <= len(data):
+        length, kind = _PNG_CHUNK.unpack_from(data, pos)
+        pos += _PNG_CHUNK.size
+        if kind == b"IDAT":
+            parts.append(data[pos:pos + length])
+        elif kind == b"IEND":
+            break
+        pos += length + 4  # datos + CRC
+    return b"".join(parts)
+
+
+class FrameBuffers:
+    """Memoria de decodificación y de salida reutilizada entre frames de un mismo productor
+
+    El PNG de cada frame se decodifica con Image.frombytes sobre una imagen ya reservada si el
+    modo y el tamaño coinciden (lo normal: la ventana del navegador no cambia). La imagen
+    decodificada solo vive hasta la siguiente llamada: quien necesite conservarla debe
+    redimensionarla o pasarla a un lienzo con canvas() antes (capture_frame ya lo hace).
+
+    Los lienzos de canvas() son un pequeño conjunto de imágenes reservadas: uno se reutiliza
+    solo si nadie más tiene una referencia a él (el hilo de Tk, la foto del pesaje, la grilla),
+    así que una imagen entregada nunca cambia bajo los pies de quien la usa.
+
+    No se activa la reserva de bloques de Pillow (Image.core.set_blocks_max): al reusar un
+    bloque de otro tamaño lo hace con realloc y cada frame vuelve a tocar páginas nuevas
+    (~250 fallos de página por frame contra ~0 sin reserva, ver benchmarks/soak_frames.py).
+    """
+
+    def __init__(self, pool=FRAME_CANVAS_POOL):
+        self.pool = pool
+        self._decoded = None
+        self._canvases = []
+
+    def decode(self, png):
+        image = Image.open(io.BytesIO(png))
+        target = self._decoded
+        tile = image.tile[0] if len(image.tile) == 1 else None
+        if (target is None or target.mode != image.mode or target.size != image.size
+                or tile is None or tile.codec_name != "zip" or not isinstance(tile.args, str)):
+            # Primer frame, cambio de tamaño o PNG entrelazado/con paleta: decodificación normal
+            image.load()
+            self._decoded = image
+            return image
+        # El decodificador "zip" de Pillow (filtros PNG) escribe sobre la imagen reservada
+        target.frombytes(_png_idat(png), "zip", tile.args)
+        M_DECODE_REUSED.inc()
+        return target
+
+    def canvas(self, image):
+        """Copia image a un lienzo reservado libre del mismo modo y tamaño y lo devuelve"""
+        key = (image.mode, image.size)
+        self._canvases = [c for c in self._canvases if (c.mode, c.size) == key]
+        for i in range(len(self._canvases)):
+            # Referencias: la lista y el argumento de getrefcount; más que eso, alguien lo usa
+            if sys.getrefcount(self._canvases[i]) <= 2:
+                canvas = self._canvases[i]
+                canvas.paste(image)
+                M_CANVAS_REUSED.inc()
+                return canvas
+        canvas = image.copy()
+        if len(self._canvases) < self.pool:
+            self._canvases.append(canvas)
+        return canvas
+
+
+def capture_frame(driver, size, trace=None, buffers=None):
+    """Captura, decodifica y redimensiona un frame del navegador (sin tocar Tk)
+
+    Devuelve la imagen PIL ya ajustada a size, o None si el tamaño aún no es válido.
+    Si se pasa una traza, marca el fin de la captura, de la decodificación y del redimensionado.
+    Con buffers (FrameBuffers) la decodificación reutiliza la memoria del frame anterior.
+    """
+    t0 = time.perf_counter()
+    screenshot_data = driver.get_screenshot_as_png()
+    M_CAPTURE.time_since(t0)
+    StageTracer.mark(trace)
+
+    t0 = time.perf_counter()
+    if buffers is not None:
+        image = buffers.decode(screenshot_data)
+    else:
+        image = Image.open(io.BytesIO(screenshot_data))
+        image.load()
+    M_DECODE.time_since(t0)
+    StageTracer.mark(trace)
+
+    cw, ch = size
+    if cw <= 1 or ch <= 1:
+        return None
+
+    # Usar BILINEAR para redimensionar más rápido
+    t0 = time.perf_counter()
+    if image.size == (cw, ch):
+        # Sin redimensionar la imagen seguiría siendo el buffer de decodificación
+        image = buffers.canvas(image) if buffers is not None else image
+    else:
+        # Pillow no redimensiona sobre una imagen existente: resize siempre entrega una nueva
+        image = image.resize((cw, ch), Image.BILINEAR)
+    M_RESIZE.time_since(t0)
+    StageTracer.mark(trace)
+    M_FRAMES.inc()
+    return image
@@ -0,0 +1,291 @@
+"""Captura y decodificación de frames en un proceso aparte, con transporte por memoria compartida.
+
+El proceso de captura llama a WebDriver, decodifica el PNG y lo redimensiona (todo el trabajo
+de Pillow queda fuera del GIL de la UI) y publica píxeles listos para pintar en un anillo de
+multiprocessing.shared_memory. No se serializa nada por frame: el proceso de UI solo copia los
+bytes del slot más reciente y los pega en el PhotoImage. Los píxeles viajan en RGBA, el layout
+interno de Pillow, así Image.frombuffer los mapea sin convertir en el proceso de UI.
+
+Diseño del segmento (little-endian):
+    cabecera: "<8sIIIIIIQd" magic, slots, ancho máx, alto máx, ancho pedido, alto pedido,
+              bandera de parada, secuencia del último frame publicado, intervalo de captura
+              pedido (segundos; lo cambia la UI al entrar y salir del reposo)
+    slots:    "<QIIdddd" secuencia, ancho, alto, t de solicitud (perf_counter), duración de
+              captura, decodificación y redimensionado; seguido de ancho_máx * alto_máx * 4 bytes
+
+Cada slot funciona como un seqlock: el escritor pone la secuencia en 0, copia los píxeles y
+al final escribe la secuencia nueva. El lector relee la secuencia después de copiar; si cambió,
+el escritor dio la vuelta al anillo durante la copia y el frame se descarta.
+"""
+import multiprocessing
+import struct
+import time
+from multiprocessing import shared_memory
+
+from PIL import Image
+
+from frame_pipeline import capture_frame, FrameBuffers, M_FRAMES, M_CAPTURE, M_DECODE, M_RESIZE
+
+FRAME_MAGIC = b"PSFRAME2"
+_HEADER = struct.Struct("<8sIIIIIIQd")
+_SLOT = struct.Struct("<QIIdddd")
+_REQUEST_OFFSET = 8 + 4 * 3
+_STOP_OFFSET = 8 + 4 * 5
+_LATEST_OFFSET = 8 + 4 * 6
+_INTERVAL_OFFSET = _LATEST_OFFSET + 8
+
+# El proceso de captura duerme en tramos de este largo y relee el intervalo pedido: al salir del
+# reposo la captura vuelve al ritmo normal sin esperar el intervalo largo completo
+_INTERVAL_CHECK_S = 0.05
+
+# Slots del anillo: uno se escribe mientras la UI copia otro, el tercero da margen
+FRAME_SLOTS = 3
+
+# Tamaño máximo de frame que admite el segmento
+FRAME_MAX_SIZE = (1920, 1200)
+FRAME_MODE = "RGBA"
+_PIXEL_BYTES = 4
+
+
+def _attach(name):
+    """Abre un segmento existente sin que este proceso se haga cargo de borrarlo
+
+    Antes de Python 3.13 no existe track=False; el hijo lanzado con spawn comparte el
+    resource_tracker del padre, así que registrarlo de nuevo no tiene efecto.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedFrameRing:
+    """Anillo de frames RGBA en memoria compartida: un escritor (proceso de captura), un lector (UI)"""
+
+    def __init__(self, name=None, slots=FRAME_SLOTS, max_size=FRAME_MAX_SIZE):
+        if name is None:
+            max_w, max_h = max_size
+            slot_bytes = _SLOT.size + max_w * max_h * _PIXEL_BYTES
+            self.shm = shared_memory.SharedMemory(create=True, size=_HEADER.size + slots * slot_bytes)
+            _HEADER.pack_into(self.shm.buf, 0, FRAME_MAGIC, slots, max_w, max_h, 0, 0, 0, 0, 0.0)
+            self.owner = True
+        else:
+            self.shm = _attach(name)
+            self.owner = False
+        magic, self.slots, self.max_width, self.max_height = _HEADER.unpack_from(self.shm.buf, 0)[:4]
+        if magic != FRAME_MAGIC:
+            self.shm.close()
+            raise ValueError(f"{name} no es un anillo de frames válido")
+        self.slot_bytes = _SLOT.size + self.max_width * self.max_height * _PIXEL_BYTES
+        self._seq = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    # ---- control (escrito por la UI, leído por el proceso de captura) ----
+
+    def request_size(self, width, height):
+        width = max(0, min(width, self.max_width))
+        height = max(0, min(height, self.max_height))
+        struct.pack_into("<II", self.shm.buf, _REQUEST_OFFSET, width, height)
+
+    def requested_size(self):
+        return struct.unpack_from("<II", self.shm.buf, _REQUEST_OFFSET)
+
+    def request_interval(self, seconds):
+        struct.pack_into("<d", self.shm.buf, _INTERVAL_OFFSET, seconds)
+
+    def requested_interval(self):
+        return struct.unpack_from("<d", self.shm.buf, _INTERVAL_OFFSET)[0]
+
+    def request_stop(self):
+        struct.pack_into("<I", self.shm.buf, _STOP_OFFSET, 1)
+
+    @property
+    def stop_requested(self):
+        return struct.unpack_from("<I", self.shm.buf, _STOP_OFFSET)[0] != 0
+
+    @property
+    def latest_seq(self):
+        return struct.unpack_from("<Q", self.shm.buf, _LATEST_OFFSET)[0]
+
+    # ---- escritor ----
+
+    def write(self, image, t_request, durations):
+        """Publica una imagen PIL; durations = (captura, decodificación, redimensionado)"""
+        width, height = image.size
+        if width > self.max_width or height > self.max_height:
+            raise ValueError(f"Frame {width}x{height} excede el máximo {self.max_width}x{self.max_height}")
+        if image.mode != FRAME_MODE:
+            image = image.convert(FRAME_MODE)
+        self._seq += 1
+        seq = self._seq
+        offset = _HEADER.size + (seq % self.slots) * self.slot_bytes
+        buf = self.shm.buf
+        struct.pack_into("<Q", buf, offset, 0)
+        pixels = offset + _SLOT.size
+        data = image.tobytes()
+        buf[pixels:pixels + len(data)] = data
+        _SLOT.pack_into(buf, offset, seq, width, height, t_request, *durations)
+        struct.pack_into("<Q", buf, _LATEST_OFFSET, seq)
+        return seq
+
+    # ---- lector ----
+
+    def read_latest(self, after_seq=0):
+        """Devuelve (seq, ancho, alto, píxeles, t_solicitud, duraciones) si hay un frame más nuevo
+
+        Los píxeles son una copia (bytes) que no cambia aunque el escritor reutilice el slot.
+        Devuelve None si no hay nada nuevo o si el frame se sobrescribió durante la copia.
+        """
+        buf = self.shm.buf
+        seq = struct.unpack_from("<Q", buf, _LATEST_OFFSET)[0]
+        if seq == 0 or seq == after_seq:
+            return None
+        offset = _HEADER.size + (seq % self.slots) * self.slot_bytes
+        slot_seq, width, height, t_request, capture_s, decode_s, resize_s = _SLOT.unpack_from(buf, offset)
+        if slot_seq != seq:
+            return None
+        pixels = offset + _SLOT.size
+        data = bytes(buf[pixels:pixels + width * height * _PIXEL_BYTES])
+        if struct.unpack_from("<Q", buf, offset)[0] != seq:
+            return None
+        return seq, width, height, data, t_request, (capture_s, decode_s, resize_s)
+
+    def close(self):
+        try:
+            self.shm.close()
+        except BufferError:
+            # Aún hay memoryviews vivas (p.ej. durante el apagado); el SO libera al salir
+            pass
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def attach_chrome(debugger_address):
+    """Fábrica de driver para el proceso de captura: se engancha al Chrome ya abierto por la UI"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    options = Options()
+    options.debugger_address = debugger_address
+    return webdriver.Chrome(options=options)
+
+
+def _release_driver(driver):
+    # Solo se detiene el chromedriver propio; quit() cerraría el navegador de la UI
+    service = getattr(driver, "service", None)
+    if service is not None:
+        try:
+            service.stop()
+        except Exception:
+            pass
+
+
+def _capture_main(ring_name, driver_factory, driver_args, interval):
+    """Bucle del proceso de captura: WebDriver -> PNG -> RGBA redimensionado -> anillo"""
+    ring = SharedFrameRing(ring_name)
+    driver = None
+    consecutive_errors = 0
+    buffers = FrameBuffers()
+    try:
+        driver = driver_factory(*driver_args)
+        while not ring.stop_requested:
+            start = time.perf_counter()
+            size = ring.requested_size()
+            try:
+                # Marcas locales: mismas etapas que la captura en hilo
+                trace = [start]
+                image = capture_frame(driver, size, trace, buffers)
+                if image is not None:
+                    durations = (trace[1] - trace[0], trace[2] - trace[1], trace[3] - trace[2])
+                    ring.write(image, start, durations)
+                consecutive_errors = 0
+            except Exception:
+                consecutive_errors += 1
+                if consecutive_errors > 20:
+                    break
+                time.sleep(1 if consecutive_errors > 5 else 0.5)
+                continue
+            while not ring.stop_requested:
+                remaining = (ring.requested_interval() or interval) - (time.perf_counter() - start)
+                if remaining <= 0:
+                    break
+                time.sleep(min(remaining, _INTERVAL_CHECK_S))
+    finally:
+        if driver is not None:
+            _release_driver(driver)
+        ring.close()
+
+
+class FrameCaptureProcess:
+    """Lado UI: crea el anillo, lanza el proceso de captura y entrega los frames nuevos
+
+    driver_factory(*driver_args) se ejecuta en el proceso hijo, así que debe poder importarse
+    (función o clase de módulo), p.ej. attach_chrome con la dirección de depuración de Chrome.
+    """
+
+    def __init__(self, driver_factory, driver_args=(), interval=0.2, slots=FRAME_SLOTS, max_size=FRAME_MAX_SIZE):
+        self.driver_factory = driver_factory
+        self.driver_args = tuple(driver_args)
+        self.interval = interval
+        self.ring = SharedFrameRing(slots=slots, max_size=max_size)
+        self.process = None
+        self._last_seq = 0
+        self.torn = 0
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def start(self):
+        ctx = multiprocessing.get_context("spawn")
+        self.process = ctx.Process(target=_capture_main, name="frame-capture", daemon=True,
+                                   args=(self.ring.name, self.driver_factory, self.driver_args, self.interval))
+        self.process.start()
+
+    def request_size(self, width, height):
+        self.ring.request_size(width, height)
+
+    def request_interval(self, seconds):
+        """Cambia el intervalo de captura del proceso en marcha (reposo / ritmo normal)"""
+        self.ring.request_interval(seconds)
+
+    def poll(self):
+        """Frame más nuevo que el último entregado: (ancho, alto, píxeles RGBA, t_solicitud, duraciones)"""
+        latest = self.ring.latest_seq
+        if latest == self._last_seq:
+            return None
+        frame = self.ring.read_latest(self._last_seq)
+        if frame is None:
+            self.torn += 1
+            return None
+        seq, width, height, data, t_request, durations = frame
+        self._last_seq = seq
+        capture_s, decode_s, resize_s = durations
+        M_CAPTURE.observe(capture_s)
+        M_DECODE.observe(decode_s)
+        M_RESIZE.observe(resize_s)
+        M_FRAMES.inc()
+        return width, height, data, t_request, durations
+
+    def poll_image(self):
+        """Como poll(), pero con los píxeles ya envueltos en una imagen PIL (sin copiarlos)"""
+        frame = self.poll()
+        if frame is None:
+            return None
+        width, height, data, t_request, durations = frame
+        image = Image.frombuffer(FRAME_MODE, (width, height), data, "raw", FRAME_MODE, 0, 1)
+        return image, t_request, durations
+
+    def stop(self, timeout=1.0):
+        self.ring.request_stop()
+        if self.process is not None:
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(0.5)
+        self.ring.close()
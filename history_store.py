@@ -0,0 +1,250 @@
+"""Historial consultable en disco: lecturas de peso y mensajes del log, indexados por hora.
+
+Las lecturas y los mensajes se acumulan en memoria y se escriben por lotes (una transacción
+por flush). Las lecturas repetidas no se guardan: solo cambios de peso/estado y, si no hay
+cambios, una cada HISTORY_HEARTBEAT_S, así "¿qué marcaba a las 14:32?" se responde con la
+última fila anterior a esa hora.
+
+Consultas:
+- por hora: índice B-tree sobre ts (costo logarítmico en la cantidad de filas);
+- texto del log: tabla FTS5 de contenido externo sobre log_messages, mantenida por trigger; el
+  rango horario se filtra siempre por ts (los id no siguen la hora: el visor y el lote de cada
+  instancia escriben tarde);
+- paginado por cursor (última clave vista), nunca con OFFSET: la página 500 cuesta lo mismo
+  que la primera;
+- lecturas anómalas (columna flags, ver weight_anomaly): índice parcial solo sobre las marcadas.
+Las lecturas usan una conexión de solo lectura aparte; en modo WAL no bloquean la escritura.
+Los flush y las consultas de la UI corren en el hilo de disco propio del historial (submit), no
+en el ejecutor de captura: un disco lento no demora los frames.
+"""
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import REGISTRY
+
+M_HISTORY_ROWS = REGISTRY.counter("history_rows_written_total", "Filas escritas al historial (lecturas + log)")
+M_HISTORY_QUERY = REGISTRY.histogram("history_query_seconds", "Duración de consultas al historial")
+
+# Base del historial (separada de la de pesajes: crece mucho más)
+HISTORY_DB = "historial.db"
+
+# Cada cuánto se escriben los lotes pendientes
+HISTORY_FLUSH_S = 2.0
+
+# Con el peso quieto, una lectura cada tantos segundos mantiene acotada la búsqueda hacia atrás
+HISTORY_HEARTBEAT_S = 60.0
+
+# Filas por página en las búsquedas
+HISTORY_PAGE_SIZE = 200
+
+# Búsqueda de texto en el log: mensajes por tanda recorridos por hora y cotejados contra FTS5, y
+# tandas como máximo antes de pasar a recorrer directamente las coincidencias del texto
+HISTORY_SCAN_CHUNK = 2000
+HISTORY_SCAN_CHUNKS = 8
+
+Reading = namedtuple("Reading", "id ts weight status unit scale raw flags")
+LogEntry = namedtuple("LogEntry", "id ts message")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS readings (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    weight REAL NOT NULL,
+    status TEXT NOT NULL,
+    unit TEXT NOT NULL,
+    scale TEXT NOT NULL,
+    raw TEXT,
+    flags TEXT
+);
+CREATE INDEX IF NOT EXISTS readings_ts ON readings(ts);
+CREATE TABLE IF NOT EXISTS log_messages (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS log_messages_ts ON log_messages(ts);
+CREATE VIRTUAL TABLE IF NOT EXISTS log_fts USING fts5(message, content='log_messages', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS log_messages_fts AFTER INSERT ON log_messages BEGIN
+    INSERT INTO log_fts(rowid, message) VALUES (new.id, new.message);
+END;
+"""
+
+
+def fts_query(text):
+    """Texto libre -> consulta FTS5: cada palabra entre comillas (AND); "pal*" busca por prefijo"""
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"*' if prefix else f'"{word}"')
+    return " ".join(terms)
+
+
+class HistoryStore:
+    """Lecturas y mensajes del log en SQLite, con búsqueda por hora y texto; seguro desde varios hilos"""
+
+    def __init__(self, path=HISTORY_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Otra instancia (visor) puede estar escribiendo su log en la misma base
+        self._conn.execute("PRAGMA busy_timeout=2000")
+        # Bases creadas antes de las marcas de anomalías no tienen la columna flags
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(readings)")]
+        if columns and "flags" not in columns:
+            self._conn.execute("ALTER TABLE readings ADD COLUMN flags TEXT")
+        self._conn.executescript(_SCHEMA)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS readings_flagged ON readings(ts, id) WHERE flags IS NOT NULL")
+        self._reader = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._readings = []
+        self._logs = []
+        self._tags = []
+        self._last_kept = {}
+        self._disk = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-disk")
+
+    def submit(self, func, *args):
+        """Corre func(*args) en el hilo de disco del historial; devuelve el concurrent.futures.Future"""
+        return self._disk.submit(func, *args)
+
+    def close(self):
+        # Las consultas encoladas ya no tienen quién las muestre; el flush en curso termina
+        self._disk.shutdown(wait=True, cancel_futures=True)
+        self.flush()
+        with self._write_lock, self._read_lock:
+            self._conn.close()
+            self._reader.close()
+
+    # ---- escritura ----
+
+    def add_reading(self, ts, weight, status, unit, scale, raw=None, flags=None):
+        """Encola una lectura si cambió respecto de la última guardada de esa balanza (o si está marcada)"""
+        with self._pending_lock:
+            last = self._last_kept.get(scale)
+            if (not flags and last and last[1] == weight and last[2] == status
+                    and ts - last[0] < HISTORY_HEARTBEAT_S):
+                return
+            self._last_kept[scale] = (ts, weight, status)
+            self._readings.append((ts, weight, status, unit, scale, raw, flags))
+
+    def tag_reading(self, scale, ts, flag):
+        """Agrega una marca a una lectura ya encolada o escrita (se aplica en el próximo flush)"""
+        with self._pending_lock:
+            self._tags.append((scale, ts, flag))
+
+    def add_log(self, ts, message):
+        with self._pending_lock:
+            self._logs.append((ts, message))
+
+    def flush(self):
+        """Escribe lo pendiente en una transacción. Devuelve la cantidad de filas"""
+        with self._pending_lock:
+            readings, self._readings = self._readings, []
+            logs, self._logs = self._logs, []
+            tags, self._tags = self._tags, []
+        if not readings and not logs and not tags:
+            return 0
+        with self._write_lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO readings (ts, weight, status, unit, scale, raw, flags) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                readings)
+            self._conn.executemany("INSERT INTO log_messages (ts, message) VALUES (?, ?)", logs)
+            # Después de los INSERT: la marca puede ser de una lectura de este mismo lote
+            self._conn.executemany(
+                "UPDATE readings SET flags = CASE WHEN flags IS NULL THEN ? ELSE flags || ',' || ? END "
+                "WHERE ts = ? AND scale = ?", ((flag, flag, ts, scale) for scale, ts, flag in tags))
+        M_HISTORY_ROWS.inc(len(readings) + len(logs))
+        return len(readings) + len(logs)
+
+    # ---- consultas ----
+
+    def _query(self, sql, params):
+        started = time.perf_counter()
+        with self._read_lock:
+            rows = self._reader.execute(sql, params).fetchall()
+        M_HISTORY_QUERY.time_since(started)
+        return rows
+
+    def reading_at(self, ts, scale=None):
+        """Lectura vigente en ts: la última guardada a esa hora o antes (None si no hay)"""
+        sql = "SELECT * FROM readings WHERE ts <= ?"
+        params = [ts]
+        if scale:
+            sql += " AND scale = ?"
+            params.append(scale)
+        rows = self._query(sql + " ORDER BY ts DESC LIMIT 1", params)
+        return Reading(*rows[0]) if rows else None
+
+    def readings(self, start_ts, end_ts, scale=None, after=None, limit=HISTORY_PAGE_SIZE, flagged=False):
+        """Página de lecturas en [start_ts, end_ts) en orden de hora (flagged: solo las anómalas)
+
+        after es el cursor devuelto por la página anterior. Devuelve (filas, cursor siguiente o None).
+        """
+        # Con cursor, la cota inferior es el propio cursor: el índice arranca justo después de él
+        if after is None:
+            sql, params = "SELECT * FROM readings WHERE ts >= ? AND ts < ?", [start_ts, end_ts]
+        else:
+            sql, params = "SELECT * FROM readings WHERE (ts, id) > (?, ?) AND ts < ?", [*after, end_ts]
+        if scale:
+            sql += " AND scale = ?"
+            params.append(scale)
+        if flagged:
+            sql += " AND flags IS NOT NULL"
+        rows = [Reading(*row) for row in self._query(sql + " ORDER BY ts, id LIMIT ?", params + [limit])]
+        return rows, ((rows[-1].ts, rows[-1].id) if len(rows) == limit else None)
+
+    def _log_range(self, start_ts, end_ts, after, limit):
+        if after is None:
+            sql, params = "SELECT id, ts, message FROM log_messages WHERE ts >= ? AND ts < ?", [start_ts, end_ts]
+        else:
+            sql, params = "SELECT id, ts, message FROM log_messages WHERE (ts, id) > (?, ?) AND ts < ?", [*after, end_ts]
+        return self._query(sql + " ORDER BY ts, id LIMIT ?", params + [limit])
+
+    def search_log(self, start_ts, end_ts, text="", after=None, limit=HISTORY_PAGE_SIZE):
+        """Página de mensajes del log en [start_ts, end_ts) que contienen todas las palabras de text
+
+        after es el cursor (ts, id) devuelto por la página anterior. Devuelve (filas en orden de
+        hora, cursor siguiente o None).
+        """
+        query = fts_query(text)
+        if not query:
+            rows = [LogEntry(*row) for row in self._log_range(start_ts, end_ts, after, limit)]
+            return rows, ((rows[-1].ts, rows[-1].id) if len(rows) == limit else None)
+
+        # Texto frecuente: recorrer el rango por hora en tandas y pedirle a FTS5 solo el tramo de id
+        # de cada tanda (casi contiguo); no depende de cuántas veces aparece el texto en toda la base
+        rows = []
+        for _ in range(HISTORY_SCAN_CHUNKS):
+            chunk = self._log_range(start_ts, end_ts, after, HISTORY_SCAN_CHUNK)
+            if not chunk:
+                return rows, None
+            ids = [row[0] for row in chunk]
+            hits = {row[0] for row in self._query(
+                "SELECT rowid FROM log_fts WHERE log_fts MATCH ? AND rowid BETWEEN ? AND ?",
+                (query, min(ids), max(ids)))}
+            matched = [LogEntry(*row) for row in chunk if row[0] in hits]
+            rows += matched[:limit - len(rows)]
+            if len(rows) == limit:
+                return rows, (rows[-1].ts, rows[-1].id)
+            if len(chunk) < HISTORY_SCAN_CHUNK:
+                return rows, None
+            after = (chunk[-1][1], chunk[-1][0])
+            if not matched:
+                break
+
+        # Texto escaso en el rango: recorrer sus coincidencias y filtrar por hora
+        if after is None:
+            where, params = "m.ts >= ? AND m.ts < ?", [start_ts, end_ts]
+        else:
+            where, params = "(m.ts, m.id) > (?, ?) AND m.ts < ?", [*after, end_ts]
+        sql = ("SELECT m.id, m.ts, m.message FROM log_fts JOIN log_messages m ON m.id = log_fts.rowid "
+               f"WHERE log_fts MATCH ? AND {where} ORDER BY m.ts, m.id LIMIT ?")
+        rows += [LogEntry(*row) for row in self._query(sql, [query, *params, limit - len(rows)])]
+        return rows, ((rows[-1].ts, rows[-1].id) if len(rows) == limit else None)
@@ -0,0 +1,62 @@
+"""Modo de bajo consumo entre camiones, gobernado por el flujo de pesos.
+
+Entre un vehículo y el siguiente la balanza marca cero durante largos ratos y capturar 5 FPS,
+repintar el canvas cada 50 ms y mantener los intervalos de JavaScript de la página no aporta
+nada. Tras IDLE_AFTER_S seguidos con el peso estable dentro de la banda de cero, el gobernador
+pasa a reposo: la captura baja a un frame cada IDLE_FRAME_INTERVAL_S, el canvas se repinta al
+mismo ritmo y los intervalos de la página se espacian IDLE_PAGE_TIMER_FACTOR veces.
+
+La primera lectura fuera de la banda de cero (o inestable) lo despierta en esa misma lectura;
+on_change avisa a quien duerme con el intervalo largo para que no espere a que venza.
+"""
+from metrics import REGISTRY
+
+M_IDLE_ENTERED = REGISTRY.counter("idle_entered_total", "Entradas al modo de bajo consumo")
+
+# Tiempo con la balanza vacía y estable antes de entrar en reposo
+IDLE_AFTER_S = 180.0
+
+# En reposo: un frame cada tantos segundos (también es el ritmo de repintado del canvas)
+IDLE_FRAME_INTERVAL_S = 2.0
+
+# En reposo, los setInterval de keep-alive de la página corren tantas veces más espaciados
+IDLE_PAGE_TIMER_FACTOR = 10
+
+
+class IdleGovernor:
+    """Decide reposo/actividad a partir de las lecturas; se alimenta desde el hilo de Tk
+
+    on_change(idle) se llama en cada transición, dentro de feed().
+    """
+
+    def __init__(self, zero_band, idle_after=IDLE_AFTER_S, on_change=None):
+        self.zero_band = zero_band
+        self.idle_after = idle_after
+        self.on_change = on_change
+        self.idle = False
+        self._zero_since = None
+
+    def feed(self, weight, status, ts):
+        """Procesa una lectura (weight en kg, como zero_band). Devuelve True si cambió el estado"""
+        if status == "ST" and abs(weight) <= self.zero_band:
+            if self._zero_since is None:
+                self._zero_since = ts
+            if self.idle or ts - self._zero_since < self.idle_after:
+                return False
+            M_IDLE_ENTERED.inc()
+            self.idle = True
+        else:
+            self._zero_since = None
+            if not self.idle:
+                return False
+            self.idle = False
+        if self.on_change:
+            self.on_change(self.idle)
+        return True
+
+    def frame_interval(self, active_interval):
+        """Segundos entre capturas: el intervalo normal, o el de reposo si es más largo"""
+        return max(active_interval, IDLE_FRAME_INTERVAL_S) if self.idle else active_interval
+
+    def page_timer_factor(self):
+        return IDLE_PAGE_TIMER_FACTOR if self.idle else 1
@@ -0,0 +1,146 @@
+import asyncio
+import concurrent.futures
+import json
+import socket
+
+# Puerto local usado como "candado": la instancia que logra escucharlo es la dueña del COM
+INSTANCE_PORT = 47651
+
+# Máximo de bytes pendientes por visor antes de descartar lecturas viejas
+VIEWER_MAX_PENDING = 64 * 1024
+
+
+def try_become_owner(port=INSTANCE_PORT):
+    """Intenta tomar el candado de instancia. Devuelve el socket de escucha o None si ya hay dueño"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        if hasattr(socket, "SO_EXCLUSIVEADDRUSE"):
+            # Windows: impedir que otra instancia comparta el puerto
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_EXCLUSIVEADDRUSE, 1)
+        else:
+            # POSIX: permitir re-bind tras un cierre abrupto (TIME_WAIT) sin compartir el listen
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("127.0.0.1", port))
+        sock.listen(16)
+        return sock
+    except OSError:
+        sock.close()
+        return None
+
+
+class ReadingBroadcaster:
+    """Reparte las lecturas parseadas a los visores conectados (lado dueño), sobre el loop asyncio
+
+    Cada lectura se serializa una sola vez en publish(); el reparto es una escritura no
+    bloqueante por visor. Un visor cuyo buffer de envío supera VIEWER_MAX_PENDING se salta
+    lecturas hasta ponerse al día, sin frenar al lector ni a los demás visores.
+    """
+
+    def __init__(self, listen_sock):
+        self._listen_sock = listen_sock
+        self._server = None
+        self._viewers = set()  # StreamWriter de cada visor
+        self.loop = None
+        self.dropped = 0
+
+    @property
+    def viewer_count(self):
+        return len(self._viewers)
+
+    def start(self, loop):
+        self.loop = loop
+        future = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._on_viewer, sock=self._listen_sock), loop)
+        self._server = future.result(timeout=5)
+
+    def stop(self):
+        if self.loop is None or self.loop.is_closed():
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._close)
+        except RuntimeError:
+            pass
+
+    def _close(self):
+        if self._server:
+            self._server.close()
+        for writer in list(self._viewers):
+            writer.close()
+        self._viewers.clear()
+
+    def publish(self, reading):
+        """Encola una lectura (dict) para todos los visores. Seguro desde cualquier hilo"""
+        if not self._viewers or self.loop is None:
+            return
+        payload = (json.dumps(reading, separators=(",", ":")) + "\n").encode("utf-8")
+        try:
+            self.loop.call_soon_threadsafe(self._fan_out, payload)
+        except RuntimeError:
+            pass
+
+    def _fan_out(self, payload):
+        for writer in list(self._viewers):
+            if writer.transport.get_write_buffer_size() > VIEWER_MAX_PENDING:
+                # Visor lento: se salta esta lectura
+                self.dropped += 1
+                continue
+            writer.write(payload)
+
+    async def _on_viewer(self, reader, writer):
+        self._viewers.add(writer)
+        try:
+            # Los visores no envían nada; solo esperar a que cierren
+            while await reader.read(1024):
+                pass
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self._viewers.discard(writer)
+            writer.close()
+
+
+class ViewerClient:
+    """Se conecta a la instancia dueña y recibe las lecturas en modo solo lectura"""
+
+    def __init__(self, on_reading, on_lost, port=INSTANCE_PORT):
+        self.on_reading = on_reading
+        self.on_lost = on_lost
+        self.port = port
+        self.loop = None
+        self._writer = None
+        self._closing = False
+
+    def connect(self, loop, timeout=1.0):
+        """Conecta usando el loop dado; devuelve False si no hay instancia principal"""
+        self.loop = loop
+        future = asyncio.run_coroutine_threadsafe(
+            asyncio.wait_for(asyncio.open_connection("127.0.0.1", self.port), timeout), loop)
+        try:
+            reader, self._writer = future.result(timeout + 0.5)
+        except (OSError, asyncio.TimeoutError, concurrent.futures.TimeoutError):
+            return False
+        asyncio.run_coroutine_threadsafe(self._receive(reader), loop)
+        return True
+
+    def close(self):
+        self._closing = True
+        if self._writer and self.loop and not self.loop.is_closed():
+            try:
+                self.loop.call_soon_threadsafe(self._writer.close)
+            except RuntimeError:
+                pass
+
+    async def _receive(self, reader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    self.on_reading(json.loads(line))
+                except ValueError:
+                    pass
+        except (ConnectionError, OSError):
+            pass
+        if not self._closing:
+            self.on_lost()
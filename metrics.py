@@ -0,0 +1,169 @@
+import bisect
+import threading
+import time
+
+# Buckets de latencia por defecto (segundos): de 0.5 ms a 5 s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels.items()) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Counter:
+    """Contador monótono. Sin locks: bajo el GIL una carrera solo puede perder algún incremento"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self):
+        yield self.name, self.labels, self.value
+
+
+class Gauge:
+    """Valor instantáneo; puede leerse de una función (p.ej. profundidad de una cola)"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=None, func=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.value = 0
+        self.func = func
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def get(self):
+        if self.func is not None:
+            try:
+                return self.func()
+            except Exception:
+                return 0
+        return self.value
+
+    def samples(self):
+        yield self.name, self.labels, self.get()
+
+
+class Histogram:
+    """Histograma con buckets fijos: observe() es una búsqueda binaria y tres sumas"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, labels=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time_since(self, start):
+        """Registra perf_counter() - start y devuelve el valor"""
+        elapsed = time.perf_counter() - start
+        self.observe(elapsed)
+        return elapsed
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            yield self.name + "_bucket", dict(self.labels, le=repr(bound)), cumulative
+        yield self.name + "_bucket", dict(self.labels, le="+Inf"), cumulative + self.counts[-1]
+        yield self.name + "_sum", self.labels, self.sum
+        yield self.name + "_count", self.labels, self.count
+
+
+class MetricsRegistry:
+    """Registro central de métricas; render() produce el formato de texto de Prometheus"""
+
+    def __init__(self):
+        self._metrics = {}
+        # El lock solo protege el alta de métricas, nunca el camino caliente
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        key = (metric.name, tuple(sorted(metric.labels.items())))
+        with self._lock:
+            existing = self._metrics.get(key)
+            if existing is not None:
+                return existing
+            self._metrics[key] = metric
+            return metric
+
+    def counter(self, name, help_text, labels=None):
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=None, func=None):
+        return self._register(Gauge(name, help_text, labels, func))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS, labels=None):
+        return self._register(Histogram(name, help_text, buckets, labels))
+
+    def get(self, name, labels=None):
+        return self._metrics.get((name, tuple(sorted((labels or {}).items()))))
+
+    def render(self):
+        lines = []
+        seen = set()
+        for metric in sorted(self._metrics.values(), key=lambda m: m.name):
+            if metric.name not in seen:
+                seen.add(metric.name)
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample_name, labels, value in metric.samples():
+                lines.append(f"{sample_name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class RateTracker:
+    """Convierte contadores en tasas por segundo comparando dos lecturas consecutivas"""
+
+    def __init__(self, *counters):
+        self.counters = counters
+        self._last = [c.value for c in counters]
+        self._last_time = time.monotonic()
+        self.rates = [0.0] * len(counters)
+
+    def update(self):
+        now = time.monotonic()
+        dt = now - self._last_time
+        if dt <= 0:
+            return self.rates
+        values = [c.value for c in self.counters]
+        self.rates = [(v - last) / dt for v, last in zip(values, self._last)]
+        self._last = values
+        self._last_time = now
+        return self.rates
+
+
+# Registro global de la aplicación
+REGISTRY = MetricsRegistry()
@@ -1,18 +1,43 @@
+import asyncio
+import multiprocessing
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox
+from tkinter import ttk, scrolledtext, messagebox, filedialog
 import serial
 import serial.tools.list_ports
 import threading
-import re
 from datetime import datetime
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
-from PIL import Image, ImageTk
-import io
+from PIL import ImageTk
 import time
 import os
+import json
 import psutil
+import socket
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from instance_link import try_become_owner, ReadingBroadcaster, ViewerClient, INSTANCE_PORT
+from weight_api import WeightApiServer, API_PORT
+from metrics import REGISTRY, RateTracker
+from tracing import StageTracer
+from scale_reader import SerialLineReader, M_SERIAL_BYTES, M_SERIAL_LINES
+from scale_protocols import ProtocolParser, protocol_names, M_PARSE_FAILURES, to_kg
+from serial_capture import SerialRecorder, ReplaySource
+from profiling import ProfilingSession, profiling_requested, PROFILE_ENV
+from frame_pipeline import capture_frame, FrameBuffers, M_FRAMES, M_CAPTURE, M_DECODE, M_RESIZE
+from frame_process import FrameCaptureProcess, attach_chrome
+from orchestrator import Orchestrator
+from weight_history import WeightHistory
+from weighing import WeighingEngine, WeighingStore
+from weighing_export import export_weighings, parquet_available, ExportCancelled
+from history_store import HistoryStore, HISTORY_FLUSH_S, HISTORY_PAGE_SIZE
+from camera_grid import (load_channels, CaptureScheduler, grid_layout, frame_digest, tile_origin,
+                         M_TILES_PAINTED, M_TILES_SKIPPED)
+from outbox import Outbox, OutboxSender, upstream_url, UPSTREAM_ENV, M_OUTBOX_SENT, M_OUTBOX_FAILURES
+from idle_governor import IdleGovernor, IDLE_FRAME_INTERVAL_S
+from video_health import VideoHealthMonitor, CDP_ERRORS, M_VIDEO_STALLS, M_VIDEO_RECOVERY, M_VIDEO_RELOADS
+from weight_anomaly import AnomalyDetector, M_ANOMALIES
 
 HIK_CONNECT_URL = "https://www.hik-connect.com/views/login/index.html#/portal"
 
@@ -20,6 +45,52 @@ HIK_CONNECT_URL = "https://www.hik-connect.com/views/login/index.html#/portal"
 # 200ms = ~5 FPS (buena fluidez para video)
 BROWSER_REFRESH_MS = 200
 
+# Cada cuánto se revisa el anillo compartido en modo proceso
+FRAME_POLL_S = 0.02
+
+# Repintado del canvas con la balanza activa (50 ms = 20 FPS de UI)
+CANVAS_REFRESH_MS = 50
+
+# Una captura sin actualizar por más de esto muestra el aviso (en reposo, el doble del intervalo)
+STALE_FRAME_S = 2.0
+
+# Dónde se capturan y decodifican los frames: "thread" (ejecutor de este proceso) o "process"
+# (proceso aparte que entrega píxeles listos por memoria compartida; la UI solo los pega)
+FRAME_CAPTURE_MODE = "thread"
+
+# Modo de lectura serial: "bulk" (todo lo disponible por despertar) o "line" (readline clásico)
+SERIAL_READ_MODE = "bulk"
+
+# Protocolo elegido por puerto (se recuerda entre sesiones)
+SCALE_PORTS_FILE = "scale_ports.json"
+
+# Métricas del pipeline (expuestas en /metrics y en el overlay)
+M_UI_QUEUE = REGISTRY.gauge("ui_pending_lines", "Líneas encoladas hacia el hilo de Tk aún sin procesar")
+M_PAINT = REGISTRY.histogram("frame_paint_seconds", "Latencia de pintado en el canvas")
+M_DRIVER_KEEPALIVE = REGISTRY.histogram("driver_command_seconds", "Latencia de comandos WebDriver",
+                                        labels={"command": "keepalive"})
+M_KEEPALIVE_FAILURES = REGISTRY.counter("keepalive_failures_total", "Fallos del keep-alive del navegador")
+M_READING_E2E = REGISTRY.histogram("reading_end_to_end_seconds", "Llegada serial -> peso visible en pantalla")
+M_FRAME_E2E = REGISTRY.histogram("frame_end_to_end_seconds", "Solicitud de captura -> frame pintado")
+
+# Peso en kg (se convierte desde la unidad de la balanza) por debajo del cual la balanza se
+# considera vacía (separa un pesaje del siguiente)
+WEIGHING_ZERO_BAND = 50.0
+
+# Fotos de la cámara asociadas a cada captura de pesaje
+SNAPSHOT_DIR = "snapshots"
+
+# Gráfico de tendencia del peso: refresco y ventanas en vivo (segundos; None = todo el historial)
+TREND_REFRESH_MS = 1000
+TREND_WINDOWS = {"1 min": 60, "10 min": 600, "1 h": 3600, "8 h": 8 * 3600, "Todo": None}
+
+# Volcado periódico de percentiles de latencia (log + archivo JSONL)
+TRACE_DUMP_S = 60
+TRACE_DUMP_FILE = "latency_trace.jsonl"
+
+# Escritura periódica del perfil mientras está activo (para no perder un turno completo)
+PROFILE_DUMP_S = 300
+
 class WeightMonitor:
     def __init__(self, root):
         self.root = root
@@ -34,13 +105,136 @@ class WeightMonitor:
         self.driver = None
         self.browser_running = False
         self._screenshot_lock = threading.Lock()
+        # PhotoImage único del video: cada frame se pega encima, solo se recrea si cambia el tamaño
         self._latest_photo = None
+        self._frame_item = None
+        self._stale_item = None
+        # Memoria de decodificación reutilizada entre frames (las capturas no se solapan)
+        self._frame_buffers = FrameBuffers()
         self._screenshot_errors = 0
         self._last_screenshot_time = time.time()
+        # Tamaño del canvas leído en el hilo de Tk; la tarea de captura solo lo consulta
+        self._canvas_size = (800, 600)
+        # Modo proceso: frame pendiente de pegar en el PhotoImage
+        self.frame_process = None
+        self._latest_image = None
+
+        # Grilla de cámaras (camera_channels.json con más de un canal): una ventana de Chrome por
+        # canal y un presupuesto de capturas repartido por prioridad
+        self.channels = load_channels(default_url=HIK_CONNECT_URL)
+        self.grid_mode = len(self.channels) > 1
+        self.capture_scheduler = CaptureScheduler(self.channels, 1000.0 / BROWSER_REFRESH_MS)
+        # La ventana activa es global al driver: cambiar de ventana y capturar va junto
+        self._window_lock = threading.Lock()
+        self._tile_frames = {}
+        self._tiles = []
+        self._grid_layout = None
+        self._tile_size = (400, 300)
+        # Monitores de salud del video (uno por ventana); vacío si se usa el keep-alive por sondeo
+        self.video_monitors = []
+
+        # Reposo entre camiones: menos capturas y repintados mientras la balanza está en cero
+        self.idle_governor = IdleGovernor(WEIGHING_ZERO_BAND, on_change=self._on_idle_change)
+        # Corta la espera entre capturas al salir del reposo (se activa desde el loop)
+        self._capture_wake = asyncio.Event()
+        self._canvas_after = None
+
+        # Loop asyncio único: captura, keep-alive, lector serial, API y visores
+        self.orchestrator = Orchestrator()
+        self.orchestrator.start()
+        self.read_future = None
+
+        # Coordinación entre instancias: dueña del puerto vs visores
+        self.broadcaster = None
+        self.viewer = None
+        # API local (HTTP/SSE/WebSocket) para ERP y garita; solo en la instancia principal
+        self.api_server = None
+        self._last_published = None
+
+        # Lector serial activo, grabador de bytes crudos y modo reproducción
+        self.line_reader = None
+        self.raw_recorder = None
+        self.replaying = False
+
+        # Protocolo del indicador: fijo por puerto o detectado automáticamente
+        self.port_protocols = self._load_port_protocols()
+        self.protocol_parser = ProtocolParser()
+        self.protocol_parser.on_detected = self._on_protocol_detected
+
+        # Detector de anomalías por balanza (picos, tara, deriva, oscilación) sobre cada lectura
+        self.anomaly_detectors = {}
+
+        # Pesajes: capturas del flujo de pesos estables y totales por día/turno/balanza
+        self.weighing_engine = WeighingEngine(WEIGHING_ZERO_BAND, on_capture=self._on_weighing_capture)
+        try:
+            self.weighing_store = WeighingStore()
+        except sqlite3.Error as e:
+            self.weighing_store = None
+            print(f"No se pudo abrir la base de pesajes: {e}")
+        # Exportaciones y consultas del diálogo de exportar: hilo propio, una exportación de un
+        # millón de filas no ocupa el ejecutor de E/S de la captura
+        self.export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
+
+        # Historial consultable de lecturas y mensajes del log (reemplaza buscar en weight_log_*.txt)
+        try:
+            self.history_store = HistoryStore()
+        except sqlite3.Error as e:
+            self.history_store = None
+            print(f"No se pudo abrir el historial: {e}")
+
+        # Bandeja de salida de pesos estables hacia el servidor central (PESAJE_UPSTREAM_URL)
+        self.outbox = None
+        self.outbox_sender = None
+
+        # Último frame decodificado (imagen PIL) y el elegido para la foto del pesaje en curso
+        self._snapshot_image = None
+        self._weighing_frame = None
+
+        # Historial de lecturas para la tendencia (arrays fijos, cubre más de un turno)
+        self.weight_history = WeightHistory()
+        # Rango (t0, t1) fijado con el mouse; None = ventana en vivo
+        self._trend_zoom = None
+        self._trend_view = None
+        self._trend_drag = None
+
+        # Overlay de métricas sobre el video
+        self.show_metrics_overlay = tk.BooleanVar(value=False)
+        self._serial_rates = RateTracker(M_SERIAL_BYTES, M_SERIAL_LINES)
+        self._outbox_rate = RateTracker(M_OUTBOX_SENT)
+        self._overlay_updated = 0.0
+        self._overlay_rss = 0
+
+        # Trazas de latencia extremo a extremo (lecturas y frames)
+        self.reading_tracer = StageTracer(("enqueue", "parse", "widget", "paint"), total_histogram=M_READING_E2E)
+        self.frame_tracer = StageTracer(("capture", "decode", "resize", "handoff", "paint"), total_histogram=M_FRAME_E2E)
+        self._latest_frame_trace = None
+        self._last_trace_dump = time.monotonic()
+
+        # Perfilado (variable de entorno PESAJE_PROFILE o tecla F9)
+        self.profiling = None
+        REGISTRY.gauge("chrome_rss_bytes", "Memoria residente de Chrome y sus procesos hijos",
+                       func=self._chrome_rss_bytes)
+        REGISTRY.gauge("viewer_instances", "Instancias visoras conectadas",
+                       func=lambda: self.broadcaster.viewer_count if self.broadcaster else 0)
+        REGISTRY.gauge("api_clients", "Suscriptores del API local",
+                       func=lambda: self.api_server.client_count if self.api_server else 0)
+        REGISTRY.gauge("outbox_backlog", "Eventos en la bandeja de salida sin entregar",
+                       func=lambda: self.outbox.depth if self.outbox else 0)
+        REGISTRY.gauge("idle_mode", "1 si la captura está en modo de bajo consumo",
+                       func=lambda: int(self.idle_governor.idle))
 
         self.setup_ui()
         self.log_message("=== INICIANDO APLICACIÓN [VERSIÓN CORREGIDA] ===")
+        self.init_instance_role()
         self.root.after(1000, self.init_selenium)
+        self.root.after(1000, self._refresh_latency_stats)
+        self.root.after(TREND_REFRESH_MS, self._refresh_trend)
+        self._refresh_weighing_totals()
+        if self.history_store:
+            self.orchestrator.spawn(self._history_flush_loop(), name="history-flush")
+        self.root.bind("<F9>", lambda e: self.toggle_profiling())
+        if profiling_requested():
+            self.toggle_profiling()
 
     def setup_ui(self):
         # Frame superior - Configuración
@@ -50,6 +244,7 @@ class WeightMonitor:
         tk.Label(config_frame, text="Puerto:", bg="#2d2d2d", fg="white").grid(row=0, column=0, padx=5)
         self.port_combo = ttk.Combobox(config_frame, width=10, state="readonly")
         self.port_combo.grid(row=0, column=1, padx=5)
+        self.port_combo.bind("<<ComboboxSelected>>", lambda e: self._apply_port_protocol())
         self.refresh_ports()
 
         tk.Label(config_frame, text="Baud Rate:", bg="#2d2d2d", fg="white").grid(row=0, column=2, padx=5)
@@ -74,6 +269,27 @@ class WeightMonitor:
                                      bg="#0d7377", fg="white", width=12, font=("Arial", 10, "bold"))
         self.btn_connect.grid(row=0, column=7, padx=10)
 
+        # Grabación del flujo serial crudo y reproducción de capturas
+        self.record_raw = tk.BooleanVar(value=False)
+        tk.Checkbutton(config_frame, text="⏺ Grabar RAW", variable=self.record_raw, command=self._on_record_toggle,
+                       bg="#2d2d2d", fg="white", selectcolor="#3d3d3d",
+                       activebackground="#2d2d2d", activeforeground="white").grid(row=0, column=8, padx=5)
+
+        self.replay_speed_combo = ttk.Combobox(config_frame, width=5, values=["1x", "4x", "16x", "máx"], state="readonly")
+        self.replay_speed_combo.set("1x")
+        self.replay_speed_combo.grid(row=0, column=9, padx=2)
+
+        self.btn_replay = tk.Button(config_frame, text="▶ Reproducir", command=self.start_replay,
+                                    bg="#3d3d3d", fg="white", width=11)
+        self.btn_replay.grid(row=0, column=10, padx=5)
+
+        # Protocolo del indicador (por puerto)
+        tk.Label(config_frame, text="Protocolo:", bg="#2d2d2d", fg="white").grid(row=1, column=0, padx=5, pady=(5, 0))
+        self.protocol_combo = ttk.Combobox(config_frame, width=10, values=protocol_names(), state="readonly")
+        self.protocol_combo.grid(row=1, column=1, padx=5, pady=(5, 0))
+        self.protocol_combo.bind("<<ComboboxSelected>>", lambda e: self._on_protocol_selected())
+        self._apply_port_protocol()
+
         # Frame principal horizontal: Izquierda (Peso) y Derecha (Navegador)
         main_horizontal_frame = tk.Frame(self.root, bg="#1e1e1e")
         main_horizontal_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
@@ -117,6 +333,55 @@ class WeightMonitor:
                                    bg="#2d2d2d", fg="white")
         self.type_label.pack(side=tk.LEFT, padx=20)
 
+        self.latency_label = tk.Label(display_frame, text="Latencia: --", font=("Consolas", 9),
+                                      bg="#1e1e1e", fg="#888888")
+        self.latency_label.pack()
+
+        # Pesaje en curso y totales del día
+        weighing_frame = tk.Frame(display_frame, bg="#2d2d2d")
+        weighing_frame.pack(fill=tk.X, padx=20, pady=(10, 0))
+        tk.Label(weighing_frame, text="Placa:", font=("Arial", 10),
+                 bg="#2d2d2d", fg="white").grid(row=0, column=0, padx=5, pady=3, sticky=tk.W)
+        self.plate_entry = tk.Entry(weighing_frame, width=10, font=("Arial", 11))
+        self.plate_entry.grid(row=0, column=1, padx=5, pady=3, sticky=tk.W)
+        tk.Button(weighing_frame, text="📋 Reporte", command=self.show_weighing_report,
+                  bg="#3d3d3d", fg="white").grid(row=0, column=2, padx=5, pady=3, sticky=tk.E)
+        tk.Button(weighing_frame, text="📤 Exportar", command=self.open_export_dialog,
+                  bg="#3d3d3d", fg="white").grid(row=0, column=3, padx=5, pady=3, sticky=tk.E)
+        self.weighing_label = tk.Label(weighing_frame, text="Sin pesaje en curso", font=("Arial", 10),
+                                       bg="#2d2d2d", fg="white")
+        self.weighing_label.grid(row=1, column=0, columnspan=3, padx=5, sticky=tk.W)
+        self.weighing_totals_label = tk.Label(weighing_frame, text="Hoy: --", font=("Arial", 10),
+                                              bg="#2d2d2d", fg="#888888")
+        self.weighing_totals_label.grid(row=2, column=0, columnspan=3, padx=5, pady=(0, 3), sticky=tk.W)
+
+        # Tendencia del peso (min/máx por columna de píxeles)
+        trend_frame = tk.Frame(display_frame, bg="#1e1e1e")
+        trend_frame.pack(fill=tk.X, padx=10, pady=(10, 0))
+        tk.Label(trend_frame, text="Tendencia:", font=("Arial", 9),
+                 bg="#1e1e1e", fg="#888888").pack(side=tk.LEFT)
+        self.trend_window_combo = ttk.Combobox(trend_frame, values=list(TREND_WINDOWS), width=7, state="readonly")
+        self.trend_window_combo.set("10 min")
+        self.trend_window_combo.pack(side=tk.LEFT, padx=5)
+        self.trend_window_combo.bind("<<ComboboxSelected>>", lambda e: self._reset_trend_zoom())
+        self.trend_range_label = tk.Label(trend_frame, text="en vivo", font=("Consolas", 8),
+                                          bg="#1e1e1e", fg="#888888")
+        self.trend_range_label.pack(side=tk.RIGHT)
+
+        self.trend_canvas = tk.Canvas(display_frame, height=110, bg="#111111", highlightthickness=0)
+        self.trend_canvas.pack(fill=tk.X, padx=10, pady=(2, 0))
+        self._trend_line = self.trend_canvas.create_line(0, 0, 0, 0, fill="#00ff00", state="hidden")
+        self._trend_labels = (
+            self.trend_canvas.create_text(4, 2, anchor=tk.NW, fill="#888888", font=("Consolas", 8)),
+            self.trend_canvas.create_text(4, 108, anchor=tk.SW, fill="#888888", font=("Consolas", 8)),
+        )
+        self._trend_selection = self.trend_canvas.create_rectangle(0, 0, 0, 0, outline="#4fc3f7", state="hidden")
+        # Arrastrar = acercar a ese rango; doble clic = volver a la ventana en vivo
+        self.trend_canvas.bind("<ButtonPress-1>", self._on_trend_press)
+        self.trend_canvas.bind("<B1-Motion>", self._on_trend_drag)
+        self.trend_canvas.bind("<ButtonRelease-1>", self._on_trend_release)
+        self.trend_canvas.bind("<Double-Button-1>", lambda e: self._reset_trend_zoom())
+
         # Frame inferior - Log (en el lado izquierdo)
         log_frame = tk.LabelFrame(left_frame, text="Registro de Datos", bg="#2d2d2d",
                                  fg="white", font=("Arial", 10))
@@ -142,6 +407,10 @@ class WeightMonitor:
                                  bg="#2d2d2d", fg="#00ff00", font=("Arial", 9))
         self.fps_label.pack(side=tk.RIGHT, padx=10)
 
+        self.frame_latency_label = tk.Label(title_frame, text="Latencia: --",
+                                            bg="#2d2d2d", fg="#888888", font=("Consolas", 9))
+        self.frame_latency_label.pack(side=tk.RIGHT, padx=10)
+
         # Área para mostrar el navegador embebido
         self.browser_canvas = tk.Canvas(right_container, bg="black", highlightthickness=0)
         self.browser_canvas.pack(fill=tk.BOTH, expand=True)
@@ -156,221 +425,845 @@ class WeightMonitor:
         tk.Button(btn_frame, text="Guardar Datos", command=self.save_log,
                  bg="#3d3d3d", fg="white").pack(side=tk.LEFT, padx=5)
 
-    def init_selenium(self):
-        try:
-            self.log_message("🌐 Iniciando navegador Chrome...")
-            chrome_options = Options()
-
-            # ============================================
-            # CONFIGURACIONES CRÍTICAS PARA BACKGROUND
-            # ============================================
-            
-            # Evitar que Chrome reduzca rendimiento cuando no está en foco
-            chrome_options.add_argument("--disable-background-timer-throttling")
-            chrome_options.add_argument("--disable-backgrounding-occluded-windows")
-            chrome_options.add_argument("--disable-renderer-backgrounding")
-            chrome_options.add_argument("--disable-ipc-flooding-protection")
-            chrome_options.add_argument("--disable-hang-monitor")
-            
-            # CRÍTICO: Evitar que Windows detecte la ventana como "oculta"
-            chrome_options.add_argument("--disable-features=CalculateNativeWinOcclusion")
-            
-            # Configuraciones de rendimiento
-            chrome_options.add_argument("--no-sandbox")
-            chrome_options.add_argument("--disable-dev-shm-usage")
-            chrome_options.add_argument("--disable-gpu-sandbox")
-            chrome_options.add_argument("--disable-extensions")
-            chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-            
-            # Evitar detección de automatización
-            chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-            chrome_options.add_experimental_option('useAutomationExtension', False)
-            
-            # Preferencias para mantener contenido activo
-            prefs = {
-                "profile.default_content_setting_values.notifications": 2,
-                "profile.managed_default_content_settings.images": 1,
-                # Evitar suspensión de pestañas
-                "profile.content_settings.exceptions.automatic_downloads.*.setting": 1
-            }
-            chrome_options.add_experimental_option("prefs", prefs)
+        tk.Button(btn_frame, text="🔎 Historial", command=self.open_history_dialog,
+                 bg="#3d3d3d", fg="white").pack(side=tk.LEFT, padx=5)
 
-            # Iniciar navegador
-            self.driver = webdriver.Chrome(options=chrome_options)
+        tk.Checkbutton(btn_frame, text="Métricas (F3)", variable=self.show_metrics_overlay,
+                       bg="#1e1e1e", fg="white", selectcolor="#3d3d3d",
+                       activebackground="#1e1e1e", activeforeground="white").pack(side=tk.RIGHT, padx=5)
+        self.root.bind("<F3>", lambda e: self.show_metrics_overlay.set(not self.show_metrics_overlay.get()))
+
+    def init_instance_role(self):
+        """Decide si esta instancia es dueña del puerto COM o un visor de solo lectura"""
+        listen_sock = try_become_owner()
+        if listen_sock:
+            self.broadcaster = ReadingBroadcaster(listen_sock)
+            self.broadcaster.start(self.orchestrator.loop)
+            self._set_serial_controls_state("normal")
+            self.log_message("🔒 Instancia principal: esta ventana controla el puerto serial")
+            self.start_api_server()
+            self.start_upstream()
+            return
 
-            # Configurar ventana (NO maximizar, usar tamaño fijo)
-            self.driver.set_window_size(960, 540)
-            
-            # CRÍTICO: Inyectar JavaScript para mantener página activa
-            self.driver.execute_cdp_cmd('Page.setWebLifecycleState', {
-                'state': 'active',
-            })
-            
-            self.driver.get(HIK_CONNECT_URL)
-            
-            # Inyectar script para prevenir suspensión
-            self.driver.execute_script("""
+        self._set_serial_controls_state("disabled")
+        self.status_text.config(text="VISOR", fg="#4fc3f7")
+        self.viewer = ViewerClient(
+            on_reading=lambda r: self.root.after(0, self._on_viewer_reading, r),
+            on_lost=lambda: self.root.after(0, self._on_owner_lost)
+        )
+        if self.viewer.connect(self.orchestrator.loop):
+            self.status_label.config(fg="#4fc3f7")
+            self.log_message("👁 Otra instancia controla el puerto: modo VISOR (solo lectura)")
+        else:
+            self.log_message("⚠ No se pudo contactar a la instancia principal, reintentando...")
+            self.root.after(2000, self.init_instance_role)
+
+    def start_api_server(self):
+        """Levanta el API local de lecturas (GET /weight/current, SSE y WebSocket)"""
+        try:
+            self.api_server = WeightApiServer(port=API_PORT)
+            self.api_server.start(self.orchestrator.loop)
+            # render() evalúa los gauges (RSS de todo Chrome con psutil, profundidad de la bandeja):
+            # fuera del loop que mueve la captura, el API y la bandeja
+            self.api_server.add_route("/metrics", lambda: ("text/plain; version=0.0.4",
+                                                           REGISTRY.render().encode("utf-8")), blocking=True)
+            if self.weighing_store:
+                self.api_server.add_route("/weighings/today", self._route_weighings_today, blocking=True)
+            self.log_message(f"🌍 API local en http://127.0.0.1:{self.api_server.port}/weight/current")
+        except OSError as e:
+            self.api_server = None
+            self.log_message(f"⚠ No se pudo iniciar el API local: {str(e)[:50]}")
+
+    def start_upstream(self):
+        """Abre la bandeja de salida y arranca el enviador (solo la instancia principal envía)"""
+        url = upstream_url()
+        if not url or self.outbox_sender:
+            if not url:
+                self.log_message(f"ℹ Sin servidor central ({UPSTREAM_ENV} no definido)")
+            return
+        try:
+            self.outbox = Outbox()
+        except sqlite3.Error as e:
+            self.log_message(f"⚠ No se pudo abrir la bandeja de salida: {str(e)[:50]}")
+            return
+        self.outbox_sender = OutboxSender(self.outbox, url, self.orchestrator, log=self.log_message)
+        self.outbox_sender.start()
+        self.log_message(f"📡 Servidor central: {url} ({self.outbox.depth} eventos pendientes)")
+
+    def _enqueue_upstream(self, event):
+        """Guarda el evento en disco (hilo propio de la bandeja, no el ejecutor de la captura)"""
+        future = self.outbox_sender.enqueue(event)
+
+        def appended(f):
+            if f.exception() is not None:
+                self.root.after(0, self.log_message,
+                                f"❌ Error al guardar en la bandeja de salida: {str(f.exception())[:50]}")
+        future.add_done_callback(appended)
+
+    def _set_serial_controls_state(self, state):
+        self.port_combo.config(state="readonly" if state == "normal" else "disabled")
+        self.baud_combo.config(state="readonly" if state == "normal" else "disabled")
+        for btn in (self.btn_refresh, self.btn_force_free, self.btn_reset_ports, self.btn_connect):
+            btn.config(state=state)
+
+    def _on_viewer_reading(self, reading):
+        """Lectura recibida de la instancia principal (corre en el hilo principal)"""
+        self.log_message(f"📊 Datos: {reading['raw']}", persist=False)
+        self.update_display(reading['weight'], reading['status'], reading['type'], unit=reading.get('unit', 'kg'))
+
+    def _on_owner_lost(self):
+        self.log_message("⚠ Se perdió la instancia principal")
+        self.status_label.config(fg="#ff4444")
+        self.status_text.config(text="DESCONECTADO", fg="#888888")
+        self.viewer = None
+        # Reintentar: si la principal cerró, esta instancia toma el control
+        self.root.after(2000, self.init_instance_role)
+
+    def init_selenium(self):
+        self.log_message("🌐 Iniciando navegador Chrome...")
+        self.orchestrator.spawn(self._browser_main(), name="browser")
+
+    def _launch_browser(self):
+        """Arranca Chrome y abre Hik-Connect (bloqueante: corre en el ejecutor de E/S)"""
+        chrome_options = Options()
+
+        # ============================================
+        # CONFIGURACIONES CRÍTICAS PARA BACKGROUND
+        # ============================================
+
+        # Evitar que Chrome reduzca rendimiento cuando no está en foco
+        chrome_options.add_argument("--disable-background-timer-throttling")
+        chrome_options.add_argument("--disable-backgrounding-occluded-windows")
+        chrome_options.add_argument("--disable-renderer-backgrounding")
+        chrome_options.add_argument("--disable-ipc-flooding-protection")
+        chrome_options.add_argument("--disable-hang-monitor")
+
+        # CRÍTICO: Evitar que Windows detecte la ventana como "oculta"
+        chrome_options.add_argument("--disable-features=CalculateNativeWinOcclusion")
+
+        # Configuraciones de rendimiento
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
+        chrome_options.add_argument("--disable-gpu-sandbox")
+        chrome_options.add_argument("--disable-extensions")
+        chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+
+        # Evitar detección de automatización
+        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+        chrome_options.add_experimental_option('useAutomationExtension', False)
+
+        # Preferencias para mantener contenido activo
+        prefs = {
+            "profile.default_content_setting_values.notifications": 2,
+            "profile.managed_default_content_settings.images": 1,
+            # Evitar suspensión de pestañas
+            "profile.content_settings.exceptions.automatic_downloads.*.setting": 1
+        }
+        chrome_options.add_experimental_option("prefs", prefs)
+
+        # Iniciar navegador
+        driver = webdriver.Chrome(options=chrome_options)
+
+        # Configurar ventana (NO maximizar, usar tamaño fijo)
+        driver.set_window_size(960, 540)
+
+        # CRÍTICO: Inyectar JavaScript para mantener página activa
+        driver.execute_cdp_cmd('Page.setWebLifecycleState', {
+            'state': 'active',
+        })
+
+        driver.get(self.channels[0].url)
+
+        # Inyectar script para prevenir suspensión
+        # El intervalo se guarda para espaciarlo en reposo (window.__pesajeSetIdle(factor)); el video
+        # lo vigila el monitor por eventos de video_health
+        keep_active_js = """
+            var timer = 0;
+            window.__pesajeSetIdle = function(factor) {
+                clearInterval(timer);
                 // Prevenir que la página entre en estado idle
-                setInterval(function() {
+                timer = setInterval(function() {
                     // Disparar evento de actividad sin interferir con la UI
                     document.dispatchEvent(new Event('touchstart'));
-                }, 2000);
-                
-                // Mantener video activo
-                setInterval(function() {
-                    var videos = document.querySelectorAll('video');
-                    videos.forEach(function(v) {
-                        if (v.paused && v.readyState >= 2) {
-                            v.play().catch(function(){});
-                        }
-                    });
-                }, 1000);
-            """)
-
-            self.log_message(f"✓ Navegador iniciado (~{1000 // BROWSER_REFRESH_MS} FPS)")
-
-            # Iniciar hilos de captura
-            self.browser_running = True
-            
-            # Hilo de captura de screenshots
-            self.screenshot_thread = threading.Thread(target=self._screenshot_worker, daemon=True)
-            self.screenshot_thread.start()
-            
-            # Hilo de keep-alive para el navegador
-            self.keepalive_thread = threading.Thread(target=self._keepalive_worker, daemon=True)
-            self.keepalive_thread.start()
-
-            # Iniciar actualización de la UI
+                }, 2000 * factor);
+            };
+            window.__pesajeSetIdle(1);
+        """
+        driver.execute_script(keep_active_js)
+        self.channels[0].handle = driver.current_window_handle
+
+        # Grilla: una ventana más por canal (las ventanas, a diferencia de las pestañas, siguen
+        # renderizando cuando no están al frente)
+        for channel in self.channels[1:]:
+            driver.switch_to.new_window("window")
+            driver.set_window_size(960, 540)
+            driver.execute_cdp_cmd('Page.setWebLifecycleState', {'state': 'active'})
+            driver.get(channel.url)
+            driver.execute_script(keep_active_js)
+            channel.handle = driver.current_window_handle
+        if self.grid_mode:
+            driver.switch_to.window(self.channels[0].handle)
+
+        return driver
+
+    async def _browser_main(self):
+        """Inicia el navegador y agenda la captura y el keep-alive en el loop del orquestador"""
+        try:
+            self.driver = await self.orchestrator.run_blocking(self._launch_browser)
+        except Exception as e:
+            self.log_message(f"❌ Error al iniciar Selenium: {e}")
+            self.root.after(0, self._show_browser_error, e)
+            return
+
+        self.log_message(f"✓ Navegador iniciado (~{1000 // BROWSER_REFRESH_MS} FPS)")
+        self.browser_running = True
+
+        # Iniciar actualización de la UI
+        self.root.after(0, self._update_canvas)
+        if self.grid_mode:
+            if FRAME_CAPTURE_MODE == "process":
+                self.log_message("ℹ La grilla de cámaras captura en este proceso (el modo proceso es de un canal)")
+            names = ", ".join(f"{n} {fps:.1f}" for n, fps in self.capture_scheduler.shares().items())
+            self.log_message(f"🎥 Grilla de {len(self.channels)} cámaras (FPS: {names})")
+            await asyncio.gather(self._grid_capture_loop(), self._video_health_main())
+        elif FRAME_CAPTURE_MODE == "process" and self._start_frame_process():
+            await asyncio.gather(self._frame_process_loop(), self._video_health_main())
+        else:
+            await asyncio.gather(self._screenshot_loop(), self._video_health_main())
+
+    def _debugger_address(self):
+        return self.driver.capabilities.get("goog:chromeOptions", {}).get("debuggerAddress")
+
+    async def _video_health_main(self):
+        """Salud del video por eventos CDP; si el puerto de depuración no sirve, keep-alive por sondeo"""
+        address = self._debugger_address()
+        if address:
+            monitors = [VideoHealthMonitor(address, channel.handle, channel.name, log=self.log_message)
+                        for channel in self.channels]
+            try:
+                available = all([await monitor.available() for monitor in monitors])
+            except CDP_ERRORS as e:
+                self.log_message(f"⚠ Puerto de depuración de Chrome no disponible: {str(e)[:50]}")
+                available = False
+            if available:
+                self.video_monitors = monitors
+                self.log_message("✓ Salud del video por eventos (sin keep-alive por sondeo)")
+                tasks = [asyncio.ensure_future(monitor.run()) for monitor in monitors]
+                try:
+                    await asyncio.gather(*tasks)
+                    return
+                except CDP_ERRORS as e:
+                    # run() reintenta solo; llegar acá es una falla inesperada: no dejar el video sin vigilancia
+                    for task in tasks:
+                        task.cancel()
+                    self.log_message(f"⚠ Monitor de video por eventos caído: {str(e)[:50]}")
+                    self.video_monitors = []
+        self.log_message("ℹ Video sin monitor por eventos: keep-alive por sondeo cada 5 s")
+        await self._keepalive_loop()
+
+    def _start_frame_process(self):
+        """Lanza el proceso de captura enganchado al mismo Chrome (vía su puerto de depuración)"""
+        address = self._debugger_address()
+        if not address:
+            self.log_message("⚠ Chrome no expone debuggerAddress: captura en este proceso")
+            return False
+        try:
+            self.frame_process = FrameCaptureProcess(attach_chrome, (address,),
+                                                     interval=BROWSER_REFRESH_MS / 1000.0)
+            self.frame_process.request_size(*self._canvas_size)
+            self.frame_process.request_interval(self.idle_governor.frame_interval(BROWSER_REFRESH_MS / 1000.0))
+            self.frame_process.start()
+        except (OSError, ValueError) as e:
+            self.log_message(f"⚠ No se pudo iniciar el proceso de captura: {str(e)[:50]}")
+            self.frame_process = None
+            return False
+        self.log_message(f"✓ Captura en proceso aparte (pid {self.frame_process.process.pid})")
+        return True
+
+    async def _frame_process_loop(self):
+        """Modo proceso: toma del anillo compartido los frames ya decodificados y redimensionados"""
+        last_fps_update = time.time()
+        frame_count = 0
+        capture = self.frame_process
+
+        while self.browser_running and capture.alive:
+            capture.request_size(*self._canvas_size)
+            frame = capture.poll_image()
+            if frame is not None:
+                image, t_request, (capture_s, decode_s, resize_s) = frame
+                # Las etapas medidas en el proceso hijo se reconstruyen como marcas de la traza
+                t_capture = t_request + capture_s
+                t_decode = t_capture + decode_s
+                trace = self.frame_tracer.start(t_request)
+                trace += (t_capture, t_decode, t_decode + resize_s)
+                self._snapshot_image = image
+                with self._screenshot_lock:
+                    self._latest_image = image
+                    self._latest_frame_trace = trace
+                    self._last_screenshot_time = time.time()
+
+                frame_count += 1
+                if time.time() - last_fps_update >= 1.0:
+                    self._show_fps(frame_count / (time.time() - last_fps_update))
+                    frame_count = 0
+                    last_fps_update = time.time()
+
+            # En reposo el proceso publica un frame cada varios segundos: revisar a ese ritmo
+            await self._capture_sleep(self.idle_governor.frame_interval(FRAME_POLL_S))
+
+        if self.browser_running:
+            self.log_message("❌ El proceso de captura terminó")
+
+    def _on_idle_change(self, idle):
+        """Transición de reposo (hilo principal): ajusta captura, repintado y timers de la página"""
+        if idle:
+            self.log_message(f"💤 Balanza en cero: captura reducida a 1 frame cada {IDLE_FRAME_INTERVAL_S:g}s")
+        else:
+            self.log_message("⚡ Actividad en la balanza: captura a ritmo normal")
+        if self.frame_process:
+            self.frame_process.request_interval(self.idle_governor.frame_interval(BROWSER_REFRESH_MS / 1000.0))
+        # La tarea de captura puede estar durmiendo el intervalo largo: despertarla ya
+        self.orchestrator.call_soon(self._capture_wake.set)
+        if not self.browser_running or not self.driver:
+            return
+        if not idle and self._canvas_after is not None:
+            self.root.after_cancel(self._canvas_after)
             self._update_canvas()
+        self.orchestrator.spawn(self.orchestrator.run_blocking(self._set_page_idle,
+                                                               self.idle_governor.page_timer_factor()),
+                                name="page-idle")
 
+    def _set_page_idle(self, factor):
+        """Espacia (o restablece) los setInterval de keep-alive en cada ventana (bloqueante)"""
+        script = "if (window.__pesajeSetIdle) window.__pesajeSetIdle(arguments[0]);"
+        try:
+            if self.grid_mode:
+                with self._window_lock:
+                    for channel in self.channels:
+                        self.driver.switch_to.window(channel.handle)
+                        self.driver.execute_script(script, factor)
+            else:
+                self.driver.execute_script(script, factor)
         except Exception as e:
-            self.log_message(f"❌ Error al iniciar Selenium: {e}")
-            self.browser_canvas.delete("all")
-            self.browser_canvas.create_text(
-                self.browser_canvas.winfo_width()//2,
-                self.browser_canvas.winfo_height()//2,
-                text=f"Error al iniciar navegador:\n{str(e)}",
-                fill="red",
-                font=("Arial", 12)
-            )
+            self.log_message(f"⚠ No se pudo ajustar la página al reposo: {str(e)[:50]}")
+
+    async def _capture_sleep(self, seconds):
+        """Espera entre capturas; el fin del reposo la corta para volver enseguida al ritmo normal"""
+        self._capture_wake.clear()
+        try:
+            await asyncio.wait_for(self._capture_wake.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    def _show_browser_error(self, error):
+        self.browser_canvas.delete("all")
+        self._frame_item = self._stale_item = None
+        self.browser_canvas.create_text(
+            self.browser_canvas.winfo_width()//2,
+            self.browser_canvas.winfo_height()//2,
+            text=f"Error al iniciar navegador:\n{str(error)}",
+            fill="red",
+            font=("Arial", 12)
+        )
+
+    def _keepalive_once(self):
+        if self.grid_mode:
+            with self._window_lock:
+                for channel in self.channels:
+                    self.driver.switch_to.window(channel.handle)
+                    self._keepalive_window()
+            return
+        self._keepalive_window()
+
+    def _keepalive_window(self):
+        # Ejecutar JavaScript para mantener la página activa
+        t0 = time.perf_counter()
+        self.driver.execute_script("return document.title;")
+        M_DRIVER_KEEPALIVE.time_since(t0)
+
+        # Mantener el estado de la pestaña como activo
+        try:
+            self.driver.execute_cdp_cmd('Page.setWebLifecycleState', {
+                'state': 'active',
+            })
+        except:
+            pass
 
-    def _keepalive_worker(self):
-        """Thread dedicado a mantener el navegador activo en background"""
+    async def _keepalive_loop(self):
+        """Respaldo sin CDP: mantiene el navegador activo sondeando cada 5 segundos"""
         while self.browser_running and self.driver:
             try:
-                # Ejecutar JavaScript cada 5 segundos para mantener la página activa
-                self.driver.execute_script("return document.title;")
-                
-                # Mantener el estado de la pestaña como activo
-                try:
-                    self.driver.execute_cdp_cmd('Page.setWebLifecycleState', {
-                        'state': 'active',
-                    })
-                except:
-                    pass
-                
-                time.sleep(5)
+                await self.orchestrator.run_blocking(self._keepalive_once)
             except Exception as e:
+                M_KEEPALIVE_FAILURES.inc()
                 if self.browser_running:
                     self.log_message(f"⚠ Keep-alive error: {str(e)[:50]}")
-                time.sleep(5)
+            await asyncio.sleep(5)
+
+    def _capture_image(self, size, trace):
+        """Captura, decodifica y redimensiona (bloqueante: corre en el ejecutor de E/S)
+
+        Devuelve la imagen PIL; el PhotoImage se actualiza en el hilo de Tk con _paste_frame.
+        """
+        image = capture_frame(self.driver, size, trace, self._frame_buffers)
+        if image is not None:
+            self._snapshot_image = image
+        return image
+
+    def _capture_channel(self, channel, size, trace):
+        """Grilla: captura la ventana de un canal (bloqueante: corre en el ejecutor de E/S)"""
+        with self._window_lock:
+            self.driver.switch_to.window(channel.handle)
+            image = capture_frame(self.driver, size, trace, self._frame_buffers)
+        if image is None:
+            return None
+        channel.frames.inc()
+        if channel.lane:
+            # La foto del pesaje sale de la cámara del carril
+            self._snapshot_image = image
+        return image, frame_digest(image)
+
+    async def _grid_capture_loop(self):
+        """Grilla: en cada turno el planificador elige el canal a capturar dentro del presupuesto"""
+        scheduler = self.capture_scheduler
+        consecutive_errors = 0
+        last_fps_update = time.time()
+        frame_count = 0
 
-    def _screenshot_worker(self):
-        """Hilo dedicado a capturar screenshots sin bloquear la UI - VERSION MEJORADA"""
+        while self.browser_running and self.driver:
+            start_time = time.time()
+            channel = scheduler.next()
+            try:
+                trace = self.frame_tracer.start()
+                frame = await self.orchestrator.run_blocking(self._capture_channel, channel, self._tile_size, trace)
+            except Exception as e:
+                consecutive_errors += 1
+                if consecutive_errors > 20:
+                    self.log_message(f"❌ Grilla: demasiados errores, deteniendo ({str(e)[:50]})")
+                    break
+                await asyncio.sleep(0.5)
+                continue
+            consecutive_errors = 0
+
+            if frame is not None:
+                with self._screenshot_lock:
+                    self._tile_frames[channel.name] = frame + (trace,)
+                    self._last_screenshot_time = time.time()
+
+            frame_count += 1
+            if time.time() - last_fps_update >= 1.0:
+                self._show_fps(frame_count / (time.time() - last_fps_update))
+                frame_count = 0
+                last_fps_update = time.time()
+
+            sleep_time = self.idle_governor.frame_interval(scheduler.interval) - (time.time() - start_time)
+            if sleep_time > 0:
+                await self._capture_sleep(sleep_time)
+
+    def _show_fps(self, fps):
+        try:
+            self.root.after(0, lambda f=fps: self.fps_label.config(
+                text=f"FPS: {f:.1f}",
+                fg="#00ff00" if f > 3 else "#ffaa00" if f > 1 else "#ff4444"
+            ))
+        except:
+            pass
+
+    async def _screenshot_loop(self):
+        """Tarea de captura: el loop agenda cada frame y el ejecutor hace la llamada a WebDriver"""
         consecutive_errors = 0
         last_fps_update = time.time()
         frame_count = 0
-        
+
         while self.browser_running and self.driver:
             try:
                 start_time = time.time()
-                
-                # Capturar screenshot con timeout implícito
-                screenshot_data = self.driver.get_screenshot_as_png()
-                image = Image.open(io.BytesIO(screenshot_data))
-
-                # Obtener tamaño del canvas (thread-safe read)
-                try:
-                    cw = self.browser_canvas.winfo_width()
-                    ch = self.browser_canvas.winfo_height()
-                except:
-                    cw, ch = 800, 600
 
-                if cw > 1 and ch > 1:
-                    # Usar BILINEAR para redimensionar más rápido
-                    image = image.resize((cw, ch), Image.BILINEAR)
-                    photo = ImageTk.PhotoImage(image)
+                trace = self.frame_tracer.start()
+                image = await self.orchestrator.run_blocking(self._capture_image, self._canvas_size, trace)
 
+                if image is not None:
                     with self._screenshot_lock:
-                        self._latest_photo = photo
+                        self._latest_image = image
+                        self._latest_frame_trace = trace
                         self._last_screenshot_time = time.time()
-                
+
                 # Resetear contador de errores en captura exitosa
                 consecutive_errors = 0
-                
+
                 # Calcular y actualizar FPS
                 frame_count += 1
                 if time.time() - last_fps_update >= 1.0:
-                    fps = frame_count / (time.time() - last_fps_update)
-                    try:
-                        self.root.after(0, lambda f=fps: self.fps_label.config(
-                            text=f"FPS: {f:.1f}",
-                            fg="#00ff00" if f > 3 else "#ffaa00" if f > 1 else "#ff4444"
-                        ))
-                    except:
-                        pass
+                    self._show_fps(frame_count / (time.time() - last_fps_update))
                     frame_count = 0
                     last_fps_update = time.time()
-                
+
                 # Calcular tiempo de espera dinámico
                 elapsed = time.time() - start_time
-                sleep_time = max(0, (BROWSER_REFRESH_MS / 1000.0) - elapsed)
-                
+                interval = self.idle_governor.frame_interval(BROWSER_REFRESH_MS / 1000.0)
+                sleep_time = max(0, interval - elapsed)
+
                 if sleep_time > 0:
-                    time.sleep(sleep_time)
+                    await self._capture_sleep(sleep_time)
 
             except Exception as e:
                 consecutive_errors += 1
-                
+
                 # Si hay muchos errores consecutivos, aumentar el tiempo de espera
                 if consecutive_errors > 5:
-                    self.log_message(f"⚠ Screenshot worker: {consecutive_errors} errores consecutivos")
-                    time.sleep(1)
+                    self.log_message(f"⚠ Captura: {consecutive_errors} errores consecutivos")
+                    await asyncio.sleep(1)
                 else:
-                    time.sleep(0.5)
-                
+                    await asyncio.sleep(0.5)
+
                 # Si hay demasiados errores, puede que el navegador se haya cerrado
                 if consecutive_errors > 20:
-                    self.log_message("❌ Screenshot worker: Demasiados errores, deteniendo...")
+                    self.log_message("❌ Captura: Demasiados errores, deteniendo...")
                     break
 
     def _update_canvas(self):
-        """Actualiza el canvas con la última captura disponible (corre en el hilo principal)"""
+        """Pega en el canvas la última captura disponible (corre en el hilo principal)
+
+        Los ítems del canvas (imagen y aviso) se crean una vez; por frame solo se pegan píxeles.
+        """
         if not self.browser_running:
             return
 
+        self._canvas_size = (self.browser_canvas.winfo_width(), self.browser_canvas.winfo_height())
+        if self.grid_mode:
+            self._update_grid()
+            self._schedule_canvas()
+            return
         with self._screenshot_lock:
-            photo = self._latest_photo
+            image, self._latest_image = self._latest_image, None
             last_update = self._last_screenshot_time
-
-        if photo:
-            self.browser_canvas.delete("all")
-            self.browser_canvas.create_image(0, 0, image=photo, anchor=tk.NW)
-            self.browser_canvas.image = photo
-            
-            # Mostrar advertencia si la última captura es muy antigua
+            # Cada frame nuevo se traza una sola vez
+            trace, self._latest_frame_trace = self._latest_frame_trace, None
+
+        canvas = self.browser_canvas
+        if image is not None:
+            StageTracer.mark(trace)
+            t0 = time.perf_counter()
+            photo = self._paste_frame(image)
+            if self._frame_item is None:
+                self._frame_item = canvas.create_image(0, 0, image=photo, anchor=tk.NW)
+                self._stale_item = canvas.create_text(10, 10, text="", fill="yellow", anchor=tk.NW,
+                                                      font=("Arial", 10, "bold"), state="hidden")
+            elif canvas.itemcget(self._frame_item, "image") != str(photo):
+                # PhotoImage nuevo solo tras un cambio de tamaño
+                canvas.itemconfig(self._frame_item, image=photo)
+            M_PAINT.time_since(t0)
+            StageTracer.mark(trace)
+            self.frame_tracer.finish(trace)
+
+        if self._frame_item is not None:
+            # Advertencia si la última captura es muy antigua
             time_since_update = time.time() - last_update
-            if time_since_update > 2:
-                self.browser_canvas.create_text(
-                    10, 10,
-                    text=f"⚠ Sin actualización por {time_since_update:.1f}s",
-                    fill="yellow",
-                    anchor=tk.NW,
-                    font=("Arial", 10, "bold")
-                )
-
-        # Programar siguiente actualización del canvas (cada 50ms = 20 FPS de UI)
-        self.root.after(50, self._update_canvas)
+            if time_since_update > max(STALE_FRAME_S, 2 * self.idle_governor.frame_interval(0)):
+                canvas.itemconfig(self._stale_item, text=f"⚠ Sin actualización por {time_since_update:.1f}s",
+                                  state="normal")
+            elif canvas.itemcget(self._stale_item, "state") != "hidden":
+                canvas.itemconfig(self._stale_item, state="hidden")
+
+            canvas.delete("overlay")
+            if self.show_metrics_overlay.get():
+                self._draw_metrics_overlay()
+
+        self._schedule_canvas()
+
+    def _schedule_canvas(self):
+        """Próximo repintado: cada CANVAS_REFRESH_MS, o al ritmo de las capturas en reposo"""
+        delay = CANVAS_REFRESH_MS
+        if self.idle_governor.idle:
+            delay = int(IDLE_FRAME_INTERVAL_S * 1000)
+        self._canvas_after = self.root.after(delay, self._update_canvas)
+
+    def _build_grid(self, layout):
+        """Crea un PhotoImage y un rótulo por canal; solo al iniciar o al cambiar el tamaño del canvas"""
+        cols, rows, tile_w, tile_h = layout
+        self._grid_layout = layout
+        self._tile_size = (tile_w, tile_h)
+        canvas = self.browser_canvas
+        canvas.delete("all")
+        self._tiles = []
+        for index, channel in enumerate(self.channels):
+            x, y = tile_origin(index, cols, tile_w, tile_h)
+            photo = ImageTk.PhotoImage("RGB", (max(tile_w, 1), max(tile_h, 1)))
+            canvas.create_image(x, y, image=photo, anchor=tk.NW)
+            label = canvas.create_text(x + 6, y + 6, text=channel.name, fill="white", anchor=tk.NW,
+                                       font=("Arial", 10, "bold"))
+            canvas.create_rectangle(x, y, x + tile_w - 1, y + tile_h - 1, outline="#3d3d3d")
+            self._tiles.append({"photo": photo, "label": label, "digest": None, "painted": 0.0, "state": None})
+
+    def _update_grid(self):
+        """Grilla: pega solo los frames nuevos y distintos en su mosaico (hilo principal)"""
+        width, height = self._canvas_size
+        if width <= 1 or height <= 1:
+            return
+        layout = grid_layout(len(self.channels), width, height)
+        if layout != self._grid_layout:
+            self._build_grid(layout)
+        with self._screenshot_lock:
+            frames, self._tile_frames = self._tile_frames, {}
+
+        now = time.time()
+        boost = self.capture_scheduler.boost
+        shares = self.capture_scheduler.shares()
+        # En reposo cada canal recibe proporcionalmente menos frames
+        slowdown = self.idle_governor.frame_interval(self.capture_scheduler.interval) / self.capture_scheduler.interval
+        for channel, tile in zip(self.channels, self._tiles):
+            frame = frames.get(channel.name)
+            if frame is not None:
+                image, digest, trace = frame
+                if image.size != self._tile_size:
+                    # Capturado antes de un cambio de tamaño: el siguiente ya viene bien
+                    pass
+                elif digest == tile["digest"]:
+                    M_TILES_SKIPPED.inc()
+                    tile["painted"] = now
+                else:
+                    StageTracer.mark(trace)
+                    t0 = time.perf_counter()
+                    tile["photo"].paste(image)
+                    M_PAINT.time_since(t0)
+                    StageTracer.mark(trace)
+                    self.frame_tracer.finish(trace)
+                    M_TILES_PAINTED.inc()
+                    tile["digest"] = digest
+                    tile["painted"] = now
+
+            # El rótulo solo se toca cuando cambia: canal priorizado o sin frames recientes (un canal
+            # de baja prioridad recibe pocos frames por segundo y no cuenta como atrasado por eso)
+            stale = now - tile["painted"] > max(STALE_FRAME_S, 3.0 * slowdown / shares[channel.name])
+            state = (boost and channel.lane, stale)
+            if state != tile["state"]:
+                tile["state"] = state
+                text = channel.name + (" ⚖" if state[0] else "") + (" ⚠ sin actualización" if stale else "")
+                self.browser_canvas.itemconfig(tile["label"], text=text, fill="yellow" if stale else "white")
+
+        self.browser_canvas.delete("overlay")
+        if self.show_metrics_overlay.get():
+            self._draw_metrics_overlay()
+
+    def _paste_frame(self, image):
+        """Pega los píxeles en el PhotoImage actual (solo se recrea si cambia el tamaño)"""
+        photo = self._latest_photo
+        if photo is None or (photo.width(), photo.height()) != image.size:
+            photo = ImageTk.PhotoImage(image)
+        else:
+            photo.paste(image)
+        self._latest_photo = photo
+        return photo
+
+    def _refresh_trend(self):
+        self._draw_trend()
+        self.root.after(TREND_REFRESH_MS, self._refresh_trend)
+
+    def _draw_trend(self):
+        """Redibuja la tendencia decimando el rango visible al ancho del canvas en píxeles"""
+        canvas = self.trend_canvas
+        width = canvas.winfo_width()
+        height = canvas.winfo_height()
+        span = self.weight_history.time_range()
+        if span is None or width <= 2 or height <= 2:
+            return
+
+        if self._trend_zoom:
+            t0, t1 = self._trend_zoom
+        else:
+            t1 = time.time()
+            window = TREND_WINDOWS.get(self.trend_window_combo.get())
+            t0 = span[0] if window is None else t1 - window
+        if t1 <= t0:
+            return
+        columns = self.weight_history.decimate(t0, t1, width)
+        self._trend_view = (t0, t1, width)
+
+        points = [c for c in columns if c is not None]
+        if not points:
+            canvas.itemconfig(self._trend_line, state="hidden")
+            return
+        low = min(p[0] for p in points)
+        high = max(p[1] for p in points)
+        if high - low < 1e-9:
+            low, high = low - 1, high + 1
+        pad = 4
+        scale = (height - 2 * pad) / (high - low)
+
+        # Cada columna aporta un trazo vertical de su mínimo a su máximo
+        coords = []
+        for x, column in enumerate(columns):
+            if column is not None:
+                coords += (x, pad + (high - column[1]) * scale, x, pad + (high - column[0]) * scale)
+        canvas.coords(self._trend_line, *coords)
+        canvas.itemconfig(self._trend_line, state="normal")
+        canvas.itemconfig(self._trend_labels[0], text=f"{high:g}")
+        canvas.coords(self._trend_labels[1], 4, height - 2)
+        canvas.itemconfig(self._trend_labels[1], text=f"{low:g}")
+        if self._trend_zoom:
+            self.trend_range_label.config(text=f"{datetime.fromtimestamp(t0):%H:%M:%S} - "
+                                               f"{datetime.fromtimestamp(t1):%H:%M:%S}")
+
+    def _trend_time_at(self, x):
+        t0, t1, width = self._trend_view
+        return t0 + (t1 - t0) * min(max(x, 0), width) / width
+
+    def _on_trend_press(self, event):
+        self._trend_drag = event.x if self._trend_view else None
+
+    def _on_trend_drag(self, event):
+        if self._trend_drag is None:
+            return
+        self.trend_canvas.coords(self._trend_selection, self._trend_drag, 0, event.x, self.trend_canvas.winfo_height())
+        self.trend_canvas.itemconfig(self._trend_selection, state="normal")
+
+    def _on_trend_release(self, event):
+        self.trend_canvas.itemconfig(self._trend_selection, state="hidden")
+        start, self._trend_drag = self._trend_drag, None
+        if start is None or abs(event.x - start) < 3:
+            return
+        # El zoom usa la misma decimación, sobre el rango elegido
+        a, b = sorted((start, event.x))
+        self._trend_zoom = (self._trend_time_at(a), self._trend_time_at(b))
+        self._draw_trend()
+
+    def _reset_trend_zoom(self):
+        self._trend_zoom = None
+        self.trend_range_label.config(text="en vivo")
+        self._draw_trend()
+
+    def _refresh_latency_stats(self):
+        """Actualiza los percentiles en pantalla y hace el volcado periódico (hilo principal)"""
+        if self.reading_tracer.count:
+            self.latency_label.config(text=f"Latencia: {self.reading_tracer.summary()}")
+        if self.frame_tracer.count:
+            self.frame_latency_label.config(text=f"Latencia: {self.frame_tracer.summary()}")
+
+        now = time.monotonic()
+        if now - self._last_trace_dump >= TRACE_DUMP_S:
+            self._last_trace_dump = now
+            self.dump_latency_stats()
+
+        self.root.after(1000, self._refresh_latency_stats)
+
+    def toggle_profiling(self):
+        """Activa/desactiva el muestreo de hilos y la medición de callbacks de Tk"""
+        if self.profiling is None:
+            self.profiling = ProfilingSession()
+            self.profiling.start()
+            self.log_message(f"🔬 Perfilado activo (F9 para detener, o {PROFILE_ENV}=1 al iniciar)")
+            self.root.after(PROFILE_DUMP_S * 1000, self._dump_profile_periodic)
+        else:
+            session, self.profiling = self.profiling, None
+            try:
+                folded, report = session.stop()
+                self.log_message(f"🔬 Perfil guardado: {folded} y {report}")
+            except OSError as e:
+                self.log_message(f"❌ Error al guardar perfil: {str(e)}")
+
+    def _dump_profile_periodic(self):
+        if self.profiling is None:
+            return
+        try:
+            self.profiling.write()
+        except OSError as e:
+            self.log_message(f"⚠ Error al guardar perfil: {str(e)[:50]}")
+        self.root.after(PROFILE_DUMP_S * 1000, self._dump_profile_periodic)
+
+    def dump_latency_stats(self):
+        """Escribe los percentiles actuales en el log y en TRACE_DUMP_FILE"""
+        readings = self.reading_tracer.dump()
+        frames = self.frame_tracer.dump()
+        if readings["samples"]:
+            self.log_message(f"⏱ Lecturas: {self.reading_tracer.summary()} ({readings['count']} trazas)")
+        if frames["samples"]:
+            self.log_message(f"⏱ Frames: {self.frame_tracer.summary()} ({frames['count']} trazas)")
+        try:
+            with open(TRACE_DUMP_FILE, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"time": datetime.now().isoformat(timespec="seconds"),
+                                    "readings": readings, "frames": frames}) + "\n")
+        except OSError as e:
+            self.log_message(f"⚠ No se pudo escribir {TRACE_DUMP_FILE}: {str(e)[:50]}")
+
+    def _draw_metrics_overlay(self):
+        """Dibuja un resumen de las métricas en la esquina inferior del canvas"""
+        # Las tasas y el RSS se recalculan una vez por segundo, no en cada repintado
+        now = time.monotonic()
+        if now - self._overlay_updated >= 1.0:
+            self._serial_rates.update()
+            self._outbox_rate.update()
+            self._overlay_rss = self._chrome_rss_bytes()
+            self._overlay_updated = now
+        bytes_s, lines_s = self._serial_rates.rates
+        rss = self._overlay_rss
+
+        text = (f"serial: {bytes_s:.0f} B/s  {lines_s:.1f} líneas/s  fallos parseo: {M_PARSE_FAILURES.value}\n"
+                f"cola UI: {M_UI_QUEUE.get()}  frames: {M_FRAMES.value}  keep-alive fallos: {M_KEEPALIVE_FAILURES.value}\n"
+                f"captura {M_CAPTURE.mean() * 1000:.1f} ms  decode {M_DECODE.mean() * 1000:.1f} ms  "
+                f"resize {M_RESIZE.mean() * 1000:.1f} ms  paint {M_PAINT.mean() * 1000:.2f} ms\n"
+                f"Chrome RSS: {rss / 1048576:.0f} MB")
+        anomalies = "  ".join(f"{kind} {counter.value}" for kind, counter in M_ANOMALIES.items() if counter.value)
+        if anomalies:
+            text += f"\nanomalías: {anomalies}"
+        if self.video_monitors:
+            text += (f"\nvideo: {M_VIDEO_STALLS.value} cortes  recuperación media "
+                     f"{M_VIDEO_RECOVERY.mean() * 1000:.0f} ms  recargas: {M_VIDEO_RELOADS.value}")
+        if self.outbox:
+            text += (f"\noutbox: {self.outbox.depth} pendientes  {self._outbox_rate.rates[0]:.1f} eventos/s  "
+                     f"fallos: {M_OUTBOX_FAILURES.value}")
+        self.browser_canvas.create_text(10, self.browser_canvas.winfo_height() - 10, text=text,
+                                        fill="#00ffff", anchor=tk.SW, font=("Consolas", 9), tags="overlay")
+
+    def _chrome_rss_bytes(self):
+        """Suma el RSS del chromedriver, Chrome y todos sus procesos hijos"""
+        try:
+            root_proc = psutil.Process(self.driver.service.process.pid)
+        except (AttributeError, psutil.Error):
+            return 0
+        total = 0
+        for proc in [root_proc] + root_proc.children(recursive=True):
+            try:
+                total += proc.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        return total
+
+    def _own_process_tree(self):
+        """PIDs de esta instancia y sus hijos (el proceso de captura de frames y lo que lance)"""
+        me = psutil.Process()
+        roots = [me]
+        if self.frame_process and self.frame_process.process:
+            try:
+                roots.append(psutil.Process(self.frame_process.process.pid))
+            except psutil.Error:
+                pass
+        pids = set()
+        for root in roots:
+            pids.add(root.pid)
+            try:
+                pids.update(child.pid for child in root.children(recursive=True))
+            except psutil.Error:
+                pass
+        return pids
+
+    @staticmethod
+    def _holds_port(proc, port):
+        """True si el proceso tiene abierto el puerto serie (visible en Linux, no en Windows)"""
+        # open_files() solo lista archivos regulares: los /dev/tty* se ven en /proc/<pid>/fd
+        fd_dir = f"/proc/{proc.pid}/fd"
+        try:
+            target = os.path.realpath(port)
+            return any(os.readlink(os.path.join(fd_dir, fd)) == target for fd in os.listdir(fd_dir))
+        except OSError:
+            return False
+
+    @staticmethod
+    def _is_viewer(proc):
+        """True si el proceso es una instancia visora (conectada al candado de instancia de la dueña)"""
+        try:
+            return any(c.raddr and c.raddr.port == INSTANCE_PORT for c in proc.net_connections(kind="tcp"))
+        except (psutil.AccessDenied, psutil.NoSuchProcess, psutil.ZombieProcess):
+            return False
 
     def force_free_selected_port(self):
         """Liberar específicamente el puerto seleccionado de forma AGRESIVA"""
@@ -388,29 +1281,36 @@ class WeightMonitor:
                 self.disconnect()
                 time.sleep(0.5)
 
-            # PASO 2: Buscar y MATAR todos los procesos Python
+            # PASO 2: Buscar y MATAR los procesos que tienen el puerto (o, si no se ven, los Python ajenos)
             self.log_message("🔨 Buscando procesos que bloquean el puerto...")
-            current_pid = os.getpid()
+            protected = self._own_process_tree()
             killed_processes = []
+            candidates = []
+            python_procs = []
 
             for proc in psutil.process_iter(['pid', 'name', 'exe']):
                 try:
-                    if proc.info['pid'] == current_pid:
+                    if proc.info['pid'] in protected:
                         continue
+                    if self._holds_port(proc, port):
+                        candidates.append(proc)
+                    elif 'python' in (proc.info['name'] or '').lower() and not self._is_viewer(proc):
+                        python_procs.append(proc)
+                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                    pass
 
-                    proc_name = proc.info['name'].lower()
+            if not candidates:
+                # Windows no muestra los handles COM en open_files: se cae a los Python que no son
+                # esta instancia, su proceso de captura ni un visor
+                candidates = python_procs
 
-                    # Matar TODOS los procesos Python excepto este
-                    if 'python' in proc_name:
-                        try:
-                            proc.kill()
-                            killed_processes.append(f"{proc.info['name']} (PID: {proc.info['pid']})")
-                            self.log_message(f"💀 Proceso eliminado: {proc.info['name']} (PID: {proc.info['pid']})")
-                            time.sleep(0.2)
-                        except (psutil.NoSuchProcess, psutil.AccessDenied):
-                            pass
-
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            for proc in candidates:
+                try:
+                    proc.kill()
+                    killed_processes.append(f"{proc.info['name']} (PID: {proc.info['pid']})")
+                    self.log_message(f"💀 Proceso eliminado: {proc.info['name']} (PID: {proc.info['pid']})")
+                    time.sleep(0.2)
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
                     pass
 
             time.sleep(1)
@@ -475,8 +1375,45 @@ class WeightMonitor:
                 self.port_combo.set('COM5')
             else:
                 self.port_combo.set(ports[0])
+        if hasattr(self, 'protocol_combo'):
+            self._apply_port_protocol()
         self.log_message(f"Puertos disponibles: {', '.join(ports) if ports else 'ninguno'}")
 
+    def _load_port_protocols(self):
+        try:
+            with open(SCALE_PORTS_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_port_protocols(self):
+        try:
+            with open(SCALE_PORTS_FILE, 'w', encoding='utf-8') as f:
+                json.dump(self.port_protocols, f, indent=2)
+        except OSError as e:
+            self.log_message(f"⚠ No se pudo guardar {SCALE_PORTS_FILE}: {str(e)[:50]}")
+
+    def _apply_port_protocol(self):
+        """Muestra el protocolo recordado para el puerto seleccionado"""
+        protocol = self.port_protocols.get(self.port_combo.get(), "auto")
+        if protocol not in protocol_names():
+            protocol = "auto"
+        self.protocol_combo.set(protocol)
+
+    def _on_protocol_selected(self):
+        port = self.port_combo.get()
+        protocol = self.protocol_combo.get()
+        if port:
+            self.port_protocols[port] = protocol
+            self._save_port_protocols()
+        if self.is_running:
+            self.protocol_parser.set_protocol(protocol)
+        self.log_message(f"📐 Protocolo de {port or 'puerto'}: {protocol}")
+
+    def _on_protocol_detected(self, name):
+        """Autodetección completada (corre en el hilo principal, desde process_data)"""
+        self.log_message(f"📐 Protocolo detectado: {name}")
+
     def reset_ports(self):
         """Reinicia todos los puertos COM cerrando procesos que los usan"""
         try:
@@ -698,9 +1635,14 @@ class WeightMonitor:
             self.status_label.config(fg="#00ff00")
             self.status_text.config(text="CONECTADO", fg="#00ff00")
 
-            # Iniciar thread de lectura
-            self.read_thread = threading.Thread(target=self.read_serial, daemon=True)
-            self.read_thread.start()
+            self.protocol_parser.set_protocol(self.protocol_combo.get())
+
+            if self.record_raw.get():
+                self._start_raw_recording()
+
+            # Lectura en el hilo serial dedicado del orquestador
+            self.read_future = self.orchestrator.spawn(self.orchestrator.run_serial(self.read_serial),
+                                                       name="serial-reader")
 
             self.log_message(f"✅ ¡CONECTADO EXITOSAMENTE a {port} @ {baud} baud!")
 
@@ -740,11 +1682,20 @@ class WeightMonitor:
 
     def disconnect(self):
         self.is_running = False
+        self._stop_raw_recording()
 
-        # Esperar a que el thread de lectura termine
-        if hasattr(self, 'read_thread') and self.read_thread and self.read_thread.is_alive():
-            self.log_message("⏳ Esperando cierre del thread de lectura...")
-            self.read_thread.join(timeout=2)
+        # Cortar el read() en curso en vez de esperar a que venza el timeout del puerto
+        if self.read_future and not self.read_future.done():
+            if self.serial_port:
+                try:
+                    self.serial_port.cancel_read()
+                except Exception:
+                    pass
+            try:
+                self.read_future.result(timeout=0.2)
+            except Exception:
+                pass
+        self.read_future = None
 
         # Cerrar puerto con múltiples intentos
         if self.serial_port:
@@ -763,48 +1714,517 @@ class WeightMonitor:
 
             # Liberar la referencia
             self.serial_port = None
-            time.sleep(0.3)
 
         self.btn_connect.config(text="Conectar", bg="#0d7377")
         self.status_label.config(fg="#ff4444")
         self.status_text.config(text="DESCONECTADO", fg="#888888")
         self.log_message("═══ DESCONECTADO ═══")
 
+        # Un visor que reprodujo una captura vuelve a su modo solo lectura
+        if self.replaying:
+            self.replaying = False
+            if self.viewer:
+                self._set_serial_controls_state("disabled")
+                self.status_text.config(text="VISOR", fg="#4fc3f7")
+
     def read_serial(self):
-        while self.is_running:
+        self.line_reader = SerialLineReader(self.serial_port, on_line=self._on_serial_line,
+                                            on_error=lambda e: self.log_message(f"❌ Error de lectura: {str(e)}"),
+                                            tracer=self.reading_tracer, recorder=self.raw_recorder,
+                                            mode=SERIAL_READ_MODE)
+        self.line_reader.run(lambda: self.is_running)
+        # Una reproducción terminó sola: volver al estado desconectado
+        if self.replaying and self.is_running:
+            self.root.after(0, self._on_replay_finished)
+
+    def _on_record_toggle(self):
+        """Activa o detiene la grabación cruda en caliente si hay un puerto real conectado"""
+        if self.record_raw.get():
+            if self.is_running and not self.replaying:
+                self._start_raw_recording()
+        else:
+            self._stop_raw_recording()
+
+    def _start_raw_recording(self):
+        filename = f"serial_capture_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pscap"
+        try:
+            self.raw_recorder = SerialRecorder(filename)
+        except OSError as e:
+            self.log_message(f"❌ No se pudo crear la captura: {str(e)}")
+            self.record_raw.set(False)
+            return
+        if self.line_reader:
+            self.line_reader.recorder = self.raw_recorder
+        self.log_message(f"⏺ Grabando flujo serial crudo en {filename}")
+
+    def _stop_raw_recording(self):
+        recorder, self.raw_recorder = self.raw_recorder, None
+        if self.line_reader:
+            self.line_reader.recorder = None
+        if recorder:
+            recorder.close()
+            self.log_message(f"⏹ Captura guardada: {recorder.path} ({recorder.bytes_recorded} bytes)")
+
+    def start_replay(self):
+        """Reproduce una captura .pscap a través del lector y parser normales"""
+        if self.is_running:
+            messagebox.showwarning("Conectado", "Desconecte el puerto antes de reproducir una captura")
+            return
+        path = filedialog.askopenfilename(title="Captura serial",
+                                          filetypes=[("Captura serial", "*.pscap"), ("Todos", "*.*")])
+        if not path:
+            return
+        speed_text = self.replay_speed_combo.get()
+        speed = 0 if speed_text == "máx" else float(speed_text.rstrip("x"))
+        try:
+            self.serial_port = ReplaySource(path, speed=speed)
+        except (OSError, ValueError) as e:
+            self.log_message(f"❌ No se pudo abrir la captura: {str(e)}")
+            messagebox.showerror("Error", f"No se pudo abrir la captura:\n{str(e)}")
+            return
+
+        self.protocol_parser.set_protocol(self.protocol_combo.get())
+        self.replaying = True
+        self.is_running = True
+        self.btn_connect.config(text="Detener", bg="#d32f2f", state="normal")
+        self.status_label.config(fg="#4fc3f7")
+        self.status_text.config(text=f"REPRODUCIENDO {speed_text}", fg="#4fc3f7")
+        self.read_future = self.orchestrator.spawn(self.orchestrator.run_serial(self.read_serial),
+                                                   name="serial-reader")
+        self.log_message(f"▶ Reproduciendo {os.path.basename(path)} a {speed_text}")
+
+    def _on_replay_finished(self):
+        self.log_message("⏹ Fin de la captura")
+        self.disconnect()
+
+    def _on_serial_line(self, line, trace):
+        """Llamado desde el hilo lector: pasar la línea al hilo principal"""
+        M_UI_QUEUE.inc()
+        self.root.after(0, self.process_data, line, trace)
+
+    def process_data(self, data, trace=None):
+        M_UI_QUEUE.dec()
+        # La línea cruda va al historial como lectura (con su peso), no como mensaje del log
+        self.log_message(f"📊 Datos: {data}", persist=False)
+        parsed = self.protocol_parser.parse(data)
+        if parsed:
+            status, weight_type, weight_value, unit, protocol = parsed
+            StageTracer.mark(trace)
+            self.root.after(0, self.update_display, weight_value, status, weight_type, trace, unit)
+
+            reading = {
+                "raw": data,
+                "weight": weight_value,
+                "unit": unit,
+                "status": status,
+                "type": weight_type,
+                "protocol": protocol,
+                "ts": time.time(),
+            }
+
+            scale = self.serial_port.port if self.serial_port else "-"
+            detector = self.anomaly_detectors.get(scale)
+            if detector is None:
+                detector = self.anomaly_detectors[scale] = AnomalyDetector()
+            # Los umbrales del detector están en kg
+            anomalies = detector.feed(to_kg(weight_value, unit), status, reading["ts"], weight_type)
+            # Marcas de esta lectura; spike y tare se confirman con esta y marcan la anterior
+            flags = ",".join(a.kind for a in anomalies if a.ts == reading["ts"]) or None
+            if self.history_store and not self.replaying:
+                self.history_store.add_reading(reading["ts"], weight_value, status, unit, scale, data, flags)
+                for anomaly in anomalies:
+                    if anomaly.ts != reading["ts"]:
+                        self.history_store.tag_reading(scale, anomaly.ts, anomaly.kind)
+            for anomaly in anomalies:
+                if anomaly.new:
+                    self._log_anomaly(anomaly, scale)
+
+            # Solo la instancia principal arma pesajes (una reproducción no genera pesajes reales)
+            if not self.replaying and self.weighing_engine.feed(weight_value, status, reading["ts"], unit):
+                # Nuevo peso a capturar: guardar referencia al frame de ese momento (sin copiar)
+                self._weighing_frame = self._snapshot_image
+
+            # Reenviar la lectura a las instancias visoras
+            if self.broadcaster:
+                self.broadcaster.publish(reading)
+
+            # "settled": el peso se estabiliza en un valor nuevo
+            last = self._last_published
+            settled = status == "ST" and (last is None or last["status"] != "ST" or last["weight"] != weight_value)
+            self._last_published = reading
+
+            # Publicar en el API local
+            if self.api_server:
+                self.api_server.publish(dict(reading, event="settled" if settled else "reading"))
+
+            # Pesos estables hacia el servidor central: primero al disco, el envío es asíncrono
+            if settled and self.outbox_sender and not self.replaying:
+                self._enqueue_upstream(dict(reading, event="settled", scale=scale, station=socket.gethostname()))
+
+    def _log_anomaly(self, anomaly, scale):
+        text = {"spike": "pico de ruido", "tare": "cambio de tara sin movimiento",
+                "drift": "deriva con peso estable", "oscillation": "oscilación"}[anomaly.kind]
+        when = datetime.fromtimestamp(anomaly.ts).strftime("%H:%M:%S")
+        self.log_message(f"⚠ Anomalía en {scale}: {text} ({anomaly.weight:g} kg a las {when})")
+
+    def _on_weighing_capture(self, weight, ts, unit):
+        """Peso estable de un vehículo que acaba de bajar: registrar entrada o salida fuera del hilo de Tk"""
+        if not self.weighing_store:
+            return
+        plate = self.plate_entry.get()
+        scale = self.serial_port.port if self.serial_port else "-"
+        frame, self._weighing_frame = self._weighing_frame, None
+        self.plate_entry.delete(0, tk.END)
+        future = self.orchestrator.spawn(
+            self.orchestrator.run_blocking(self._record_weighing, weight, ts, scale, plate, unit, frame),
+            name="weighing")
+        future.add_done_callback(lambda f: self.root.after(0, self._on_weighing_recorded, f))
+
+    def _record_weighing(self, weight, ts, scale, plate, unit, frame):
+        """Guarda la foto del momento de la captura y registra el pesaje (corre en el ejecutor de E/S)"""
+        snapshot = None
+        if frame is not None:
+            try:
+                os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+                name = f"{datetime.fromtimestamp(ts):%Y%m%d_%H%M%S}_{os.path.basename(scale)}.jpg"
+                snapshot = os.path.join(SNAPSHOT_DIR, name)
+                frame.convert("RGB").save(snapshot, "JPEG", quality=80)
+            except OSError as e:
+                self.log_message(f"⚠ No se pudo guardar la foto del pesaje: {str(e)[:50]}")
+                snapshot = None
+        return self.weighing_store.record_capture(weight, ts, scale, plate, unit, snapshot)
+
+    def _on_weighing_recorded(self, future):
+        try:
+            weighing = future.result()
+        except Exception as e:
+            self.log_message(f"❌ Error al registrar pesaje: {str(e)[:50]}")
+            return
+        who = weighing.plate or "sin placa"
+        if weighing.status == "open":
+            text = f"#{weighing.id} {who}: entrada {weighing.entry_weight:g} {weighing.unit}"
+            self.log_message(f"⚖ Pesaje {text}")
+        else:
+            text = (f"#{weighing.id} {who}: bruto {weighing.gross:g} / tara {weighing.tare:g} / "
+                    f"neto {weighing.net:g} {weighing.unit}")
+            self.log_message(f"✅ Pesaje cerrado {text}")
+            self._refresh_weighing_totals()
+        self.weighing_label.config(text=text)
+
+    def _refresh_weighing_totals(self):
+        if not self.weighing_store:
+            return
+        future = self.orchestrator.spawn(self.orchestrator.run_blocking(self.weighing_store.day_summary),
+                                         name="weighing-totals")
+
+        def show(f):
+            if f.exception() is None:
+                count, net = f.result()
+                self.root.after(0, lambda: self.weighing_totals_label.config(
+                    text=f"Hoy: {count} pesajes, neto {net:g} kg"))
+        future.add_done_callback(show)
+
+    def show_weighing_report(self):
+        if not self.weighing_store:
+            messagebox.showwarning("Pesajes", "La base de pesajes no está disponible")
+            return
+        future = self.orchestrator.spawn(self.orchestrator.run_blocking(self.weighing_store.report),
+                                         name="weighing-report")
+        future.add_done_callback(lambda f: self.root.after(0, self._show_report_result, f))
+
+    def _show_report_result(self, future):
+        try:
+            report = future.result()
+        except Exception as e:
+            self.log_message(f"❌ Error al generar el reporte: {str(e)[:50]}")
+            return
+        self.log_message("\n" + report)
+        messagebox.showinfo("Reporte del día", report)
+
+    def open_export_dialog(self):
+        """Exporta pesajes por rango de fechas y balanza en segundo plano, con barra de progreso"""
+        if not self.weighing_store:
+            messagebox.showwarning("Pesajes", "La base de pesajes no está disponible")
+            return
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Exportar pesajes")
+        dialog.configure(bg="#2d2d2d")
+        dialog.transient(self.root)
+
+        today = datetime.now().strftime("%Y-%m-%d")
+        fields = {}
+        for row, (label, default) in enumerate((("Desde (AAAA-MM-DD):", today), ("Hasta (AAAA-MM-DD):", today))):
+            tk.Label(dialog, text=label, bg="#2d2d2d", fg="white").grid(row=row, column=0, padx=5, pady=3, sticky=tk.W)
+            entry = tk.Entry(dialog, width=12)
+            entry.insert(0, default)
+            entry.grid(row=row, column=1, padx=5, pady=3, sticky=tk.W)
+            fields[row] = entry
+        tk.Label(dialog, text="Balanza:", bg="#2d2d2d", fg="white").grid(row=2, column=0, padx=5, pady=3, sticky=tk.W)
+        scale_combo = ttk.Combobox(dialog, values=["todas"], width=10, state="readonly")
+        scale_combo.set("todas")
+        scale_combo.grid(row=2, column=1, padx=5, pady=3, sticky=tk.W)
+
+        def show_scales(future):
+            if future.exception() is None and dialog.winfo_exists():
+                scale_combo.config(values=["todas"] + future.result())
+        # La lista de balanzas sale de SQLite: se carga fuera del hilo de Tk
+        self.export_executor.submit(self.weighing_store.scales).add_done_callback(
+            lambda f: self.root.after(0, show_scales, f))
+        tk.Label(dialog, text="Formato:", bg="#2d2d2d", fg="white").grid(row=3, column=0, padx=5, pady=3, sticky=tk.W)
+        formats = ["csv", "parquet"] if parquet_available() else ["csv"]
+        format_combo = ttk.Combobox(dialog, values=formats, width=10, state="readonly")
+        format_combo.set("csv")
+        format_combo.grid(row=3, column=1, padx=5, pady=3, sticky=tk.W)
+
+        progress = ttk.Progressbar(dialog, length=260, mode="determinate")
+        progress.grid(row=4, column=0, columnspan=2, padx=5, pady=(8, 2))
+        status = tk.Label(dialog, text="", bg="#2d2d2d", fg="#888888", font=("Consolas", 9))
+        status.grid(row=5, column=0, columnspan=2, padx=5)
+        cancel = threading.Event()
+
+        def on_progress(done, total):
+            # Llamado desde el ejecutor: la barra se actualiza en el hilo de Tk
+            def update():
+                if dialog.winfo_exists():
+                    progress.config(maximum=max(total, 1), value=done)
+                    status.config(text=f"{done} / {total} pesajes")
+            self.root.after(0, update)
+
+        def finished(future):
+            try:
+                rows, path = future.result()
+            except ExportCancelled as e:
+                self.log_message(f"⏹ {e}")
+            except Exception as e:
+                self.log_message(f"❌ Error al exportar: {str(e)[:80]}")
+                messagebox.showerror("Exportar", f"Error al exportar:\n{str(e)}")
+            else:
+                self.log_message(f"📤 {rows} pesajes exportados a {path}")
+                messagebox.showinfo("Exportar", f"{rows} pesajes exportados a:\n{path}")
+            if dialog.winfo_exists():
+                dialog.destroy()
+
+        def start():
+            try:
+                start_ts = datetime.strptime(fields[0].get().strip(), "%Y-%m-%d").timestamp()
+                end_ts = datetime.strptime(fields[1].get().strip(), "%Y-%m-%d").timestamp() + 86400
+            except ValueError:
+                messagebox.showwarning("Exportar", "Fechas inválidas (formato AAAA-MM-DD)", parent=dialog)
+                return
+            fmt = format_combo.get()
+            path = filedialog.asksaveasfilename(parent=dialog, defaultextension=f".{fmt}",
+                                                initialfile=f"pesajes_{fields[0].get()}_{fields[1].get()}.{fmt}",
+                                                filetypes=[(fmt.upper(), f"*.{fmt}")])
+            if not path:
+                return
+            scale = None if scale_combo.get() == "todas" else scale_combo.get()
+            export_button.config(state="disabled")
+
+            def run():
+                rows = export_weighings(self.weighing_store.path, path, fmt, start_ts, end_ts, scale,
+                                        progress=on_progress, cancel=cancel)
+                return rows, path
+            future = self.export_executor.submit(run)
+            future.add_done_callback(lambda f: self.root.after(0, finished, f))
+
+        export_button = tk.Button(dialog, text="Exportar", command=start, bg="#0d7377", fg="white")
+        export_button.grid(row=6, column=0, padx=5, pady=8)
+        tk.Button(dialog, text="Cancelar", bg="#3d3d3d", fg="white",
+                  command=lambda: cancel.set() if export_button["state"] == "disabled" else dialog.destroy()
+                  ).grid(row=6, column=1, padx=5, pady=8)
+
+    async def _history_flush_loop(self):
+        """Escribe al historial por lotes; el hilo de Tk solo encola"""
+        while True:
+            await asyncio.sleep(HISTORY_FLUSH_S)
             try:
-                if self.serial_port and self.serial_port.is_open:
-                    line = self.serial_port.readline().decode('utf-8', errors='ignore').strip()
-                    if line:
-                        self.root.after(0, self.process_data, line)
+                await asyncio.wrap_future(self.history_store.submit(self.history_store.flush))
+            except sqlite3.Error as e:
+                print(f"Error al escribir el historial: {e}")
+
+    def open_history_dialog(self):
+        """Búsqueda en el historial por rango horario y texto, paginada y fuera del hilo de Tk"""
+        if not self.history_store:
+            messagebox.showwarning("Historial", "El historial no está disponible")
+            return
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Historial de lecturas y log")
+        dialog.configure(bg="#2d2d2d")
+        dialog.geometry("760x520")
+        dialog.transient(self.root)
+
+        form = tk.Frame(dialog, bg="#2d2d2d")
+        form.pack(fill=tk.X, padx=5, pady=5)
+        now = datetime.now()
+        fields = {}
+        for col, (label, default) in enumerate((("Desde:", now.strftime("%Y-%m-%d 00:00")),
+                                                ("Hasta:", now.strftime("%Y-%m-%d %H:%M")))):
+            tk.Label(form, text=label, bg="#2d2d2d", fg="white").grid(row=0, column=2 * col, padx=5, sticky=tk.W)
+            entry = tk.Entry(form, width=17)
+            entry.insert(0, default)
+            entry.grid(row=0, column=2 * col + 1, padx=5, pady=3, sticky=tk.W)
+            fields[label] = entry
+        kind_combo = ttk.Combobox(form, values=["Log", "Lecturas", "Anomalías"], width=9, state="readonly")
+        kind_combo.set("Log")
+        kind_combo.grid(row=0, column=4, padx=5)
+        tk.Label(form, text="Texto:", bg="#2d2d2d", fg="white").grid(row=1, column=0, padx=5, sticky=tk.W)
+        text_entry = tk.Entry(form, width=40)
+        text_entry.grid(row=1, column=1, columnspan=3, padx=5, pady=3, sticky=tk.W)
+
+        tree = ttk.Treeview(dialog, columns=("time", "detail"), show="headings")
+        tree.heading("time", text="Hora")
+        tree.heading("detail", text="Detalle")
+        tree.column("time", width=150, stretch=False)
+        tree.column("detail", width=580)
+        tree.pack(fill=tk.BOTH, expand=True, padx=5)
+
+        nav = tk.Frame(dialog, bg="#2d2d2d")
+        nav.pack(fill=tk.X, padx=5, pady=5)
+        status = tk.Label(nav, text="", bg="#2d2d2d", fg="#888888", font=("Consolas", 9))
+        status.pack(side=tk.LEFT, padx=5)
+
+        # Cursores por página: cursors[n] es el "after" con el que se pidió la página n
+        state = {"query": None, "cursors": [None], "page": 0, "next": None}
+
+        def parse_range():
+            try:
+                start = datetime.strptime(fields["Desde:"].get().strip(), "%Y-%m-%d %H:%M").timestamp()
+                end = datetime.strptime(fields["Hasta:"].get().strip(), "%Y-%m-%d %H:%M").timestamp() + 60
+            except ValueError:
+                messagebox.showwarning("Historial", "Horas inválidas (formato AAAA-MM-DD HH:MM)", parent=dialog)
+                return None
+            return start, end
+
+        def run_query(func, *args):
+            status.config(text="Buscando...")
+            future = self.history_store.submit(func, *args)
+            future.add_done_callback(lambda f: self.root.after(0, show, f))
+
+        def show(future):
+            if not dialog.winfo_exists():
+                return
+            try:
+                rows, state["next"] = future.result()
             except Exception as e:
-                self.log_message(f"❌ Error de lectura: {str(e)}")
-                break
-
-    def process_data(self, data):
-        self.log_message(f"📊 Datos: {data}")
-        match = re.match(r'([A-Z]{2}),([A-Z]{2}),([+\-])\s*([\d.]+)\s*kg', data)
-        if match:
-            status, weight_type, sign, weight = match.groups()
-            weight_value = float(weight)
-            self.root.after(0, self.update_display, weight_value, status, weight_type)
-
-    def update_display(self, weight, status, weight_type):
+                status.config(text=f"Error: {str(e)[:60]}")
+                return
+            tree.delete(*tree.get_children())
+            for row in rows:
+                when = datetime.fromtimestamp(row.ts).strftime("%Y-%m-%d %H:%M:%S")
+                if hasattr(row, "message"):
+                    detail = row.message
+                else:
+                    detail = f"{row.weight:g} {row.unit}  {row.status}  {row.scale}  {row.raw or ''}"
+                    if row.flags:
+                        detail = f"⚠ {row.flags}  {detail}"
+                tree.insert("", tk.END, values=(when, detail))
+            status.config(text=f"Página {state['page'] + 1}: {len(rows)} resultados"
+                               + (" (hay más)" if state["next"] is not None else ""))
+            prev_button.config(state="normal" if state["page"] > 0 else "disabled")
+            next_button.config(state="normal" if state["next"] is not None else "disabled")
+
+        def fetch_page():
+            kind, start, end, text = state["query"]
+            after = state["cursors"][state["page"]]
+            if kind == "Log":
+                run_query(self.history_store.search_log, start, end, text, after)
+            else:
+                run_query(self.history_store.readings, start, end, text or None, after, HISTORY_PAGE_SIZE,
+                          kind == "Anomalías")
+
+        def search():
+            bounds = parse_range()
+            if bounds is None:
+                return
+            # En lecturas y anomalías, el texto filtra por balanza (ej. COM3)
+            state.update(query=(kind_combo.get(), *bounds, text_entry.get().strip()), cursors=[None], page=0)
+            fetch_page()
+
+        def reading_at():
+            try:
+                ts = datetime.strptime(fields["Desde:"].get().strip(), "%Y-%m-%d %H:%M").timestamp()
+            except ValueError:
+                messagebox.showwarning("Historial", "Hora inválida (formato AAAA-MM-DD HH:MM)", parent=dialog)
+                return
+            scale = text_entry.get().strip() if kind_combo.get() == "Lecturas" else None
+
+            def lookup():
+                reading = self.history_store.reading_at(ts, scale or None)
+                return ([reading] if reading else []), None
+            state["page"] = 0
+            run_query(lookup)
+
+        def go(delta):
+            if delta > 0:
+                state["cursors"][state["page"] + 1:] = [state["next"]]
+            state["page"] += delta
+            fetch_page()
+
+        tk.Button(form, text="Buscar", command=search, bg="#0d7377", fg="white").grid(row=1, column=4, padx=5)
+        tk.Button(form, text="Peso en 'Desde'", command=reading_at,
+                  bg="#3d3d3d", fg="white").grid(row=0, column=5, padx=5)
+        next_button = tk.Button(nav, text="Siguiente ▶", command=lambda: go(1), bg="#3d3d3d", fg="white",
+                                state="disabled")
+        next_button.pack(side=tk.RIGHT, padx=5)
+        prev_button = tk.Button(nav, text="◀ Anterior", command=lambda: go(-1), bg="#3d3d3d", fg="white",
+                                state="disabled")
+        prev_button.pack(side=tk.RIGHT, padx=5)
+        text_entry.bind("<Return>", lambda e: search())
+
+    def _route_weighings_today(self):
+        totals = [t._asdict() for t in self.weighing_store.day_totals()]
+        return "application/json", json.dumps(totals, separators=(",", ":")).encode("utf-8")
+
+    def update_display(self, weight, status, weight_type, trace=None, unit="kg"):
         self.current_weight = weight
         self.status = status
+        # La banda de cero está en kg: una balanza en t o lb se compara ya convertida
+        weight_kg = to_kg(weight, unit)
+        # Vehículo moviéndose sobre la balanza: más frames para las cámaras del carril
+        self.capture_scheduler.set_boost(status != "ST" and abs(weight_kg) > WEIGHING_ZERO_BAND)
+        # Cualquier lectura fuera de cero sale del reposo en esta misma lectura
+        self.idle_governor.feed(weight_kg, status, time.time())
+        self.weight_history.append(time.time(), weight)
         self.weight_display.config(text=str(weight))
+        self.unit_label.config(text=unit)
         if status == "ST":
             self.stability_label.config(text="Estado: ESTABLE", fg="#00ff00")
             self.weight_display.config(fg="#00ff00")
+        elif status == "OL":
+            self.stability_label.config(text="Estado: SOBRECARGA", fg="#ff4444")
+            self.weight_display.config(fg="#ff4444")
         else:
             self.stability_label.config(text="Estado: INESTABLE", fg="#ffaa00")
             self.weight_display.config(fg="#ffaa00")
-        type_text = "BRUTO" if weight_type == "GS" else weight_type
+        type_text = {"GS": "BRUTO", "NT": "NETO"}.get(weight_type, weight_type)
         self.type_label.config(text=f"Tipo: {type_text}")
 
-    def log_message(self, message):
+        if trace is not None:
+            StageTracer.mark(trace)
+            # Tk redibuja en tareas idle: este after_idle corre después de que el peso llegó a pantalla
+            self.root.after_idle(self._finish_reading_trace, trace)
+
+    def _finish_reading_trace(self, trace):
+        StageTracer.mark(trace)
+        self.reading_tracer.finish(trace)
+
+    def log_message(self, message, persist=True):
+        """Agrega un mensaje al log. Seguro desde cualquier hilo (loop, ejecutores, enviador)"""
+        if persist and self.history_store:
+            self.history_store.add_log(time.time(), message)
         timestamp = datetime.now().strftime("%H:%M:%S")
         log_entry = f"[{timestamp}] {message}\n"
+        if threading.current_thread() is not threading.main_thread():
+            # Tkinter no es seguro entre hilos: el widget se toca solo desde el hilo de Tk
+            try:
+                self.root.after(0, self._append_log, log_entry, timestamp)
+            except (RuntimeError, tk.TclError):
+                # Ventana ya destruida durante el cierre
+                print(log_entry, end='')
+            return
+        self._append_log(log_entry, timestamp)
+
+    def _append_log(self, log_entry, timestamp):
         try:
             if hasattr(self, 'log_text') and self.log_text:
                 self.log_text.insert(tk.END, log_entry)
@@ -820,27 +2240,70 @@ class WeightMonitor:
         self.log_message("🗑 Log limpiado")
 
     def save_log(self):
-        try:
-            filename = f"weight_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        filename = f"weight_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        # Leer el widget es del hilo de Tk; la escritura al disco va al ejecutor de E/S
+        text = self.log_text.get(1.0, tk.END)
+
+        def write():
             with open(filename, 'w', encoding='utf-8') as f:
-                f.write(self.log_text.get(1.0, tk.END))
-            self.log_message(f"💾 Log guardado en {filename}")
-            messagebox.showinfo("Guardado", f"Log guardado exitosamente en:\n{filename}")
-        except Exception as e:
-            self.log_message(f"❌ Error al guardar: {str(e)}")
-            messagebox.showerror("Error", f"Error al guardar log:\n{str(e)}")
+                f.write(text)
+
+        def finished(future):
+            try:
+                future.result()
+                self.log_message(f"💾 Log guardado en {filename}")
+                messagebox.showinfo("Guardado", f"Log guardado exitosamente en:\n{filename}")
+            except Exception as e:
+                self.log_message(f"❌ Error al guardar: {str(e)}")
+                messagebox.showerror("Error", f"Error al guardar log:\n{str(e)}")
+
+        future = self.orchestrator.spawn(self.orchestrator.run_blocking(write), name="save-log")
+        future.add_done_callback(lambda f: self.root.after(0, finished, f))
 
     def cleanup_all_connections(self):
         """Limpia todas las conexiones al cerrar la aplicación"""
         self.log_message("🔄 Cerrando aplicación y liberando recursos...")
 
-        # Detener hilos de capturas
+        # Detener captura y keep-alive
         self.browser_running = False
 
+        # Guardar el perfil si estaba activo
+        if self.profiling:
+            self.toggle_profiling()
+
         # Desconectar puerto serial
         if self.is_running:
             self.disconnect()
 
+        # Liberar el candado de instancia / desconectar del dueño
+        if self.broadcaster:
+            self.broadcaster.stop()
+            self.broadcaster = None
+        if self.viewer:
+            self.viewer.close()
+            self.viewer = None
+        if self.api_server:
+            self.api_server.stop()
+            self.api_server = None
+
+        # Cancelar las tareas del loop y liberar los ejecutores
+        elapsed = self.orchestrator.stop()
+        if self.frame_process:
+            self.frame_process.stop()
+            self.frame_process = None
+        self.log_message(f"✓ Tareas detenidas en {elapsed * 1000:.0f} ms")
+
+        self.export_executor.shutdown(wait=False, cancel_futures=True)
+        if self.weighing_store:
+            self.weighing_store.close()
+        if self.history_store:
+            # Escribe lo que quedó pendiente desde el último flush
+            self.history_store.close()
+        if self.outbox_sender:
+            # Lo no entregado queda en outbox.db y se envía al próximo inicio
+            self.outbox_sender.close()
+            self.outbox.close()
+
         # Cerrar navegador
         if self.driver:
             try:
@@ -849,9 +2312,6 @@ class WeightMonitor:
             except:
                 pass
 
-        # Pequeña pausa para asegurar que todo se cierre
-        time.sleep(0.5)
-
     def on_closing(self):
         """Maneja el cierre de la aplicación"""
         if messagebox.askokcancel("Salir", "¿Desea cerrar la aplicación?"):
@@ -859,6 +2319,8 @@ class WeightMonitor:
             self.root.destroy()
 
 if __name__ == "__main__":
+    # El proceso de captura se lanza con spawn (necesario en ejecutables congelados de Windows)
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = WeightMonitor(root)
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
@@ -0,0 +1,101 @@
+"""Núcleo asyncio único de la aplicación.
+
+Un solo loop en un hilo propio agenda la captura de pantalla, el keep-alive, el lector serial
+y los servidores locales (API y visores). Las llamadas bloqueantes pasan por ejecutores
+acotados: uno para WebDriver/archivos y otro de un solo hilo para el puerto serial (en
+Windows el COM no se puede esperar con add_reader). Tk sigue en el hilo principal y recibe
+resultados con root.after, igual que antes.
+"""
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Hilos para llamadas bloqueantes de WebDriver (captura + keep-alive pueden coincidir)
+IO_WORKERS = 2
+
+
+class Orchestrator:
+    """Dueño del loop asyncio, de sus tareas y de los ejecutores acotados"""
+
+    def __init__(self, io_workers=IO_WORKERS):
+        self.loop = asyncio.new_event_loop()
+        self.io_executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="driver-io")
+        self.serial_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="serial-reader")
+        self._thread = threading.Thread(target=self._run, name="orchestrator", daemon=True)
+        self._tasks = set()
+        self._ready = threading.Event()
+
+    @property
+    def running(self):
+        return self.loop.is_running()
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait(timeout=5)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.set_default_executor(self.io_executor)
+        self.loop.call_soon(self._ready.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    # ---- tareas ----
+
+    def spawn(self, coro, name=None):
+        """Agenda una corrutina desde cualquier hilo. Devuelve un concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(self._tracked(coro, name), self.loop)
+
+    async def _tracked(self, coro, name):
+        task = asyncio.current_task()
+        if name:
+            task.set_name(name)
+        self._tasks.add(task)
+        try:
+            return await coro
+        finally:
+            self._tasks.discard(task)
+
+    def call_soon(self, func, *args):
+        """Ejecuta func(*args) en el hilo del loop (seguro desde cualquier hilo)"""
+        try:
+            self.loop.call_soon_threadsafe(func, *args)
+        except RuntimeError:
+            # Loop ya cerrado durante el apagado
+            pass
+
+    async def run_blocking(self, func, *args, **kwargs):
+        """Llamada bloqueante (WebDriver, disco) en el ejecutor acotado de E/S"""
+        return await self.loop.run_in_executor(self.io_executor, functools.partial(func, *args, **kwargs))
+
+    async def run_serial(self, func, *args):
+        """Bucle de lectura serial en su hilo dedicado"""
+        return await self.loop.run_in_executor(self.serial_executor, functools.partial(func, *args))
+
+    # ---- apagado ----
+
+    async def _cancel_all(self, timeout):
+        tasks = [t for t in self._tasks if not t.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+
+    def stop(self, timeout=0.5):
+        """Cancela todas las tareas y detiene el loop. Devuelve la duración en segundos"""
+        start = time.perf_counter()
+        if self.loop.is_running():
+            try:
+                asyncio.run_coroutine_threadsafe(self._cancel_all(timeout), self.loop).result(timeout + 0.1)
+            except Exception:
+                pass
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=timeout)
+        # Las llamadas bloqueantes en curso terminan solas; no se espera por ellas
+        self.io_executor.shutdown(wait=False, cancel_futures=True)
+        self.serial_executor.shutdown(wait=False, cancel_futures=True)
+        return time.perf_counter() - start
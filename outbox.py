@@ -0,0 +1,310 @@
+"""Bandeja de salida durable: pesos estables hacia el servidor central, aun con cortes de red.
+
+Cada evento se guarda primero en SQLite (outbox.db) y recién se borra cuando el servidor
+responde 2xx. Un enviador en el loop del orquestador toma lotes en orden, los manda por POST
+sobre conexiones HTTP keep-alive reutilizadas y, si el servidor no responde, espera con
+backoff exponencial (con jitter) antes de reintentar. Cada evento lleva un id único: el
+servidor descarta los repetidos, así un lote reenviado tras un corte no duplica pesos.
+
+Protocolo: POST {"events": [{"id": ..., ...}, ...]} con Content-Type application/json.
+2xx = aceptado; 408/429/5xx o error de red = reintentar; otro 4xx = rechazado (el lote pasa a
+outbox_rejected para revisarlo, no bloquea a los siguientes).
+"""
+import asyncio
+import functools
+import http.client
+import json
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from metrics import REGISTRY
+
+M_OUTBOX_SENT = REGISTRY.counter("outbox_sent_total", "Eventos entregados al servidor central")
+M_OUTBOX_FAILURES = REGISTRY.counter("outbox_send_failures_total", "Lotes no entregados (se reintentan)")
+M_OUTBOX_REJECTED = REGISTRY.counter("outbox_rejected_total", "Eventos rechazados por el servidor (4xx)")
+M_OUTBOX_POST = REGISTRY.histogram("outbox_post_seconds", "Duración de cada POST de un lote")
+
+# URL del servidor central; sin ella no se crea la bandeja de salida
+UPSTREAM_ENV = "PESAJE_UPSTREAM_URL"
+
+OUTBOX_DB = "outbox.db"
+
+# Eventos por POST y lotes en vuelo a la vez (uno por conexión del pool)
+OUTBOX_BATCH = 200
+OUTBOX_CONCURRENCY = 2
+
+# Sin eventos nuevos, cada cuánto se revisa igual la bandeja
+OUTBOX_POLL_S = 5.0
+
+# Backoff tras un fallo: base * 2^fallos seguidos, hasta el máximo (con jitter de 50%)
+OUTBOX_BACKOFF_BASE_S = 0.5
+OUTBOX_BACKOFF_MAX_S = 60.0
+
+OUTBOX_TIMEOUT_S = 10.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    event_id TEXT NOT NULL UNIQUE,
+    created REAL NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS outbox_rejected (
+    id INTEGER PRIMARY KEY,
+    event_id TEXT NOT NULL,
+    created REAL NOT NULL,
+    payload TEXT NOT NULL,
+    rejected REAL NOT NULL,
+    reason TEXT
+);
+"""
+
+
+def upstream_url():
+    return os.environ.get(UPSTREAM_ENV, "").strip() or None
+
+
+class Outbox:
+    """Cola FIFO persistente de eventos pendientes de entregar; segura desde varios hilos"""
+
+    def __init__(self, path=OUTBOX_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # FULL: un evento confirmado por append sobrevive a un corte de luz
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        # Profundidad en memoria: el gauge y el overlay la leen sin consultar la base
+        self.depth = self._conn.execute("SELECT count(*) FROM outbox").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def append(self, event):
+        """Guarda un evento (dict) y le asigna un id único. Devuelve el id"""
+        event = dict(event, id=event.get("id") or uuid.uuid4().hex)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO outbox (event_id, created, payload) VALUES (?, ?, ?)",
+                (event["id"], time.time(), json.dumps(event, separators=(",", ":"))))
+            self.depth += cursor.rowcount
+        return event["id"]
+
+    def peek(self, limit, exclude=()):
+        """Los limit eventos más viejos que no estén en exclude (ids de lotes en vuelo): [(id, payload)]"""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, payload FROM outbox ORDER BY id LIMIT ?",
+                                      (limit + len(exclude),)).fetchall()
+        return [row for row in rows if row[0] not in exclude][:limit]
+
+    def ack(self, ids):
+        with self._lock, self._conn:
+            deleted = self._conn.executemany("DELETE FROM outbox WHERE id = ?", ((i,) for i in ids)).rowcount
+            self.depth -= deleted
+
+    def retry(self, ids):
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE outbox SET attempts = attempts + 1 WHERE id = ?", ((i,) for i in ids))
+
+    def reject(self, ids, reason):
+        """Pasa los eventos a outbox_rejected: el servidor no los aceptará aunque se reintenten"""
+        with self._lock, self._conn:
+            now = time.time()
+            for i in ids:
+                self._conn.execute(
+                    "INSERT INTO outbox_rejected (event_id, created, payload, rejected, reason) "
+                    "SELECT event_id, created, payload, ?, ? FROM outbox WHERE id = ?", (now, reason, i))
+            deleted = self._conn.executemany("DELETE FROM outbox WHERE id = ?", ((i,) for i in ids)).rowcount
+            self.depth -= deleted
+
+
+class _HttpPool:
+    """Conexiones keep-alive reutilizables hacia un mismo servidor"""
+
+    def __init__(self, url, size, timeout=OUTBOX_TIMEOUT_S):
+        parts = urlsplit(url)
+        self._cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = parts.path or "/"
+        if parts.query:
+            self._path += "?" + parts.query
+        self._timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def post(self, body, headers):
+        """POST bloqueante. Devuelve (status, cuerpo); lanza OSError/HTTPException si no hubo respuesta"""
+        try:
+            conn, reused = self._idle.get_nowait(), True
+        except queue.Empty:
+            conn, reused = self._cls(self._host, self._port, timeout=self._timeout), False
+        try:
+            conn.request("POST", self._path, body, headers)
+            response = conn.getresponse()
+            data = response.read()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if not reused:
+                raise
+            # El servidor cerró la conexión ociosa (p. ej. se reinició): reintentar con una nueva
+            conn = self._cls(self._host, self._port, timeout=self._timeout)
+            try:
+                conn.request("POST", self._path, body, headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                raise
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            raise
+        if response.will_close:
+            conn.close()
+        else:
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+        return response.status, data
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class OutboxSender:
+    """Vacía la bandeja hacia url por lotes, en el loop del orquestador
+
+    Los POST usan un ejecutor propio: un servidor que no responde puede tener hilos esperando
+    hasta OUTBOX_TIMEOUT_S sin ocupar el ejecutor de E/S de la captura. La base (altas con
+    enqueue() y lotes) va por otro hilo único: ni un disco lento compite con la captura ni un
+    POST colgado demora el guardado de un evento.
+    """
+
+    def __init__(self, outbox, url, orchestrator, batch_size=OUTBOX_BATCH, concurrency=OUTBOX_CONCURRENCY,
+                 log=None):
+        self.outbox = outbox
+        self.url = url
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.log = log
+        self._orchestrator = orchestrator
+        self._pool = _HttpPool(url, concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="outbox")
+        self._disk = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox-disk")
+        self._inflight = set()
+        self._wake = asyncio.Event()
+        self._claim = asyncio.Lock()
+        self._failures = 0
+        self._resume_at = 0.0
+        self.future = None
+
+    @property
+    def failing(self):
+        return self._failures > 0
+
+    def start(self):
+        self.future = self._orchestrator.spawn(self._run(), name="outbox")
+
+    def notify(self):
+        """Hay eventos nuevos (seguro desde cualquier hilo)"""
+        self._orchestrator.call_soon(self._wake.set)
+
+    def enqueue(self, event):
+        """Guarda el evento en la bandeja (hilo de disco propio) y despierta al enviador
+
+        Seguro desde cualquier hilo. Devuelve el concurrent.futures.Future del guardado.
+        """
+        future = self._disk.submit(self.outbox.append, event)
+        future.add_done_callback(lambda f: f.exception() is None and self.notify())
+        return future
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        # Los eventos ya aceptados por enqueue() se terminan de guardar
+        self._disk.shutdown(wait=True)
+        self._pool.close()
+
+    async def _blocking(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(func, *args))
+
+    async def _db(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._disk, functools.partial(func, *args))
+
+    async def _run(self):
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    async def _worker(self):
+        while True:
+            delay = self._resume_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            async with self._claim:
+                self._wake.clear()
+                batch = await self._db(self.outbox.peek, self.batch_size, frozenset(self._inflight))
+                ids = [row[0] for row in batch]
+                self._inflight.update(ids)
+            if not batch:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), OUTBOX_POLL_S)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._send(ids, batch)
+            finally:
+                self._inflight.difference_update(ids)
+
+    async def _send(self, ids, batch):
+        body = ('{"events":[' + ",".join(row[1] for row in batch) + "]}").encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        started = time.perf_counter()
+        try:
+            status, data = await self._blocking(self._pool.post, body, headers)
+        except (OSError, http.client.HTTPException) as e:
+            await self._failed(ids, f"{type(e).__name__}: {e}")
+            return
+        M_OUTBOX_POST.time_since(started)
+        if 200 <= status < 300:
+            await self._db(self.outbox.ack, ids)
+            M_OUTBOX_SENT.inc(len(ids))
+            if self._failures:
+                self._failures = 0
+                if self.log:
+                    self.log(f"✓ Servidor central disponible de nuevo ({self.outbox.depth} pendientes)")
+        elif status in (408, 429) or status >= 500:
+            await self._failed(ids, f"HTTP {status}")
+        else:
+            reason = f"HTTP {status}: {data[:200].decode('utf-8', 'replace')}"
+            await self._db(self.outbox.reject, ids, reason)
+            M_OUTBOX_REJECTED.inc(len(ids))
+            if self.log:
+                self.log(f"❌ Servidor central rechazó {len(ids)} eventos ({reason[:60]})")
+
+    async def _failed(self, ids, reason):
+        M_OUTBOX_FAILURES.inc()
+        await self._db(self.outbox.retry, ids)
+        if not self._failures and self.log:
+            self.log(f"⚠ Servidor central no disponible ({reason[:60]}), reintentando con backoff")
+        self._failures += 1
+        delay = min(OUTBOX_BACKOFF_MAX_S, OUTBOX_BACKOFF_BASE_S * 2 ** (self._failures - 1))
+        # Jitter: varias estaciones que vuelven juntas no golpean al servidor al mismo tiempo
+        self._resume_at = time.monotonic() + delay * random.uniform(0.5, 1.0)
@@ -0,0 +1,263 @@
+"""Perfilado por muestreo de todos los hilos y latencia de callbacks del loop de Tk.
+
+El muestreador lee sys._current_frames() a intervalo fijo (100 Hz por defecto), así que
+también ve los hilos daemon. Las pilas se guardan en formato "folded" (una línea por pila:
+"hilo;func_a;func_b N"), compatible con flamegraph.pl, speedscope e inferno.
+"""
+import os
+import sys
+import threading
+import time
+import tkinter as tk
+from datetime import datetime
+
+# Variable de entorno que activa el perfilado al iniciar la aplicación
+PROFILE_ENV = "PESAJE_PROFILE"
+
+# Funciones que identifican una etapa del pipeline (la más cercana a la hoja gana). Los nombres
+# genéricos (parse, feed) van calificados con su módulo: "modulo.funcion"
+STAGE_FUNCTIONS = {
+    "get_screenshot_as_png": "captura",
+    "capture_frame": "captura",
+    "PhotoImage": "captura",
+    "readline": "serial",
+    "scale_reader._run_bulk": "serial",
+    "scale_reader._run_lines": "serial",
+    "scale_reader.feed": "serial",
+    "process_data": "parseo",
+    "scale_protocols.parse": "parseo",
+    "scale_protocols._parse_detecting": "parseo",
+    "update_display": "display",
+    "_update_canvas": "pintado",
+    "_paste_frame": "pintado",
+    "_draw_trend": "tendencia",
+    "execute_script": "keep-alive",
+    "execute_cdp_cmd": "keep-alive",
+    "_keepalive_once": "keep-alive",
+    "_capture_image": "captura",
+    "log_message": "log",
+}
+
+# Prefijo del nombre de hilo -> etapa por defecto cuando ninguna función de la pila es conocida
+# (los ejecutores del orquestador numeran sus hilos: "driver-io_0", "serial-reader_0", ...)
+THREAD_STAGES = {
+    "MainThread": "tk",
+    "orchestrator": "asyncio",
+    "serial-reader": "serial",
+    "driver-io": "webdriver",
+    "outbox": "upstream",
+    "export": "exportación",
+    "history": "historial",
+}
+
+
+def _thread_stage(thread_name):
+    for prefix, stage in THREAD_STAGES.items():
+        if thread_name.startswith(prefix):
+            return stage
+    return thread_name
+
+
+def _code_stage(code):
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return STAGE_FUNCTIONS.get(f"{module}.{code.co_name}") or STAGE_FUNCTIONS.get(code.co_name)
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Muestrea las pilas de todos los hilos en un hilo daemon propio"""
+
+    def __init__(self, interval=0.01, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = {}
+        self.stage_samples = {}
+        self.samples = 0
+        self._running = False
+        self._thread = None
+        self._labels = {}
+        self._stages = {}
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    def _label(self, code):
+        # Cache por objeto code: el texto de cada función se arma una sola vez
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = _frame_label(code)
+        return label
+
+    def _stage(self, code):
+        # Mismo cache por code: la etapa de cada función (o None) se resuelve una sola vez
+        try:
+            return self._stages[code]
+        except KeyError:
+            stage = self._stages[code] = _code_stage(code)
+            return stage
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while self._running:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                thread_name = names.get(thread_id, str(thread_id))
+                stage = None
+                labels = []
+                depth = 0
+                while frame is not None and depth < self.max_depth:
+                    code = frame.f_code
+                    if stage is None:
+                        stage = self._stage(code)
+                    labels.append(self._label(code))
+                    frame = frame.f_back
+                    depth += 1
+                labels.append(thread_name)
+                key = ";".join(reversed(labels))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+                stage = stage or _thread_stage(thread_name)
+                self.stage_samples[stage] = self.stage_samples.get(stage, 0) + 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def write_folded(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+    def stage_report(self):
+        total = sum(self.stage_samples.values()) or 1
+        lines = [f"Muestras: {self.samples} cada {self.interval * 1000:.0f} ms"]
+        for stage, count in sorted(self.stage_samples.items(), key=lambda kv: -kv[1]):
+            lines.append(f"  {stage:<14} {count:>8} ({100.0 * count / total:5.1f}%)")
+        return "\n".join(lines)
+
+
+class TkCallbackProfiler:
+    """Mide duración de cada callback de Tk y el retraso de los after() respecto a su hora prevista"""
+
+    def __init__(self):
+        self.stats = {}  # nombre -> [llamadas, total_s, máx_s, retraso_total_s, retraso_máx_s]
+        self._orig_call = None
+        self._orig_after = None
+
+    def _record(self, name, duration, lag=0.0):
+        entry = self.stats.get(name)
+        if entry is None:
+            entry = self.stats[name] = [0, 0.0, 0.0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += duration
+        if duration > entry[2]:
+            entry[2] = duration
+        entry[3] += lag
+        if lag > entry[4]:
+            entry[4] = lag
+
+    def install(self):
+        if self._orig_call is not None:
+            return
+        profiler = self
+        orig_call = self._orig_call = tk.CallWrapper.__call__
+        orig_after = self._orig_after = tk.Misc.after
+
+        def timed_call(wrapper, *args):
+            func = wrapper.func
+            name = getattr(func, "__qualname__", repr(func))
+            # Los after() ya se miden abajo con su retraso
+            if name.endswith("after.<locals>.callit"):
+                return orig_call(wrapper, *args)
+            t0 = time.perf_counter()
+            try:
+                return orig_call(wrapper, *args)
+            finally:
+                profiler._record(name, time.perf_counter() - t0)
+
+        def timed_after(widget, ms, func=None, *args):
+            if func is None:
+                return orig_after(widget, ms)
+            # after_idle() llega aquí con ms="idle"
+            due = time.perf_counter() + (ms / 1000.0 if isinstance(ms, (int, float)) else 0.0)
+            name = "after:" + getattr(func, "__qualname__", repr(func))
+
+            def timed(*a):
+                t0 = time.perf_counter()
+                try:
+                    return func(*a)
+                finally:
+                    profiler._record(name, time.perf_counter() - t0, max(0.0, t0 - due))
+            return orig_after(widget, ms, timed, *args)
+
+        tk.CallWrapper.__call__ = timed_call
+        tk.Misc.after = timed_after
+
+    def uninstall(self):
+        if self._orig_call is None:
+            return
+        tk.CallWrapper.__call__ = self._orig_call
+        tk.Misc.after = self._orig_after
+        self._orig_call = self._orig_after = None
+
+    def report(self):
+        lines = [f"{'callback':<60} {'llamadas':>9} {'total ms':>10} {'media ms':>9} {'máx ms':>8} "
+                 f"{'retraso medio':>14} {'retraso máx':>12}"]
+        for name, (count, total, worst, lag_total, lag_worst) in sorted(self.stats.items(), key=lambda kv: -kv[1][1]):
+            lines.append(f"{name[:60]:<60} {count:>9} {total * 1000:>10.1f} {total / count * 1000:>9.2f} "
+                         f"{worst * 1000:>8.1f} {lag_total / count * 1000:>14.2f} {lag_worst * 1000:>12.1f}")
+        return "\n".join(lines)
+
+
+class ProfilingSession:
+    """Agrupa ambos perfiladores y escribe los resultados al detenerse"""
+
+    def __init__(self, interval=0.01, output_dir="."):
+        self.sampler = SamplingProfiler(interval=interval)
+        self.tk_profiler = TkCallbackProfiler()
+        self.output_dir = output_dir
+        self.started = None
+
+    @property
+    def running(self):
+        return self.sampler.running
+
+    def start(self):
+        self.started = datetime.now()
+        self.tk_profiler.install()
+        self.sampler.start()
+
+    def stop(self):
+        """Detiene el perfilado y devuelve las rutas de (pilas folded, reporte)"""
+        self.sampler.stop()
+        self.tk_profiler.uninstall()
+        return self.write()
+
+    def write(self):
+        stamp = (self.started or datetime.now()).strftime("%Y%m%d_%H%M%S")
+        folded = os.path.join(self.output_dir, f"profile_{stamp}.folded")
+        report = os.path.join(self.output_dir, f"profile_{stamp}.txt")
+        self.sampler.write_folded(folded)
+        with open(report, "w", encoding="utf-8") as f:
+            f.write("== Tiempo por etapa (muestreo) ==\n")
+            f.write(self.sampler.stage_report() + "\n\n")
+            f.write("== Callbacks del loop de Tk ==\n")
+            f.write(self.tk_profiler.report() + "\n")
+        return folded, report
+
+
+def profiling_requested():
+    return os.environ.get(PROFILE_ENV, "").strip() not in ("", "0", "false", "no")
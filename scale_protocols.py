@@ -0,0 +1,196 @@
+"""Registro de protocolos de indicadores de balanza.
+
+Cada formato se declara una sola vez (ScaleProtocol) con una expresión regular de grupos
+con nombre; al registrarse se compila a un matcher. ProtocolParser elige el protocolo de
+un puerto (fijo o detectado con las primeras tramas) y cuenta tramas desconocidas y mal
+parseadas en lugar de ignorarlas en silencio.
+
+Grupos reconocidos en los patrones: status, type, sign, value, unit, checksum, payload.
+"""
+import re
+from collections import namedtuple
+
+from metrics import REGISTRY
+
+M_PARSE_FAILURES = REGISTRY.counter("parse_failures_total", "Líneas que no coinciden con el formato de la balanza")
+M_FRAMES_UNKNOWN = REGISTRY.counter("frames_unknown_total", "Tramas que no coinciden con ningún protocolo")
+
+# Lectura normalizada: status "ST"/"US"/"OL", weight_type "GS"/"NT"/..., peso con signo aplicado
+ParsedReading = namedtuple("ParsedReading", "status weight_type weight unit protocol")
+
+PROTOCOLS = {}
+
+# Factor a kg de cada unidad que pueden informar los protocolos; las bandas y umbrales de la
+# aplicación (cero, reposo, anomalías) están en kg
+KG_PER_UNIT = {"kg": 1.0, "t": 1000.0, "lb": 0.45359237, "g": 0.001}
+
+# Tramas necesarias para fijar un protocolo en modo automático
+AUTODETECT_FRAMES = 3
+
+
+def _xor_checksum(payload):
+    value = 0
+    for byte in payload.encode("latin-1"):
+        value ^= byte
+    return value
+
+
+def _sum_checksum(payload):
+    return sum(payload.encode("latin-1")) & 0xFF
+
+
+CHECKSUMS = {"xor": _xor_checksum, "sum8": _sum_checksum}
+
+
+class ScaleProtocol:
+    """Declaración de un formato de trama; el patrón se compila una sola vez al crearla"""
+
+    def __init__(self, name, pattern, description="", status_map=None, type_map=None,
+                 default_type="GS", default_unit="kg", checksum=None):
+        self.name = name
+        self.pattern = pattern
+        self.description = description
+        self.status_map = status_map or {}
+        self.type_map = type_map or {}
+        self.default_type = default_type
+        self.default_unit = default_unit
+        self.checksum = CHECKSUMS[checksum] if checksum else None
+        self._match = re.compile(pattern).match
+        self.misparsed = REGISTRY.counter("frames_misparsed_total", "Tramas reconocidas pero inválidas",
+                                          labels={"protocol": name})
+        self.parsed = REGISTRY.counter("frames_parsed_total", "Tramas parseadas correctamente",
+                                       labels={"protocol": name})
+
+    def matches(self, line):
+        return self._match(line) is not None
+
+    def parse(self, line):
+        """Devuelve ParsedReading, False si la trama es de este protocolo pero inválida, o None"""
+        match = self._match(line)
+        if match is None:
+            return None
+        groups = match.groupdict()
+
+        if self.checksum is not None:
+            try:
+                if self.checksum(groups["payload"]) != int(groups["checksum"], 16):
+                    self.misparsed.inc()
+                    return False
+            except (TypeError, ValueError, UnicodeEncodeError):
+                self.misparsed.inc()
+                return False
+
+        try:
+            weight = float(groups["value"].replace(" ", ""))
+        except (TypeError, ValueError):
+            self.misparsed.inc()
+            return False
+        if groups.get("sign") == "-":
+            weight = -weight
+
+        raw_status = groups.get("status") or "ST"
+        status = self.status_map.get(raw_status, raw_status)
+        raw_type = groups.get("type")
+        weight_type = self.type_map.get(raw_type, raw_type) if raw_type else self.default_type
+        unit = (groups.get("unit") or self.default_unit).lower()
+        self.parsed.inc()
+        return ParsedReading(status, weight_type, weight, unit, self.name)
+
+
+def register(protocol):
+    PROTOCOLS[protocol.name] = protocol
+    return protocol
+
+
+# ---- Protocolos incluidos ----
+
+# Formato original de la planta: "ST,GS,+ 1234.5kg"
+register(ScaleProtocol(
+    "csv", r'\x02?(?P<status>[A-Z]{2}),(?P<type>[A-Z]{2}),(?P<sign>[+\-])\s*(?P<value>[\d.]+)\s*(?P<unit>kg|lb|t)\b(?!\*)',
+    description="ESTADO,TIPO,±peso unidad (p.ej. ST,GS,+ 1234.5kg)"))
+
+# Igual que csv pero con checksum XOR al estilo NMEA: "ST,GS,+001234.5kg*4F"
+register(ScaleProtocol(
+    "csv-xor", r'\x02?(?P<payload>(?P<status>[A-Z]{2}),(?P<type>[A-Z]{2}),(?P<sign>[+\-])\s*(?P<value>[\d.]+)\s*'
+               r'(?P<unit>kg|lb|t))\*(?P<checksum>[0-9A-Fa-f]{2})$',
+    description="csv con checksum XOR en hexadecimal tras '*'", checksum="xor"))
+
+# Salida continua tipo A&D: "ST,+001234.5  kg" / "US,-000012.0  kg" / "OL,+9999999  kg"
+register(ScaleProtocol(
+    "and", r'(?P<status>ST|US|OL|QT),(?P<sign>[+\-])(?P<value>[\d.]+)\s*(?P<unit>kg|lb|t)\b',
+    description="A&D continuo: ESTADO,±peso unidad"))
+
+# Mettler Toledo MT-SICS: "S S      1234.5 kg" (estable) / "S D      1234.5 kg" (dinámico)
+register(ScaleProtocol(
+    "mt-sics", r'S\s+(?P<status>[SD+\-])\s+(?P<sign>-)?\s*(?P<value>[\d.]+)\s+(?P<unit>kg|lb|t|g)\b',
+    description="Mettler Toledo MT-SICS (respuesta S)",
+    status_map={"S": "ST", "D": "US", "+": "OL", "-": "OL"}))
+
+# Continuo con estado en texto y tipo bruto/neto: "G     1234.5 kg ST" / "N    -12.0 lb US"
+register(ScaleProtocol(
+    "gn-suffix", r'\x02?\s*(?P<type>[GN])\s+(?P<sign>[+\-])?\s*(?P<value>[\d.]+)\s*(?P<unit>kg|lb|t)\s+(?P<status>ST|US|MO|OL)',
+    description="G/N peso unidad ESTADO", type_map={"G": "GS", "N": "NT"}, status_map={"MO": "US"}))
+
+
+class ProtocolParser:
+    """Parser de un puerto: protocolo fijo o "auto" (detecta con las primeras tramas)"""
+
+    def __init__(self, protocol="auto", autodetect_frames=AUTODETECT_FRAMES):
+        self.autodetect_frames = autodetect_frames
+        self.on_detected = None
+        self.unknown = 0
+        self.misparsed = 0
+        self._votes = {}
+        self.set_protocol(protocol)
+
+    def set_protocol(self, protocol):
+        if protocol != "auto" and protocol not in PROTOCOLS:
+            raise ValueError(f"Protocolo desconocido: {protocol}")
+        self.selected = protocol
+        self.active = PROTOCOLS.get(protocol)
+        self._votes = {}
+
+    @property
+    def name(self):
+        return self.active.name if self.active else "auto"
+
+    def parse(self, line):
+        """ParsedReading o None (trama desconocida o inválida, siempre contabilizada)"""
+        if self.active is not None:
+            result = self.active.parse(line)
+        else:
+            result = self._parse_detecting(line)
+        if result:
+            return result
+        if result is None:
+            self.unknown += 1
+            M_FRAMES_UNKNOWN.inc()
+        else:
+            self.misparsed += 1
+        M_PARSE_FAILURES.inc()
+        return None
+
+    def _parse_detecting(self, line):
+        # Sin protocolo fijado se prueban todos; el primero que parsea gana esta trama
+        outcome = None
+        for protocol in PROTOCOLS.values():
+            result = protocol.parse(line)
+            if result:
+                votes = self._votes[protocol.name] = self._votes.get(protocol.name, 0) + 1
+                if votes >= self.autodetect_frames:
+                    self.active = protocol
+                    if self.on_detected:
+                        self.on_detected(protocol.name)
+                return result
+            if result is False:
+                outcome = False
+        return outcome
+
+
+def to_kg(weight, unit):
+    """Peso en kg; una unidad desconocida se toma como kg"""
+    return weight * KG_PER_UNIT.get(unit, 1.0)
+
+
+def protocol_names():
+    return ["auto"] + list(PROTOCOLS)
@@ -0,0 +1,147 @@
+import time
+
+from metrics import REGISTRY
+from tracing import StageTracer
+
+M_SERIAL_BYTES = REGISTRY.counter("serial_bytes_total", "Bytes recibidos del puerto serial")
+M_SERIAL_LINES = REGISTRY.counter("serial_lines_total", "Líneas recibidas del puerto serial")
+M_SERIAL_READS = REGISTRY.counter("serial_read_wakeups_total", "Despertares del hilo lector con datos")
+M_SERIAL_OVERFLOWS = REGISTRY.counter("serial_frame_overflows_total", "Buffers descartados por trama demasiado larga")
+
+
+class FrameSplitter:
+    """Separa tramas de forma incremental sobre un buffer reutilizable
+
+    Acepta CR, LF o CRLF como terminador, así un indicador que solo manda CR no deja la
+    trama esperando. Si el buffer crece más de max_frame sin terminador se descarta.
+    """
+
+    def __init__(self, max_frame=4096):
+        self.max_frame = max_frame
+        self._buffer = bytearray()
+        self.overflows = 0
+
+    def feed(self, data):
+        """Agrega bytes y devuelve la lista de tramas completas (bytes, sin terminador)"""
+        buf = self._buffer
+        buf += data
+        frames = []
+        pos = 0
+        size = len(buf)
+        # Se recuerda la próxima posición de cada terminador: cada byte se escanea una sola vez
+        lf = buf.find(b"\n")
+        cr = buf.find(b"\r")
+        while pos < size:
+            if 0 <= lf < pos:
+                lf = buf.find(b"\n", pos)
+            if 0 <= cr < pos:
+                cr = buf.find(b"\r", pos)
+            end = lf if cr < 0 else cr if lf < 0 else min(lf, cr)
+            if end < 0:
+                break
+            if end > pos:
+                frames.append(bytes(buf[pos:end]))
+            pos = end + 1
+        if pos:
+            del buf[:pos]
+        if len(buf) > self.max_frame:
+            self.overflows += 1
+            M_SERIAL_OVERFLOWS.inc()
+            buf.clear()
+        return frames
+
+    def pending(self):
+        return bytes(self._buffer)
+
+
+class SerialLineReader:
+    """Bucle de lectura del puerto serial, independiente de Tk
+
+    Cada línea no vacía se entrega a on_line(line, trace) desde el hilo lector;
+    el consumidor decide cómo pasarla a la UI (root.after, cola, socket...).
+
+    Modos:
+    - "bulk": espera el primer byte con read(1) (bloquea hasta que haya datos o venza el
+      timeout del puerto) y luego trae todo lo pendiente con read(in_waiting). Una ráfaga
+      de tramas se procesa en una sola vuelta.
+    - "line": readline() clásico, un read() por byte.
+    """
+
+    def __init__(self, serial_port, on_line, on_error=None, tracer=None, recorder=None, mode="bulk"):
+        self.serial_port = serial_port
+        self.on_line = on_line
+        self.on_error = on_error
+        self.tracer = tracer
+        # Grabador de bytes crudos (SerialRecorder); se puede activar/desactivar en caliente
+        self.recorder = recorder
+        self.mode = mode
+        self.splitter = FrameSplitter()
+
+    def run(self, keep_running):
+        """Lee hasta que keep_running() sea False, el puerto se cierre o falle"""
+        if self.mode == "bulk":
+            self._run_bulk(keep_running)
+        else:
+            self._run_lines(keep_running)
+
+    def _run_bulk(self, keep_running):
+        port = self.serial_port
+        tracer = self.tracer
+        splitter = self.splitter
+        while keep_running():
+            try:
+                if not (port and port.is_open):
+                    break
+                data = port.read(1)
+                if not data:
+                    # Venció el timeout sin datos
+                    continue
+                waiting = port.in_waiting
+                if waiting:
+                    data += port.read(waiting)
+                t_arrival = time.perf_counter()
+                M_SERIAL_READS.inc()
+                M_SERIAL_BYTES.inc(len(data))
+                recorder = self.recorder
+                if recorder is not None:
+                    recorder.record(data)
+                for frame in splitter.feed(data):
+                    line = frame.decode('utf-8', errors='ignore').strip()
+                    if line:
+                        M_SERIAL_LINES.inc()
+                        trace = tracer.start(t_arrival) if tracer else None
+                        StageTracer.mark(trace)
+                        self.on_line(line, trace)
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(e)
+                break
+        # Una trama final sin terminador (p.ej. fin de una captura) también se entrega
+        tail = splitter.pending().decode('utf-8', errors='ignore').strip()
+        if tail and keep_running():
+            M_SERIAL_LINES.inc()
+            self.on_line(tail, None)
+
+    def _run_lines(self, keep_running):
+        port = self.serial_port
+        tracer = self.tracer
+        while keep_running():
+            try:
+                if not (port and port.is_open):
+                    break
+                raw = port.readline()
+                trace = tracer.start() if tracer else None
+                M_SERIAL_READS.inc()
+                recorder = self.recorder
+                if recorder is not None:
+                    recorder.record(raw)
+                M_SERIAL_BYTES.inc(len(raw))
+                line = raw.decode('utf-8', errors='ignore').strip()
+                if line:
+                    M_SERIAL_LINES.inc()
+                    StageTracer.mark(trace)
+                    self.on_line(line, trace)
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(e)
+                break
@@ -0,0 +1,173 @@
+"""Simulador de indicador de balanza y WebDriver falso para pruebas sin hardware.
+
+El simulador escribe tramas realistas ("ST,GS,+ 1234.5kg") en un puerto pyserial:
+`loop://` (el mismo objeto lee lo que escribe) o un par pseudo-terminal en POSIX.
+"""
+import io
+import os
+import random
+import threading
+import time
+
+import serial
+from PIL import Image, ImageDraw
+
+
+def format_frame(weight, stable=True, weight_type="GS"):
+    """Trama en el formato del indicador, terminada en CRLF"""
+    status = "ST" if stable else "US"
+    sign = "+" if weight >= 0 else "-"
+    return f"{status},{weight_type},{sign}{abs(weight):8.1f}kg\r\n".encode("ascii")
+
+
+class FrameGenerator:
+    """Genera una secuencia de pesaje: rampa inestable, asentamiento estable, ruido y líneas corruptas"""
+
+    MALFORMED = (b"ST,GS,+   12\r\n", b"\x00\xff\xfe garbage\r\n", b"OL,GS,+ ----.-kg\r\n", b",,,\r\n")
+
+    def __init__(self, target=1234.5, ramp_frames=40, stable_frames=120, noise=0.5,
+                 malformed_ratio=0.01, seed=None):
+        self.target = target
+        self.ramp_frames = ramp_frames
+        self.stable_frames = stable_frames
+        self.noise = noise
+        self.malformed_ratio = malformed_ratio
+        self.random = random.Random(seed)
+
+    def __iter__(self):
+        rnd = self.random
+        while True:
+            target = self.target * rnd.uniform(0.5, 1.5)
+            # Subida del camión: peso creciente e inestable
+            for i in range(self.ramp_frames):
+                yield self._maybe_malformed(format_frame(target * (i + 1) / self.ramp_frames
+                                                         + rnd.gauss(0, self.noise * 10), stable=False))
+            # Peso asentado con ruido pequeño
+            for _ in range(self.stable_frames):
+                yield self._maybe_malformed(format_frame(round(target + rnd.gauss(0, self.noise), 1)))
+            # Bajada y plataforma vacía
+            for i in range(self.ramp_frames):
+                yield self._maybe_malformed(format_frame(target * (1 - (i + 1) / self.ramp_frames), stable=False))
+            for _ in range(self.stable_frames // 2):
+                yield self._maybe_malformed(format_frame(0.0))
+
+    def _maybe_malformed(self, frame):
+        if self.malformed_ratio and self.random.random() < self.malformed_ratio:
+            return self.random.choice(self.MALFORMED)
+        return frame
+
+
+def open_transport(kind="loop", baudrate=115200):
+    """Abre un par (escritor, lector) de puertos simulados
+
+    - "loop": pyserial loop://, un solo objeto que lee lo que escribe.
+    - "pty":  par pseudo-terminal (solo POSIX), pasa por el driver tty real del kernel.
+    """
+    if kind == "loop":
+        port = serial.serial_for_url("loop://", baudrate=baudrate, timeout=1)
+        return port, port
+    if kind == "pty":
+        master, slave = os.openpty()
+        reader = serial.Serial(os.ttyname(slave), baudrate=baudrate, timeout=1)
+        writer = os.fdopen(master, "wb", buffering=0)
+        return writer, reader
+    raise ValueError(f"Transporte desconocido: {kind}")
+
+
+class ScaleSimulator:
+    """Escribe tramas a una tasa fija en un hilo y registra el instante de envío de cada una"""
+
+    def __init__(self, writer, rate=10.0, generator=None, total=None):
+        self.writer = writer
+        self.rate = rate
+        self.generator = iter(generator or FrameGenerator())
+        self.total = total
+        self.sent = 0
+        self.sent_bytes = 0
+        self.send_times = []
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=2)
+
+    def wait(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        interval = 1.0 / self.rate
+        start = time.perf_counter()
+        while self._running and (self.total is None or self.sent < self.total):
+            # A tasas altas se escriben en lote todas las tramas que "ya tocaban"
+            due = int((time.perf_counter() - start) / interval) + 1
+            if self.total is not None:
+                due = min(due, self.total)
+            batch = []
+            while self.sent + len(batch) < due:
+                batch.append(next(self.generator))
+            if batch:
+                data = b"".join(batch)
+                now = time.perf_counter()
+                self.writer.write(data)
+                self.send_times.extend([now] * len(batch))
+                self.sent += len(batch)
+                self.sent_bytes += len(data)
+            next_at = start + self.sent * interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(min(delay, 0.01))
+
+
+def make_canned_pngs(count=8, size=(960, 540)):
+    """PNGs de prueba con contenido distinto (simulan el video de la cámara)"""
+    frames = []
+    for i in range(count):
+        image = Image.new("RGB", size, (20, 20, 20))
+        draw = ImageDraw.Draw(image)
+        offset = i * size[0] // count
+        draw.rectangle([offset, size[1] // 3, offset + size[0] // 6, 2 * size[1] // 3], fill=(200, 180, 40))
+        for y in range(0, size[1], 24):
+            draw.line([(0, y), (size[0], (y * 7 + i * 31) % size[1])], fill=(60, 90 + i * 10, 120), width=2)
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        frames.append(buffer.getvalue())
+    return frames
+
+
+class FakeWebDriver:
+    """WebDriver mínimo que devuelve PNGs enlatados con una latencia configurable"""
+
+    def __init__(self, pngs=None, latency=0.0):
+        self.pngs = pngs or make_canned_pngs()
+        self.latency = latency
+        self.calls = 0
+
+    def get_screenshot_as_png(self):
+        if self.latency:
+            time.sleep(self.latency)
+        png = self.pngs[self.calls % len(self.pngs)]
+        self.calls += 1
+        return png
+
+    def execute_script(self, script, *args):
+        return "Hik-Connect"
+
+    def execute_cdp_cmd(self, cmd, params):
+        return {}
+
+    def set_window_size(self, width, height):
+        pass
+
+    def get(self, url):
+        pass
+
+    def quit(self):
+        pass
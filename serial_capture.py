@@ -0,0 +1,146 @@
+"""Grabación binaria del flujo serial crudo y reproducción a 1x, Nx o velocidad máxima.
+
+Formato del archivo (.pscap, little-endian):
+    cabecera: b"PSCAP1\\n" + struct "<dQ" (hora de inicio epoch, monotonic_ns de inicio)
+    registros: struct "<IH" (µs desde el registro anterior, longitud) + bytes crudos
+
+Un registro ocupa 6 bytes + datos, suficiente para turnos completos a cualquier baud rate.
+"""
+import struct
+import threading
+import time
+
+CAPTURE_MAGIC = b"PSCAP1\n"
+_HEADER = struct.Struct("<dQ")
+_RECORD = struct.Struct("<IH")
+_MAX_CHUNK = 0xFFFF
+_MAX_DELTA_US = 0xFFFFFFFF
+
+
+class SerialRecorder:
+    """Escribe cada bloque leído del puerto con su marca de tiempo monotónica"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "wb", buffering=64 * 1024)
+        self._lock = threading.Lock()
+        self._last_ns = time.monotonic_ns()
+        self._file.write(CAPTURE_MAGIC + _HEADER.pack(time.time(), self._last_ns))
+        self.bytes_recorded = 0
+
+    def record(self, chunk, t_ns=None):
+        if not chunk:
+            return
+        now = time.monotonic_ns() if t_ns is None else t_ns
+        with self._lock:
+            if self._file is None:
+                return
+            delta_us = min((now - self._last_ns) // 1000, _MAX_DELTA_US)
+            self._last_ns = now
+            # Bloques grandes se parten; los trozos siguientes van con delta 0
+            for start in range(0, len(chunk), _MAX_CHUNK):
+                piece = chunk[start:start + _MAX_CHUNK]
+                self._file.write(_RECORD.pack(delta_us, len(piece)))
+                self._file.write(piece)
+                delta_us = 0
+            self.bytes_recorded += len(chunk)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_capture(path):
+    """Itera (segundos desde el inicio, bytes) de un archivo de captura"""
+    with open(path, "rb") as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError(f"{path} no es una captura serial válida")
+        f.read(_HEADER.size)
+        offset_us = 0
+        while True:
+            header = f.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                return
+            delta_us, length = _RECORD.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                return
+            offset_us += delta_us
+            yield offset_us / 1e6, data
+
+
+def capture_start_time(path):
+    """Hora (epoch) en que comenzó la grabación"""
+    with open(path, "rb") as f:
+        f.read(len(CAPTURE_MAGIC))
+        return _HEADER.unpack(f.read(_HEADER.size))[0]
+
+
+class ReplaySource:
+    """Objeto tipo serial.Serial que entrega una captura respetando (o acelerando) sus tiempos
+
+    speed=1 reproduce en tiempo real, speed=N acelera N veces y speed=0 va a velocidad máxima.
+    Al terminar la captura is_open pasa a False, igual que un puerto que se cierra.
+    """
+
+    def __init__(self, path, speed=1.0):
+        self.path = path
+        self.port = f"replay:{path}"
+        self.speed = speed
+        self.is_open = True
+        self._records = read_capture(path)
+        self._buffer = bytearray()
+        self._start = None
+        # Permite interrumpir la espera entre registros al desconectar
+        self._cancelled = threading.Event()
+
+    @property
+    def in_waiting(self):
+        return len(self._buffer)
+
+    def _next_chunk(self):
+        try:
+            offset, data = next(self._records)
+        except StopIteration:
+            self.is_open = False
+            return False
+        if self.speed > 0:
+            now = time.perf_counter()
+            if self._start is None:
+                self._start = now - offset / self.speed
+            delay = self._start + offset / self.speed - now
+            if delay > 0 and self._cancelled.wait(delay):
+                return False
+        self._buffer += data
+        return True
+
+    def readline(self):
+        while True:
+            end = self._buffer.find(b"\n")
+            if end >= 0:
+                line = bytes(self._buffer[:end + 1])
+                del self._buffer[:end + 1]
+                return line
+            if not self.is_open or not self._next_chunk():
+                line = bytes(self._buffer)
+                self._buffer.clear()
+                return line
+
+    def read(self, size=1):
+        while len(self._buffer) < size and self.is_open and self._next_chunk():
+            pass
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def cancel_read(self):
+        """Igual que serial.Serial.cancel_read: corta la espera en curso"""
+        self.is_open = False
+        self._cancelled.set()
+
+    def close(self):
+        self._cancelled.set()
+        # Solo marcar: el hilo lector puede estar dentro del generador de registros
+        self.is_open = False
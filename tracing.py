@@ -0,0 +1,74 @@
+import time
+from array import array
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+
+class StageTracer:
+    """Latencias por etapa en una ventana deslizante de tamaño fijo (arrays, sin listas crecientes)
+
+    Cada traza es una secuencia de marcas perf_counter(), una por etapa más la marca inicial:
+    [llegada, etapa1, etapa2, ...]. Se registra la diferencia entre marcas consecutivas y el total.
+    """
+
+    def __init__(self, stages, window=2048, total_histogram=None):
+        self.stages = tuple(stages)
+        self.window = window
+        self._samples = {name: array("d", bytes(8 * window)) for name in self.stages + ("total",)}
+        self._index = 0
+        self._filled = 0
+        self.count = 0
+        self.total_histogram = total_histogram
+
+    def start(self, t=None):
+        """Crea una traza nueva con su marca inicial"""
+        return [time.perf_counter() if t is None else t]
+
+    @staticmethod
+    def mark(trace):
+        if trace is not None:
+            trace.append(time.perf_counter())
+
+    def finish(self, trace):
+        """Cierra la traza; las incompletas se descartan"""
+        if trace is None or len(trace) != len(self.stages) + 1:
+            return
+        i = self._index
+        for n, name in enumerate(self.stages):
+            self._samples[name][i] = trace[n + 1] - trace[n]
+        total = trace[-1] - trace[0]
+        self._samples["total"][i] = total
+        self._index = (i + 1) % self.window
+        self._filled = min(self._filled + 1, self.window)
+        self.count += 1
+        if self.total_histogram is not None:
+            self.total_histogram.observe(total)
+
+    def stats(self):
+        """Devuelve {etapa: (p50, p95, p99, máx)} en segundos sobre la ventana actual"""
+        result = {}
+        for name, samples in self._samples.items():
+            values = sorted(samples[:self._filled])
+            result[name] = (_percentile(values, 0.50), _percentile(values, 0.95),
+                            _percentile(values, 0.99), values[-1] if values else 0.0)
+        return result
+
+    def summary(self, stage="total"):
+        """Texto corto para la UI: p50/p95/p99 en ms"""
+        p50, p95, p99, _ = self.stats()[stage]
+        return f"p50 {p50 * 1000:.1f} / p95 {p95 * 1000:.1f} / p99 {p99 * 1000:.1f} ms"
+
+    def dump(self):
+        """Estadísticas en ms listas para serializar (volcado periódico)"""
+        return {
+            "samples": self._filled,
+            "count": self.count,
+            "stages": {name: {"p50": round(p50 * 1000, 3), "p95": round(p95 * 1000, 3),
+                              "p99": round(p99 * 1000, 3), "max": round(mx * 1000, 3)}
+                       for name, (p50, p95, p99, mx) in self.stats().items()},
+        }
@@ -0,0 +1,379 @@
+"""Salud del video por eventos: la página avisa cuando el stream se corta, la app solo reacciona.
+
+Reemplaza al keep-alive por sondeo (execute_script + Page.setWebLifecycleState cada 5 s vía
+WebDriver, y un setInterval que recorría los <video> cada segundo). Por cada ventana de Chrome
+se abre una sesión CDP directa (WebSocket del puerto de depuración, sin pasar por chromedriver):
+
+- Runtime.addBinding expone window.__pesajeHealth(json) a la página; cada llamada llega a la app
+  como evento Runtime.bindingCalled, sin sondear nada;
+- Page.addScriptToEvaluateOnNewDocument inyecta VIDEO_MONITOR_JS en cada carga de la página. El
+  monitor sigue los <video> que aparecen (MutationObserver), arma un temporizador que se reinicia
+  con cada frame pintado (requestVideoFrameCallback) y solo vence si dejan de llegar frames, y
+  escucha waiting/error/pause. Una pausa se reanuda ahí mismo; un corte se informa a la app.
+
+Ante un corte la app pide a la página reintentar (__pesajeRecover) y pone el ciclo de vida en
+"active" en el mismo momento; si sigue cortado VIDEO_RELOAD_AFTER_S después, recarga la página.
+Con el video sano no hay tráfico: ni WebDriver ni CDP.
+"""
+import asyncio
+import base64
+import json
+import os
+import struct
+import time
+
+from metrics import REGISTRY
+
+M_VIDEO_STALLS = REGISTRY.counter("video_stalls_total", "Cortes del video informados por la página")
+M_VIDEO_RECOVERY = REGISTRY.histogram("video_recovery_seconds", "Corte del video -> primer frame nuevo")
+M_VIDEO_RELOADS = REGISTRY.counter("video_reloads_total", "Recargas de página por cortes que no se recuperaron")
+M_CDP_COMMANDS = REGISTRY.counter("video_cdp_commands_total", "Comandos CDP enviados por el monitor de video")
+
+# Nombre de la función que la página llama para informar (binding CDP)
+HEALTH_BINDING = "__pesajeHealth"
+
+# Sin frames nuevos durante tanto tiempo, la página da el video por cortado
+VIDEO_STALL_MS = 1000
+
+# Si tras pedir la recuperación el video sigue cortado, se recarga la página
+VIDEO_RELOAD_AFTER_S = 15.0
+
+# Reconexión de la sesión CDP (Chrome reiniciándose, ventana cerrada): backoff hasta el máximo
+CDP_RECONNECT_MAX_S = 30.0
+
+VIDEO_MONITOR_JS = """
+(function() {
+    if (window.__pesajeVideoMonitor) return;
+    window.__pesajeVideoMonitor = true;
+    var STALL_MS = %(stall_ms)d;
+    var videos = [];
+
+    function report(kind, index, extra) {
+        if (!window.%(binding)s) return;
+        var info = {kind: kind, index: index, t: Date.now()};
+        for (var k in extra || {}) info[k] = extra[k];
+        window.%(binding)s(JSON.stringify(info));
+    }
+
+    function watch(v) {
+        if (v.__pesajeWatched) return;
+        v.__pesajeWatched = true;
+        var index = videos.push(v) - 1;
+        var timer = 0;
+        v.__pesajeStalledAt = 0;
+
+        function stalled(reason) {
+            // Un reproductor reemplazado deja su <video> fuera del documento: no es un corte
+            if (v.__pesajeStalledAt || !v.isConnected) return;
+            v.__pesajeStalledAt = performance.now();
+            report('stalled', index, {reason: reason});
+        }
+        function frame() {
+            if (v.__pesajeStalledAt) {
+                report('recovered', index, {stalled_ms: Math.round(performance.now() - v.__pesajeStalledAt)});
+                v.__pesajeStalledAt = 0;
+            }
+            clearTimeout(timer);
+            timer = setTimeout(function() { stalled('sin frames'); }, STALL_MS);
+        }
+        if (v.requestVideoFrameCallback) {
+            v.requestVideoFrameCallback(function onFrame() { frame(); v.requestVideoFrameCallback(onFrame); });
+        } else {
+            v.addEventListener('timeupdate', frame);
+        }
+        v.addEventListener('waiting', function() { stalled('waiting'); });
+        v.addEventListener('error', function() { stalled('error'); });
+        v.addEventListener('pause', function() {
+            // Reanudar en la misma página, sin ida y vuelta a la app
+            if (v.readyState >= 2) v.play().catch(function() {});
+        });
+    }
+
+    function scan(node) {
+        if (node.tagName === 'VIDEO') watch(node);
+        else if (node.querySelectorAll) node.querySelectorAll('video').forEach(watch);
+    }
+
+    window.__pesajeRecover = function() {
+        videos.forEach(function(v) {
+            if (!v.isConnected || !v.__pesajeStalledAt) return;
+            if (v.error) v.load();
+            v.play().catch(function() {});
+        });
+    };
+
+    new MutationObserver(function(mutations) {
+        mutations.forEach(function(m) { m.addedNodes.forEach(scan); });
+    }).observe(document, {childList: true, subtree: true});
+    scan(document);
+
+    document.addEventListener('freeze', function() { report('frozen', -1); });
+    document.addEventListener('visibilitychange', function() {
+        if (document.hidden) report('hidden', -1);
+    });
+    report('monitor', -1, {videos: videos.length});
+})();
+""" % {"stall_ms": VIDEO_STALL_MS, "binding": HEALTH_BINDING}
+
+
+class CdpError(Exception):
+    """Respuesta de error de un comando CDP o sesión cerrada"""
+
+
+# Fallas posibles hablando con el puerto de depuración: conexión, respuesta HTTP/WebSocket
+# truncada o demasiado larga, JSON inválido (ValueError) o error CDP
+CDP_ERRORS = (OSError, CdpError, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError)
+
+
+async def _http_get_json(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: close\r\n\r\n".encode("ascii"))
+        await writer.drain()
+        head = await reader.readuntil(b"\r\n\r\n")
+        length = None
+        for line in head.decode("latin-1").split("\r\n")[1:]:
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        body = await (reader.readexactly(length) if length is not None else reader.read())
+        return json.loads(body)
+    finally:
+        writer.close()
+
+
+def _ws_client_frame(payload, opcode=0x1):
+    """Frame WebSocket cliente->servidor (con máscara, obligatoria del lado del cliente)"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, 0x80 | length)
+    elif length < 65536:
+        header = struct.pack("!BBH", 0x80 | opcode, 0x80 | 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 0x80 | 127, length)
+    mask = os.urandom(4)
+    key = (mask * (length // 4 + 1))[:length]
+    masked = (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(length, "big")
+    return header + mask + masked
+
+
+class CdpSession:
+    """Sesión CDP sobre el WebSocket de un target: comandos con respuesta y eventos por callback"""
+
+    def __init__(self, on_event):
+        self.on_event = on_event
+        self._reader = None
+        self._writer = None
+        self._next_id = 0
+        self._pending = {}
+        self._closed = False
+
+    async def connect(self, ws_url):
+        rest = ws_url.split("://", 1)[1]
+        hostport, _, path = rest.partition("/")
+        host, _, port = hostport.partition(":")
+        self._reader, self._writer = await asyncio.open_connection(host, int(port or 80))
+        key = base64.b64encode(os.urandom(16)).decode("ascii")
+        # Sin cabecera Origin: Chrome solo exige --remote-allow-origins a clientes que la envían
+        self._writer.write((f"GET /{path} HTTP/1.1\r\nHost: {hostport}\r\nUpgrade: websocket\r\n"
+                            f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n"
+                            f"Sec-WebSocket-Version: 13\r\n\r\n").encode("ascii"))
+        await self._writer.drain()
+        head = await self._reader.readuntil(b"\r\n\r\n")
+        if b" 101 " not in head.split(b"\r\n", 1)[0]:
+            raise CdpError(head.split(b"\r\n", 1)[0].decode("latin-1"))
+
+    def close(self):
+        self._closed = True
+        if self._writer is not None:
+            self._writer.close()
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(CdpError("sesión cerrada"))
+        self._pending.clear()
+
+    async def send(self, method, params=None):
+        if self._closed or self._writer is None or self._writer.is_closing():
+            # Nadie leería la respuesta: el futuro quedaría pendiente para siempre
+            raise CdpError("sesión cerrada")
+        self._next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[self._next_id] = future
+        message = json.dumps({"id": self._next_id, "method": method, "params": params or {}})
+        self._writer.write(_ws_client_frame(message.encode("utf-8")))
+        M_CDP_COMMANDS.inc()
+        await self._writer.drain()
+        return await future
+
+    async def _read_message(self):
+        data = b""
+        while True:
+            b1, b2 = await self._reader.readexactly(2)
+            opcode = b1 & 0x0F
+            length = b2 & 0x7F
+            if length == 126:
+                (length,) = struct.unpack("!H", await self._reader.readexactly(2))
+            elif length == 127:
+                (length,) = struct.unpack("!Q", await self._reader.readexactly(8))
+            payload = await self._reader.readexactly(length)
+            if opcode == 0x8:
+                return None
+            if opcode == 0x9:
+                self._writer.write(_ws_client_frame(payload, opcode=0xA))
+                continue
+            if opcode == 0xA:
+                continue
+            data += payload
+            if b1 & 0x80:
+                return data
+
+    async def run(self):
+        """Despacha respuestas y eventos hasta que se cierre la conexión"""
+        try:
+            while True:
+                try:
+                    data = await self._read_message()
+                except (OSError, asyncio.IncompleteReadError):
+                    return
+                if data is None:
+                    return
+                try:
+                    message = json.loads(data)
+                except ValueError:
+                    continue
+                if "id" in message:
+                    future = self._pending.pop(message["id"], None)
+                    if future is not None and not future.done():
+                        if "error" in message:
+                            future.set_exception(CdpError(message["error"].get("message", "error CDP")))
+                        else:
+                            future.set_result(message.get("result", {}))
+                elif "method" in message:
+                    self.on_event(message["method"], message.get("params", {}))
+        finally:
+            self.close()
+
+
+class VideoHealthMonitor:
+    """Monitor de salud del video de una ventana de Chrome (target CDP), en el loop del orquestador
+
+    log(mensaje) recibe los avisos para el log de la app.
+    """
+
+    def __init__(self, debugger_address, target_id, name, log=None):
+        self.debugger_address = debugger_address
+        self.target_id = target_id
+        self.name = name
+        self.log = log
+        self.stalled = {}
+        self.connected = False
+        self._session = None
+        self._reader_task = None
+        self._reload_task = None
+
+    async def _target_ws_url(self):
+        host, _, port = self.debugger_address.rpartition(":")
+        targets = await _http_get_json(host or "127.0.0.1", int(port), "/json/list")
+        for target in targets:
+            if target.get("id") == self.target_id:
+                return target.get("webSocketDebuggerUrl")
+        return None
+
+    async def available(self):
+        """True si el puerto de depuración responde y expone el target de esta ventana"""
+        return bool(await self._target_ws_url())
+
+    async def attach(self):
+        """Conecta al target e instala binding y monitor. Devuelve False si el target no existe"""
+        ws_url = await self._target_ws_url()
+        if not ws_url:
+            return False
+        self._session = CdpSession(self._on_event)
+        await self._session.connect(ws_url)
+        self._reader_task = asyncio.ensure_future(self._session.run())
+        await self._session.send("Runtime.addBinding", {"name": HEALTH_BINDING})
+        await self._session.send("Page.addScriptToEvaluateOnNewDocument", {"source": VIDEO_MONITOR_JS})
+        # La página ya cargada no vuelve a evaluar los scripts de documento nuevo
+        await self._session.send("Runtime.evaluate", {"expression": VIDEO_MONITOR_JS})
+        await self._session.send("Page.setWebLifecycleState", {"state": "active"})
+        self.connected = True
+        return True
+
+    async def run(self):
+        """Mantiene la sesión: reconecta con backoff si se cae, hasta que se cancele la tarea"""
+        delay = 1.0
+        while True:
+            try:
+                if not await self.attach():
+                    raise CdpError(f"target {self.target_id} no encontrado")
+                delay = 1.0
+                await self._reader_task
+                if self.log:
+                    self.log(f"⚠ Video {self.name}: sesión de monitoreo cerrada, reconectando")
+            except CDP_ERRORS as e:
+                if self.log and delay == 1.0:
+                    self.log(f"⚠ Video {self.name}: sin sesión de monitoreo ({str(e)[:50]})")
+            finally:
+                self.connected = False
+                if self._reload_task is not None:
+                    # La recarga pendiente era de la sesión caída; al reconectar el monitor
+                    # reinyectado vuelve a avisar si el video sigue cortado
+                    self._reload_task.cancel()
+                    self._reload_task = None
+                self.stalled.clear()
+                if self._session is not None:
+                    self._session.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, CDP_RECONNECT_MAX_S)
+
+    def _on_event(self, method, params):
+        if method != "Runtime.bindingCalled" or params.get("name") != HEALTH_BINDING:
+            return
+        try:
+            info = json.loads(params.get("payload", ""))
+        except ValueError:
+            return
+        kind = info.get("kind")
+        if kind == "stalled":
+            self._on_stalled(info)
+        elif kind == "recovered":
+            self._on_recovered(info)
+        elif kind in ("frozen", "hidden"):
+            # La página va a congelarse o quedó oculta: devolverla a "active" ya
+            asyncio.ensure_future(self._command("Page.setWebLifecycleState", {"state": "active"}))
+
+    def _on_stalled(self, info):
+        M_VIDEO_STALLS.inc()
+        self.stalled[info.get("index")] = time.monotonic()
+        if self.log:
+            self.log(f"⚠ Video {self.name}: corte ({info.get('reason', '?')}), recuperando")
+        asyncio.ensure_future(self._command("Page.setWebLifecycleState", {"state": "active"}))
+        asyncio.ensure_future(self._command("Runtime.evaluate",
+                                            {"expression": "window.__pesajeRecover && window.__pesajeRecover()"}))
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.ensure_future(self._reload_if_stuck())
+
+    def _on_recovered(self, info):
+        self.stalled.pop(info.get("index"), None)
+        M_VIDEO_RECOVERY.observe(info.get("stalled_ms", 0) / 1000.0)
+        if self.log:
+            self.log(f"✓ Video {self.name}: recuperado en {info.get('stalled_ms', 0)} ms")
+        if not self.stalled and self._reload_task is not None:
+            self._reload_task.cancel()
+
+    async def _reload_if_stuck(self):
+        await asyncio.sleep(VIDEO_RELOAD_AFTER_S)
+        if self.stalled:
+            M_VIDEO_RELOADS.inc()
+            if self.log:
+                self.log(f"🔄 Video {self.name}: sigue cortado tras {VIDEO_RELOAD_AFTER_S:g}s, recargando la página")
+            # El monitor se reinyecta solo (script de documento nuevo); los <video> viejos ya no cuentan
+            self.stalled.clear()
+            await self._command("Page.reload", {})
+
+    async def _command(self, method, params):
+        try:
+            return await self._session.send(method, params)
+        except (OSError, CdpError, AttributeError):
+            # Sesión caída: run() reconecta y reinstala el monitor
+            return None
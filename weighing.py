@@ -0,0 +1,259 @@
+"""Pesajes (entrada, salida, tara, neto) a partir del flujo de pesos estables, con totales incrementales.
+
+WeighingEngine observa las lecturas: un vehículo sube a la balanza cuando el peso sale de la
+banda de cero y baja cuando vuelve a ella; el mayor peso estable entre ambos momentos es la
+captura. WeighingStore persiste cada captura en SQLite: la primera de una placa abre el pesaje
+(entrada) y la siguiente lo cierra (salida). Sin placa, la salida se empareja con el pesaje
+anónimo abierto más antiguo de la misma balanza (carril único).
+
+Al cerrar un pesaje se actualiza en la misma transacción la fila (día, turno, balanza) de
+weighing_totals. Los reportes leen solo esa tabla: su costo no depende de cuántos pesajes
+haya en la historia. Los totales se guardan en kg (cada pesaje queda en la unidad de su
+indicador), así una planta con balanzas en kg, lb y t suma magnitudes comparables.
+"""
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from metrics import REGISTRY
+from scale_protocols import KG_PER_UNIT, to_kg
+
+M_WEIGHINGS = REGISTRY.counter("weighings_closed_total", "Pesajes cerrados (entrada + salida)")
+M_CAPTURES = REGISTRY.counter("weighing_captures_total", "Pesos estables capturados al bajar el vehículo")
+
+# Base de datos de pesajes
+WEIGHING_DB = "pesajes.db"
+
+# Turnos: (nombre, hora de inicio, hora de fin); un turno que cruza la medianoche pertenece
+# al día en que empezó
+SHIFTS = (("A", 6, 14), ("B", 14, 22), ("C", 22, 6))
+
+Weighing = namedtuple("Weighing", "id plate scale entry_ts entry_weight exit_ts exit_weight "
+                                  "gross tare net unit day shift status entry_snapshot exit_snapshot")
+
+# Totales en kg, sea cual sea la unidad de la balanza
+DayTotals = namedtuple("DayTotals", "day shift scale weighings net_total gross_total tare_total net_min net_max")
+
+# Versión del esquema (PRAGMA user_version): 1 = weighing_totals en kg
+_SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS weighings (
+    id INTEGER PRIMARY KEY,
+    plate TEXT,
+    scale TEXT NOT NULL,
+    entry_ts REAL NOT NULL,
+    entry_weight REAL NOT NULL,
+    exit_ts REAL,
+    exit_weight REAL,
+    gross REAL,
+    tare REAL,
+    net REAL,
+    unit TEXT NOT NULL DEFAULT 'kg',
+    day TEXT,
+    shift TEXT,
+    status TEXT NOT NULL DEFAULT 'open',
+    entry_snapshot TEXT,
+    exit_snapshot TEXT
+);
+CREATE INDEX IF NOT EXISTS weighings_open ON weighings(plate, scale, entry_ts) WHERE status = 'open';
+CREATE INDEX IF NOT EXISTS weighings_entry_ts ON weighings(entry_ts);
+CREATE TABLE IF NOT EXISTS weighing_totals (
+    day TEXT NOT NULL,
+    shift TEXT NOT NULL,
+    scale TEXT NOT NULL,
+    weighings INTEGER NOT NULL,
+    net_total REAL NOT NULL,
+    gross_total REAL NOT NULL,
+    tare_total REAL NOT NULL,
+    net_min REAL NOT NULL,
+    net_max REAL NOT NULL,
+    PRIMARY KEY (day, shift, scale)
+) WITHOUT ROWID;
+"""
+
+_UPSERT_TOTALS = """
+INSERT INTO weighing_totals (day, shift, scale, weighings, net_total, gross_total, tare_total, net_min, net_max)
+VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?)
+ON CONFLICT (day, shift, scale) DO UPDATE SET
+    weighings = weighings + 1,
+    net_total = net_total + excluded.net_total,
+    gross_total = gross_total + excluded.gross_total,
+    tare_total = tare_total + excluded.tare_total,
+    net_min = min(net_min, excluded.net_min),
+    net_max = max(net_max, excluded.net_max)
+"""
+
+
+def shift_of(ts):
+    """(día "YYYY-MM-DD", turno) de una hora epoch según SHIFTS"""
+    moment = datetime.fromtimestamp(ts)
+    hour = moment.hour
+    for name, start, end in SHIFTS:
+        if start < end and start <= hour < end:
+            return moment.strftime("%Y-%m-%d"), name
+        if start > end and (hour >= start or hour < end):
+            # Turno nocturno: antes de la hora de fin pertenece al día anterior
+            day = moment if hour >= start else moment - timedelta(days=1)
+            return day.strftime("%Y-%m-%d"), name
+    return moment.strftime("%Y-%m-%d"), "-"
+
+
+class WeighingEngine:
+    """Convierte el flujo de lecturas en capturas: un peso estable por cada paso por la balanza"""
+
+    def __init__(self, zero_band=50.0, on_capture=None):
+        # En kg: la lectura se convierte antes de compararla (una balanza en t o en g usa la misma banda)
+        self.zero_band = zero_band
+        self.on_capture = on_capture
+        self.loaded = False
+        self._best = None
+        self._best_kg = 0.0
+
+    def feed(self, weight, status, ts, unit="kg"):
+        """Procesa una lectura; devuelve True si pasó a ser el peso a capturar (momento de la foto)"""
+        weight_kg = to_kg(weight, unit)
+        if abs(weight_kg) <= self.zero_band:
+            if self.loaded:
+                self.loaded = False
+                best, self._best = self._best, None
+                if best is not None:
+                    M_CAPTURES.inc()
+                    if self.on_capture:
+                        self.on_capture(*best)
+            return False
+        self.loaded = True
+        # El mayor peso estable: el vehículo completo sobre la plataforma
+        if status == "ST" and (self._best is None or weight_kg > self._best_kg):
+            self._best = (weight, ts, unit)
+            self._best_kg = weight_kg
+            return True
+        return False
+
+
+class WeighingStore:
+    """Pesajes y totales por (día, turno, balanza) en SQLite; seguro desde varios hilos"""
+
+    def __init__(self, path=WEIGHING_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        self._conn.executescript(_SCHEMA)
+        self._migrate_totals_kg()
+        self._lock = threading.Lock()
+
+    def _migrate(self):
+        # Bases creadas antes de guardar referencias a las fotos del pesaje
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(weighings)")}
+        if columns and "entry_snapshot" not in columns:
+            with self._conn:
+                self._conn.execute("ALTER TABLE weighings ADD COLUMN entry_snapshot TEXT")
+                self._conn.execute("ALTER TABLE weighings ADD COLUMN exit_snapshot TEXT")
+
+    def _migrate_totals_kg(self):
+        # Bases anteriores sumaban cada balanza en su unidad: se recalculan los totales en kg
+        # desde los pesajes cerrados (una sola vez)
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] >= _SCHEMA_VERSION:
+            return
+        factor = "CASE unit " + " ".join(f"WHEN '{unit}' THEN {kg!r}" for unit, kg in KG_PER_UNIT.items()) \
+                 + " ELSE 1.0 END"
+        with self._conn:
+            self._conn.execute("DELETE FROM weighing_totals")
+            self._conn.execute(
+                "INSERT INTO weighing_totals (day, shift, scale, weighings, net_total, gross_total, tare_total, "
+                "net_min, net_max) "
+                "SELECT day, shift, scale, count(*), sum(net * f), sum(gross * f), sum(tare * f), "
+                f"min(net * f), max(net * f) FROM (SELECT *, {factor} AS f FROM weighings WHERE status = 'closed') "
+                "GROUP BY day, shift, scale")
+            self._conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _get(self, weighing_id):
+        row = self._conn.execute("SELECT * FROM weighings WHERE id = ?", (weighing_id,)).fetchone()
+        return Weighing(*row) if row else None
+
+    def record_capture(self, weight, ts, scale, plate=None, unit="kg", snapshot=None):
+        """Abre un pesaje (entrada) o cierra el abierto de esa placa (salida). Devuelve el Weighing
+
+        snapshot es la ruta de la foto de la cámara tomada en la captura (opcional).
+        """
+        plate = (plate or "").strip().upper() or None
+        with self._lock, self._conn:
+            if plate is None:
+                row = self._conn.execute(
+                    "SELECT id, entry_weight, unit FROM weighings "
+                    "WHERE status = 'open' AND plate IS NULL AND scale = ? "
+                    "ORDER BY entry_ts LIMIT 1", (scale,)).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT id, entry_weight, unit FROM weighings WHERE status = 'open' AND plate = ? "
+                    "ORDER BY entry_ts LIMIT 1", (plate,)).fetchone()
+
+            if row is None:
+                cursor = self._conn.execute(
+                    "INSERT INTO weighings (plate, scale, entry_ts, entry_weight, unit, entry_snapshot) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", (plate, scale, ts, weight, unit, snapshot))
+                return self._get(cursor.lastrowid)
+
+            weighing_id, entry_weight, entry_unit = row
+            gross, tare = max(entry_weight, weight), min(entry_weight, weight)
+            net = gross - tare
+            day, shift = shift_of(ts)
+            self._conn.execute(
+                "UPDATE weighings SET exit_ts = ?, exit_weight = ?, gross = ?, tare = ?, net = ?, "
+                "day = ?, shift = ?, status = 'closed', exit_snapshot = ? WHERE id = ?",
+                (ts, weight, gross, tare, net, day, shift, snapshot, weighing_id))
+            # Los totales van en kg: cada peso se convierte con la unidad con que se leyó
+            entry_kg, exit_kg = to_kg(entry_weight, entry_unit), to_kg(weight, unit)
+            gross_kg, tare_kg = max(entry_kg, exit_kg), min(entry_kg, exit_kg)
+            net_kg = gross_kg - tare_kg
+            self._conn.execute(_UPSERT_TOTALS, (day, shift, scale, net_kg, gross_kg, tare_kg, net_kg, net_kg))
+            M_WEIGHINGS.inc()
+            return self._get(weighing_id)
+
+    def scales(self):
+        """Balanzas que aparecen en los totales (para filtros de exportación y búsqueda)"""
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT scale FROM weighing_totals ORDER BY scale").fetchall()
+        return [row[0] for row in rows]
+
+    def open_weighings(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM weighings WHERE status = 'open' ORDER BY entry_ts").fetchall()
+        return [Weighing(*row) for row in rows]
+
+    def day_totals(self, day=None):
+        """Totales precalculados del día (por turno y balanza)"""
+        day = day or shift_of(time.time())[0]
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM weighing_totals WHERE day = ? ORDER BY shift, scale", (day,)).fetchall()
+        return [DayTotals(*row) for row in rows]
+
+    def day_summary(self, day=None):
+        """(pesajes, neto total en kg) del día sumando sus filas de totales"""
+        totals = self.day_totals(day)
+        return sum(t.weighings for t in totals), sum(t.net_total for t in totals)
+
+    def report(self, day=None):
+        """Reporte de fin de día en texto, generado solo desde weighing_totals (pesos en kg)"""
+        day = day or shift_of(time.time())[0]
+        totals = self.day_totals(day)
+        lines = [f"Reporte de pesajes {day} (kg)",
+                 f"{'turno':<6} {'balanza':<12} {'pesajes':>8} {'neto total':>12} {'neto medio':>11} "
+                 f"{'mín':>9} {'máx':>9}"]
+        for t in totals:
+            lines.append(f"{t.shift:<6} {t.scale[:12]:<12} {t.weighings:>8} {t.net_total:>12.1f} "
+                         f"{t.net_total / t.weighings:>11.1f} {t.net_min:>9.1f} {t.net_max:>9.1f}")
+        count = sum(t.weighings for t in totals)
+        net = sum(t.net_total for t in totals)
+        lines.append(f"{'TOTAL':<19} {count:>8} {net:>12.1f} kg")
+        return "\n".join(lines)
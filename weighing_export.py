@@ -0,0 +1,136 @@
+"""Exportación de pesajes por bloques a CSV o Parquet, con memoria acotada y progreso.
+
+Usa su propia conexión SQLite (en modo WAL no bloquea al registro de pesajes) y recorre el
+resultado con fetchmany(chunk_size): en memoria nunca hay más de un bloque de filas. En CSV
+cada bloque se escribe con writerows; en Parquet cada bloque es un row group. Parquet requiere
+pyarrow, que es opcional.
+"""
+import csv
+import sqlite3
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+from metrics import REGISTRY
+
+M_EXPORT_ROWS = REGISTRY.counter("export_rows_total", "Pesajes exportados")
+M_EXPORT_SECONDS = REGISTRY.histogram("export_seconds", "Duración de cada exportación",
+                                      buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300))
+
+# Filas por bloque leído de SQLite y escrito al archivo
+EXPORT_CHUNK_ROWS = 10000
+
+EXPORT_COLUMNS = ("id", "plate", "scale", "entry_time", "entry_weight", "exit_time", "exit_weight",
+                  "gross", "tare", "net", "unit", "day", "shift", "status", "entry_snapshot", "exit_snapshot")
+
+_SELECT = ("SELECT id, plate, scale, {entry}, entry_weight, {exit}, exit_weight, gross, tare, net, unit, "
+           "day, shift, status, entry_snapshot, exit_snapshot FROM weighings")
+# En CSV las horas las formatea SQLite (en C), no un datetime de Python por fila
+_CSV_TIME = "datetime({}, 'unixepoch', 'localtime')"
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def parquet_available():
+    return pq is not None
+
+
+def _where(start_ts, end_ts, scale):
+    clauses, params = [], []
+    if start_ts is not None:
+        clauses.append("entry_ts >= ?")
+        params.append(start_ts)
+    if end_ts is not None:
+        clauses.append("entry_ts < ?")
+        params.append(end_ts)
+    if scale:
+        clauses.append("scale = ?")
+        params.append(scale)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+class _CsvSink:
+    select = _SELECT.format(entry=_CSV_TIME.format("entry_ts"), exit=_CSV_TIME.format("exit_ts"))
+
+    def __init__(self, path):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(EXPORT_COLUMNS)
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetSink:
+    select = _SELECT.format(entry="entry_ts", exit="exit_ts")
+
+    def __init__(self, path):
+        # Horas como timestamp real (µs) para que las herramientas columnares filtren sin convertir
+        self._schema = pa.schema([
+            ("id", pa.int64()), ("plate", pa.string()), ("scale", pa.string()),
+            ("entry_time", pa.timestamp("us")), ("entry_weight", pa.float64()),
+            ("exit_time", pa.timestamp("us")), ("exit_weight", pa.float64()),
+            ("gross", pa.float64()), ("tare", pa.float64()), ("net", pa.float64()),
+            ("unit", pa.string()), ("day", pa.string()), ("shift", pa.string()), ("status", pa.string()),
+            ("entry_snapshot", pa.string()), ("exit_snapshot", pa.string()),
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema, compression="zstd")
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        for i in (3, 5):
+            columns[i] = [None if ts is None else int(ts * 1e6) for ts in columns[i]]
+        self._writer.write_table(pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, self._schema)],
+            schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def export_weighings(db_path, out_path, fmt="csv", start_ts=None, end_ts=None, scale=None,
+                     chunk_size=EXPORT_CHUNK_ROWS, progress=None, cancel=None):
+    """Exporta los pesajes filtrados por hora de entrada [start_ts, end_ts) y balanza
+
+    progress(hechas, total) se llama tras cada bloque; si cancel (threading.Event) se activa,
+    se detiene entre bloques y lanza ExportCancelled. Devuelve la cantidad de filas escritas.
+    """
+    if fmt == "parquet" and pq is None:
+        raise RuntimeError("Exportar a Parquet requiere pyarrow (pip install pyarrow)")
+    where, params = _where(start_ts, end_ts, scale)
+    started = time.perf_counter()
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        total = conn.execute("SELECT count(*) FROM weighings" + where, params).fetchone()[0]
+        if progress:
+            progress(0, total)
+        sink = _ParquetSink(out_path) if fmt == "parquet" else _CsvSink(out_path)
+        done = 0
+        try:
+            cursor = conn.execute(sink.select + where + " ORDER BY entry_ts", params)
+            while True:
+                if cancel is not None and cancel.is_set():
+                    raise ExportCancelled(f"Exportación cancelada tras {done} filas")
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                sink.write(rows)
+                done += len(rows)
+                M_EXPORT_ROWS.inc(len(rows))
+                if progress:
+                    progress(done, total)
+        finally:
+            sink.close()
+    finally:
+        conn.close()
+    M_EXPORT_SECONDS.time_since(started)
+    return done
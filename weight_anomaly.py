@@ -0,0 +1,166 @@
+"""Anomalías en la señal de peso, detectadas en línea con trabajo constante por lectura.
+
+Un AnomalyDetector por balanza recibe cada lectura parseada, convertida a kg (todos los umbrales
+están en kg, sea cual sea la unidad del indicador), y marca:
+- "spike": una lectura se aleja de la mediana móvil más que la banda robusta (y más rápido que
+  MAX_RATE_KG_S, o en un escalón entre lecturas estables) y la siguiente vuelve al nivel de antes:
+  ruido eléctrico, no carga real;
+- "tare": escalón entre dos lecturas estables, sin movimiento en el medio ni cambio bruto/neto,
+  que se mantiene: alguien cambió la tara o el cero sin que nada subiera o bajara;
+- "drift": con el peso estable, el promedio se aleja del valor con que se estabilizó: alguien
+  apoyado en la plataforma, o el indicador derivando;
+- "oscillation": muchas inversiones de sentido en pocas lecturas: alguien moviéndose o
+  balanceándose sobre la plataforma.
+
+spike y tare se confirman con la lectura siguiente, así que marcan la anterior; drift y
+oscillation marcan cada lectura mientras dura el episodio. La banda robusta es la mediana de
+las últimas ANOMALY_WINDOW lecturas más max(SPIKE_MIN_KG, SPIKE_K x desvío absoluto medio con el
+peso estable). Todo el estado es de tamaño fijo (ventana de ANOMALY_WINDOW y OSC_WINDOW lecturas).
+"""
+import bisect
+import collections
+
+from metrics import REGISTRY
+
+ANOMALY_KINDS = ("spike", "tare", "drift", "oscillation")
+
+# Episodios detectados (un spike es un episodio; drift y oscillation cuentan una vez por episodio)
+M_ANOMALIES = {kind: REGISTRY.counter("weight_anomalies_total", "Episodios de anomalías en la señal de peso",
+                                      labels={"kind": kind})
+               for kind in ANOMALY_KINDS}
+
+# Lecturas de la mediana móvil (impar)
+ANOMALY_WINDOW = 7
+
+# Banda alrededor de la mediana: el mayor entre el mínimo y SPIKE_K desvíos absolutos medios
+SPIKE_MIN_KG = 100.0
+SPIKE_K = 8.0
+_DEV_ALPHA = 0.1
+
+# Cambio más rápido que puede producir una carga real (un eje subiendo a la plataforma)
+MAX_RATE_KG_S = 20000.0
+
+# Escalón mínimo entre dos lecturas estables para sospechar un cambio de tara
+TARE_STEP_KG = 20.0
+
+# Deriva del promedio (suavizado exponencial) respecto del valor al estabilizarse
+DRIFT_KG = 30.0
+_DRIFT_ALPHA = 0.05
+
+# Oscilación: al menos OSC_REVERSALS inversiones de sentido de OSC_MIN_KG en OSC_WINDOW lecturas
+OSC_WINDOW = 20
+OSC_REVERSALS = 8
+OSC_MIN_KG = 20.0
+
+Anomaly = collections.namedtuple("Anomaly", "kind ts weight new")
+
+
+class AnomalyDetector:
+    """Detector de una balanza; feed() por lectura, desde un único hilo"""
+
+    def __init__(self):
+        self._window = collections.deque()
+        self._sorted = []
+        self._dev = 0.0
+        self._prev = None
+        # Lectura que saltó: (ts, peso, nivel previo, escalón estable); se resuelve con la siguiente
+        self._suspect = None
+        self._anchor = None
+        self._drift_avg = 0.0
+        self._drifting = False
+        self._reversals = collections.deque()
+        self._reversal_count = 0
+        self._last_delta = 0.0
+        self._oscillating = False
+
+    def _median(self):
+        values = self._sorted
+        return values[len(values) // 2] if values else None
+
+    def _push(self, weight):
+        if len(self._window) == ANOMALY_WINDOW:
+            old = self._window.popleft()
+            del self._sorted[bisect.bisect_left(self._sorted, old)]
+        self._window.append(weight)
+        bisect.insort(self._sorted, weight)
+
+    def _push_reversal(self, reversal):
+        if len(self._reversals) == OSC_WINDOW:
+            self._reversal_count -= self._reversals.popleft()
+        self._reversals.append(reversal)
+        self._reversal_count += reversal
+
+    def feed(self, weight, status, ts, weight_type=None):
+        """Procesa una lectura con weight en kg (to_kg). Devuelve [Anomaly] (puede marcar la lectura anterior)"""
+        found = []
+        median = self._median()
+        band = max(SPIKE_MIN_KG, SPIKE_K * self._dev)
+        prev = self._prev
+        stable = status == "ST"
+
+        # ---- resolver la lectura sospechosa anterior ----
+        suspect, self._suspect = self._suspect, None
+        returned = False
+        if suspect is not None:
+            s_ts, s_weight, level, stable_step = suspect
+            if abs(weight - level) <= band and abs(s_weight - level) > band:
+                found.append(self._episode("spike", s_ts, s_weight))
+                # Esta lectura vuelve al nivel: no es un escalón nuevo
+                returned = True
+            elif stable_step and stable and abs(weight - s_weight) < TARE_STEP_KG / 2:
+                found.append(self._episode("tare", s_ts, s_weight))
+                # El nuevo nivel es el de referencia para la deriva
+                self._anchor = self._drift_avg = weight
+
+        # ---- ¿esta lectura salta? ----
+        jumped = False
+        if prev is not None and median is not None and not returned:
+            p_ts, p_weight, p_status, p_type = prev
+            jump = weight - p_weight
+            fast = abs(jump) / max(ts - p_ts, 1e-3) > MAX_RATE_KG_S and abs(weight - median) > band
+            stable_step = (stable and p_status == "ST" and abs(jump) >= TARE_STEP_KG
+                           and weight_type == p_type)
+            if fast or stable_step:
+                jumped = True
+                self._suspect = (ts, weight, median if fast else p_weight, stable_step)
+
+        if not jumped:
+            # Solo con peso estable: en una rampa la mediana va atrasada y la banda se inflaría
+            if median is not None and stable and not returned:
+                self._dev += _DEV_ALPHA * (abs(weight - median) - self._dev)
+
+            # ---- deriva con el peso estable ----
+            if not stable:
+                self._anchor = None
+                self._drifting = False
+            elif self._anchor is None:
+                self._anchor = self._drift_avg = weight
+            else:
+                self._drift_avg += _DRIFT_ALPHA * (weight - self._drift_avg)
+                if abs(self._drift_avg - self._anchor) > DRIFT_KG:
+                    found.append(self._episode("drift", ts, weight, new=not self._drifting))
+                    self._drifting = True
+
+        # ---- oscilación: inversiones de sentido significativas ----
+        if prev is not None:
+            delta = weight - prev[1]
+            reversal = False
+            if abs(delta) >= OSC_MIN_KG:
+                reversal = self._last_delta != 0.0 and (delta > 0) != (self._last_delta > 0)
+                self._last_delta = delta
+            self._push_reversal(reversal)
+            if self._reversal_count >= OSC_REVERSALS:
+                found.append(self._episode("oscillation", ts, weight, new=not self._oscillating))
+                self._oscillating = True
+            elif self._reversal_count == 0:
+                self._oscillating = False
+
+        self._push(weight)
+        self._prev = (ts, weight, status, weight_type)
+        return found
+
+    @staticmethod
+    def _episode(kind, ts, weight, new=True):
+        if new:
+            M_ANOMALIES[kind].inc()
+        return Anomaly(kind, ts, weight, new)
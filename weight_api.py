@@ -0,0 +1,323 @@
+import asyncio
+import base64
+import collections
+import hashlib
+import json
+import socket
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Puerto por defecto del API local (solo escucha en 127.0.0.1)
+API_PORT = 8765
+
+# Lecturas pendientes por cliente; si se llena se descartan las más viejas
+API_CLIENT_QUEUE = 32
+
+# Bytes que se dejan en el buffer de escritura de cada cliente (unas pocas tramas). Lo que no entra
+# espera en la cola acotada, donde se descartan las lecturas viejas, en vez de acumularse en el
+# transporte o en el socket y atrasar al cliente lento segundos o minutos
+API_CLIENT_BUFFER = 512
+API_CLIENT_SNDBUF = 4096
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def _ws_frame(payload, opcode=0x1):
+    """Arma un frame WebSocket servidor->cliente (sin máscara)"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+class _Client:
+    """Suscriptor con cola acotada: un consumidor lento pierde lecturas viejas, nunca frena al lector"""
+
+    __slots__ = ("kind", "queue", "event", "dropped")
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.queue = collections.deque(maxlen=API_CLIENT_QUEUE)
+        self.event = asyncio.Event()
+        self.dropped = 0
+
+    def push(self, item):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(item)
+        self.event.set()
+
+
+class WeightApiServer:
+    """Servidor HTTP local: GET /weight/current, SSE en /weight/stream y WebSocket en /weight/ws"""
+
+    def __init__(self, host="127.0.0.1", port=API_PORT):
+        self.host = host
+        self.port = port
+        self.loop = None
+        self._server = None
+        self._thread = None
+        self._clients = set()
+        self._current = None
+        self._ready = threading.Event()
+        self._start_error = None
+        # Rutas GET simples: path -> (función que devuelve (content_type, bytes), bloqueante)
+        self.routes = {"/weight/current": (self._route_current, False)}
+        # Las rutas bloqueantes (SQLite) corren fuera del loop, en un hilo propio del API
+        self._route_executor = None
+
+    @property
+    def client_count(self):
+        return len(self._clients)
+
+    @property
+    def dropped_total(self):
+        return sum(c.dropped for c in list(self._clients))
+
+    def add_route(self, path, handler, blocking=False):
+        """Registra un GET adicional; handler() -> (content_type, body_bytes)
+
+        Con blocking=True (consultas a disco) el handler corre en el ejecutor del API y no en el loop.
+        """
+        if blocking and self._route_executor is None:
+            self._route_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="api-routes")
+        self.routes[path] = (handler, blocking)
+
+    def start(self, loop=None):
+        """Arranca sobre un loop existente (el del orquestador) o, sin loop, en un hilo propio"""
+        if loop is not None:
+            self.loop = loop
+            future = asyncio.run_coroutine_threadsafe(self._open(), loop)
+            future.result(timeout=5)
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=5)
+        if self._start_error:
+            raise self._start_error
+
+    def stop(self):
+        if self.loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self._shutdown)
+        if self._thread:
+            self._thread.join(timeout=2)
+        if self._route_executor:
+            self._route_executor.shutdown(wait=False, cancel_futures=True)
+
+    def publish(self, reading):
+        """Publica una lectura (dict) a todos los suscriptores. Seguro desde cualquier hilo"""
+        self._current = reading
+        if not self._clients or not self.loop:
+            return
+        # Serializar una sola vez; el reparto ocurre en el loop del servidor
+        data = json.dumps(reading, separators=(",", ":")).encode("utf-8")
+        try:
+            self.loop.call_soon_threadsafe(self._fan_out, data)
+        except RuntimeError:
+            # Loop cerrado durante el apagado
+            pass
+
+    def _fan_out(self, data):
+        sse = b"data: " + data + b"\n\n"
+        ws = _ws_frame(data)
+        for client in self._clients:
+            client.push(sse if client.kind == "sse" else ws)
+
+    # ---- ciclo de vida del loop ----
+
+    async def _open(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        # Puerto real (útil con port=0 en pruebas de carga)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._open())
+        except OSError as e:
+            self._start_error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def _shutdown(self):
+        if self._server:
+            self._server.close()
+        for client in self._clients:
+            client.queue.clear()
+            client.queue.append(None)
+            client.event.set()
+        # Un loop compartido (orquestador) lo detiene su dueño
+        if self._thread:
+            self.loop.call_later(0.2, self.loop.stop)
+
+    # ---- HTTP ----
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            parts = request_line.decode("latin-1").split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+            if len(parts) < 2 or parts[0] != "GET":
+                await self._respond(writer, 405, "text/plain", b"method not allowed")
+                return
+
+            path = parts[1].split("?", 1)[0]
+            if path == "/weight/ws" and headers.get("upgrade", "").lower() == "websocket":
+                await self._serve_websocket(reader, writer, headers)
+            elif path == "/weight/stream":
+                await self._serve_sse(reader, writer)
+            elif path in self.routes:
+                handler, blocking = self.routes[path]
+                if blocking:
+                    content_type, body = await self.loop.run_in_executor(self._route_executor, handler)
+                else:
+                    content_type, body = handler()
+                await self._respond(writer, 200, content_type, body)
+            else:
+                await self._respond(writer, 404, "text/plain", b"not found")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    async def _respond(self, writer, status, content_type, body):
+        reason = {200: "OK", 404: "Not Found", 405: "Method Not Allowed"}.get(status, "")
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Access-Control-Allow-Origin: *\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+
+    def _route_current(self):
+        body = json.dumps(self._current or {}, separators=(",", ":")).encode("utf-8")
+        return "application/json", body
+
+    # ---- suscriptores ----
+
+    @staticmethod
+    def _limit_buffers(writer):
+        """Acota el buffer del transporte y el de envío del kernel para que la cola sea el único atraso"""
+        writer.transport.set_write_buffer_limits(high=API_CLIENT_BUFFER)
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, API_CLIENT_SNDBUF)
+            except OSError:
+                pass
+
+    async def _pump(self, client, writer):
+        """Envía la cola del cliente; solo esta tarea espera al socket lento
+
+        No saca de la cola mientras el transporte tenga más de API_CLIENT_BUFFER bytes: lo que
+        llega entretanto se acumula (y se descarta por antigüedad) en la cola del cliente.
+        """
+        transport = writer.transport
+        while True:
+            await client.event.wait()
+            client.event.clear()
+            while client.queue:
+                if transport.get_write_buffer_size() > API_CLIENT_BUFFER:
+                    await writer.drain()
+                    continue
+                item = client.queue.popleft()
+                if item is None:
+                    return
+                writer.write(item)
+            await writer.drain()
+
+    async def _serve_sse(self, reader, writer):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Access-Control-Allow-Origin: *\r\n"
+            b"Connection: keep-alive\r\n\r\n")
+        self._limit_buffers(writer)
+        client = _Client("sse")
+        if self._current:
+            client.push(b"data: " + json.dumps(self._current, separators=(",", ":")).encode("utf-8") + b"\n\n")
+        self._clients.add(client)
+        pump = asyncio.ensure_future(self._pump(client, writer))
+        # Con la balanza quieta el pump no escribe y no se entera del cierre: el EOF del lector sí
+        eof = asyncio.ensure_future(self._wait_eof(reader))
+        try:
+            done, _ = await asyncio.wait((pump, eof), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                # Un socket caído termina cualquiera de las dos con ConnectionError: ya no importa
+                task.exception()
+        finally:
+            self._clients.discard(client)
+            pump.cancel()
+            eof.cancel()
+
+    @staticmethod
+    async def _wait_eof(reader):
+        """Vuelve cuando el cliente cierra la conexión (lo que envíe después de la petición se descarta)"""
+        while await reader.read(1024):
+            pass
+
+    async def _serve_websocket(self, reader, writer, headers):
+        key = headers.get("sec-websocket-key", "")
+        accept = base64.b64encode(hashlib.sha1((key + _WS_GUID).encode("ascii")).digest()).decode("ascii")
+        writer.write(
+            b"HTTP/1.1 101 Switching Protocols\r\n"
+            b"Upgrade: websocket\r\n"
+            b"Connection: Upgrade\r\n"
+            b"Sec-WebSocket-Accept: " + accept.encode("ascii") + b"\r\n\r\n")
+        await writer.drain()
+        self._limit_buffers(writer)
+
+        client = _Client("ws")
+        if self._current:
+            client.push(_ws_frame(json.dumps(self._current, separators=(",", ":")).encode("utf-8")))
+        self._clients.add(client)
+        pump = asyncio.ensure_future(self._pump(client, writer))
+        try:
+            # Leer frames del cliente solo para ping/close
+            while not pump.done():
+                opcode, payload = await self._read_ws_frame(reader)
+                if opcode == 0x8:
+                    break
+                if opcode == 0x9:
+                    client.push(_ws_frame(payload, opcode=0xA))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._clients.discard(client)
+            pump.cancel()
+
+    async def _read_ws_frame(self, reader):
+        b1, b2 = await reader.readexactly(2)
+        opcode = b1 & 0x0F
+        length = b2 & 0x7F
+        if length == 126:
+            (length,) = struct.unpack("!H", await reader.readexactly(2))
+        elif length == 127:
+            (length,) = struct.unpack("!Q", await reader.readexactly(8))
+        mask = await reader.readexactly(4) if b2 & 0x80 else b"\0\0\0\0"
+        data = await reader.readexactly(length)
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+        return opcode, payload
@@ -0,0 +1,142 @@
+"""Historial de lecturas de peso en arrays de tamaño fijo y decimación min/máx para la tendencia.
+
+Las lecturas se guardan en dos array('d') circulares (hora epoch y peso). Sobre los pesos se
+mantiene una pirámide de bloques con su mínimo y máximo (bloques de 16, 256, 4096 y 65536
+lecturas), actualizada en O(niveles) por lectura. Consultar el min/máx de cualquier rango
+recorre a lo sumo 2 * 15 elementos por nivel, así que decimar a N columnas cuesta lo mismo con
+un minuto de historia que con un turno completo.
+"""
+from array import array
+
+# Factor entre niveles de la pirámide y cantidad de niveles sobre los datos crudos
+_FANOUT = 16
+_LEVELS = 4
+_TOP_BLOCK = _FANOUT ** _LEVELS
+
+# 7 bloques superiores = 458752 lecturas: más de 12 h a 10 lecturas/s
+HISTORY_CAPACITY = 7 * _TOP_BLOCK
+
+_INF = float("inf")
+
+
+class WeightHistory:
+    """Buffer circular de (hora, peso) con resúmenes min/máx por bloques"""
+
+    def __init__(self, capacity=HISTORY_CAPACITY):
+        if capacity % _TOP_BLOCK:
+            raise ValueError(f"La capacidad debe ser múltiplo de {_TOP_BLOCK}")
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.weights = array("d", bytes(8 * capacity))
+        self._mins = []
+        self._maxs = []
+        block = 1
+        for _ in range(_LEVELS):
+            block *= _FANOUT
+            self._mins.append(array("d", bytes(8 * (capacity // block))))
+            self._maxs.append(array("d", bytes(8 * (capacity // block))))
+        # Índice lógico de la próxima lectura (crece sin límite; físico = lógico % capacidad)
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def first(self):
+        """Índice lógico de la lectura más vieja que sigue en el buffer"""
+        return max(0, self.count - self.capacity)
+
+    def time_range(self):
+        if not self.count:
+            return None
+        return self.times[self.first % self.capacity], self.times[(self.count - 1) % self.capacity]
+
+    def append(self, t, weight):
+        i = self.count
+        cap = self.capacity
+        # El reloj de pared puede retroceder; el historial debe quedar ordenado para la búsqueda
+        if i and t < self.times[(i - 1) % cap]:
+            t = self.times[(i - 1) % cap]
+        self.times[i % cap] = t
+        self.weights[i % cap] = weight
+        block_size = 1
+        for mins, maxs in zip(self._mins, self._maxs):
+            block_size *= _FANOUT
+            slot = (i // block_size) % len(mins)
+            if i % block_size == 0:
+                # Primera lectura del bloque: descarta lo que quedaba de la vuelta anterior
+                mins[slot] = maxs[slot] = weight
+            else:
+                if weight < mins[slot]:
+                    mins[slot] = weight
+                if weight > maxs[slot]:
+                    maxs[slot] = weight
+        self.count = i + 1
+
+    # ---- consultas ----
+
+    def index_at(self, t):
+        """Primer índice lógico con hora >= t (búsqueda binaria sobre el buffer circular)"""
+        lo, hi = self.first, self.count
+        times = self.times
+        cap = self.capacity
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if times[mid % cap] < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    @staticmethod
+    def _chunks(values, start, stop):
+        # Rango físico que puede dar la vuelta al final del array
+        size = len(values)
+        a = start % size
+        n = stop - start
+        if a + n <= size:
+            return (values[a:a + n],)
+        return values[a:], values[:a + n - size]
+
+    def min_max(self, start, stop):
+        """(mín, máx) de los pesos en los índices lógicos [start, stop), o None si está vacío"""
+        start = max(start, self.first)
+        stop = min(stop, self.count)
+        if start >= stop:
+            return None
+        lo, hi = _INF, -_INF
+        mins = maxs = self.weights
+        level = -1
+        while start < stop:
+            if level == _LEVELS - 1 or stop - start < 2 * _FANOUT:
+                # Nivel superior o rango corto: recorrer lo que queda
+                spans = ((start, stop),)
+                start = stop
+            else:
+                # Bordes sueltos hasta el siguiente múltiplo del bloque; el centro sube de nivel
+                head_end = -(-start // _FANOUT) * _FANOUT
+                tail_start = stop // _FANOUT * _FANOUT
+                spans = ((start, head_end), (tail_start, stop))
+                start, stop = head_end // _FANOUT, tail_start // _FANOUT
+            for a, b in spans:
+                if a < b:
+                    lo = min(lo, *(min(chunk) for chunk in self._chunks(mins, a, b)))
+                    hi = max(hi, *(max(chunk) for chunk in self._chunks(maxs, a, b)))
+            if start < stop:
+                level += 1
+                mins, maxs = self._mins[level], self._maxs[level]
+        return lo, hi
+
+    def decimate(self, t_start, t_end, columns):
+        """Divide [t_start, t_end) en columnas y devuelve una lista de (mín, máx) o None por columna"""
+        if columns <= 0 or t_end <= t_start:
+            return []
+        step = (t_end - t_start) / columns
+        bounds = [self.index_at(t_start + step * c) for c in range(columns + 1)]
+        return [self.min_max(bounds[c], bounds[c + 1]) for c in range(columns)]
+
+    def latest(self):
+        if not self.count:
+            return None
+        i = (self.count - 1) % self.capacity
+        return self.times[i], self.weights[i]